@@ -0,0 +1,162 @@
+# pylint: disable=line-too-long, invalid-name, import-error, multiple-imports, unspecified-encoding, broad-exception-caught, trailing-whitespace, no-name-in-module, unused-import
+
+"""
+Frame time of the two ObjectDrawer backends (a canvas item per marker vs
+one raster bitmap) for growing object counts, to pick
+`performance.raster_threshold`. Every frame moves all objects a bit, like a
+battle does.
+    
+    python bench/backends.py
+    python bench/backends.py --sizes 100 300 1000 --min-time 1
+
+With a display the frames go to a real Tk canvas and include its redraw
+(`update_idletasks`). Without one the recording canvas stub and a stand-in
+PhotoImage are used, which leaves out the Tk side of both backends, so the
+numbers only compare the Python/PIL work.
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import ImageTk
+
+from objects import ObjectDrawer
+from suite import RecordingCanvas, StandInPhoto, FONT_PATH
+
+
+SIZES = (10, 100, 300, 1000, 3000, 10000)
+CANVAS_SIZE = (400, 400)
+VARIANTS = 8 # precomputed frames per size, played in a loop
+
+
+def make_canvas():
+    """(canvas, flush function, real Tk or not)"""
+    try:
+        import tkinter
+        
+        root = tkinter.Tk()
+        canvas = tkinter.Canvas(root, width=CANVAS_SIZE[0], height=CANVAS_SIZE[1], bg="#111111", highlightthickness=0)
+        canvas.pack()
+        root.update()
+        
+        return canvas, root.update_idletasks, True
+    except Exception:
+        ImageTk.PhotoImage = StandInPhoto
+        
+        return RecordingCanvas(), lambda: None, False
+
+
+def make_frames(n, seed=0):
+    """`VARIANTS` frames of n objects: 70% ground units, 20% planes, 10% other markers."""
+    rnd = np.random.default_rng(seed)
+    
+    ground = int(n*0.7)
+    planes = int(n*0.2)
+    other = n - ground - planes
+    
+    x = rnd.uniform(0.35, 0.65, n)
+    y = rnd.uniform(0.35, 0.65, n)
+    vx = rnd.uniform(-2e-4, 2e-4, n)
+    vy = rnd.uniform(-2e-4, 2e-4, n)
+    
+    dx = rnd.uniform(-1, 1, planes)
+    dy = rnd.uniform(-1, 1, planes)
+    
+    colors = rnd.choice(["#174DFF", "#f40C00"], n).tolist()
+    
+    frames = []
+    for i in range(VARIANTS):
+        fx = x + vx*i
+        fy = y + vy*i
+        
+        frames.append((
+            (fx[:ground], fy[:ground], colors[:ground]),
+            (fx[ground:ground + planes], fy[ground:ground + planes], dx, dy, colors[ground:ground + planes]),
+            (fx[ground + planes:], fy[ground + planes:], colors[ground + planes:])
+        ))
+    
+    return frames
+
+
+def make_drawer(canvas, raster):
+    drawer = ObjectDrawer(canvas, CANVAS_SIZE, (3, 3), (4, 4), raster_threshold=1 if raster else 0)
+    drawer.load_font(FONT_PATH, 10)
+    drawer.set_zoom(3.25)
+    drawer.set_player_pos((0.5, 0.5, 0.6, 0.8))
+    
+    return drawer
+
+
+def run_frame(drawer, n, frame, flush):
+    ground, planes, other = frame
+    
+    drawer.choose_backend(n)
+    drawer.begin_frame()
+    
+    drawer.draw_objects__ground(*ground)
+    drawer.draw_objects__plane(*planes)
+    drawer.draw_objects__other(*other)
+    
+    drawer.end_frame()
+    flush()
+
+
+def measure(drawer, n, frames, flush, min_time, min_runs):
+    for frame in frames:
+        run_frame(drawer, n, frame, flush) # create the pooled items / the bitmap item
+    
+    timings = []
+    started = time.perf_counter()
+    
+    while len(timings) < min_runs or time.perf_counter() - started < min_time:
+        t = time.perf_counter_ns()
+        run_frame(drawer, n, frames[len(timings) % len(frames)], flush)
+        timings.append((time.perf_counter_ns() - t)/1e6)
+    
+    drawer.clear()
+    flush()
+    
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="*", default=list(SIZES))
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds per backend and size")
+    parser.add_argument("--min-runs", type=int, default=10)
+    args = parser.parse_args()
+    
+    canvas, flush, real = make_canvas()
+    
+    print(f"{'objects':>8}{'vector':>12}{'raster':>12}{'ratio':>8}   (ms per frame, median)")
+    
+    crossover = None
+    
+    for n in args.sizes:
+        frames = make_frames(n)
+        
+        vector = measure(make_drawer(canvas, False), n, frames, flush, args.min_time, args.min_runs)
+        raster = measure(make_drawer(canvas, True), n, frames, flush, args.min_time, args.min_runs)
+        
+        if crossover is None and raster < vector:
+            crossover = n
+        
+        print(f"{n:>8}{vector:>12.3f}{raster:>12.3f}{raster/vector:>8.2f}")
+    
+    if not real:
+        print("\n(no display: recording canvas and stand-in PhotoImage, Tk drawing is not included)")
+    
+    if crossover is not None:
+        print(f"\nRaster is faster from {crossover} objects on (of the sizes measured)")
+    else:
+        print("\nVector was faster at every size measured")
+
+
+if __name__ == "__main__":
+    main()
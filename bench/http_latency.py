@@ -0,0 +1,112 @@
+# pylint: disable=line-too-long, invalid-name, import-error, multiple-imports, unspecified-encoding, broad-exception-caught, trailing-whitespace, no-name-in-module, unused-import
+
+"""
+Compares per-request latency of a fresh `urlopen` per call (the old reader)
+against the pooled keep-alive `ThunderSession`.
+    
+    python bench/http_latency.py [--requests 200] [--url http://127.0.0.1:8111/map_obj.json]
+    python bench/http_latency.py --plain-server [--no-quickack]
+
+`--plain-server` serves a 15 KB map_obj.json from a stock `http.server`
+HTTP/1.1 handler, which writes headers and body separately and leaves
+Nagle on. Measured on Linux, 200 requests (p50):
+
+    urlopen                           0.26ms
+    session                           0.08ms
+    session --no-quickack            44ms on pooled sockets before the
+                                      keep-alive guard, 0.25ms after it
+                                      switched to fresh connections
+
+i.e. such a server stalls every pooled response until our delayed ACK
+fires. TCP_QUICKACK avoids that on Linux, elsewhere (Windows, where the
+game runs) the guard in `ThunderSession` falls back to a connection per
+request. `mock_server.py` sets TCP_NODELAY and shows neither effect.
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+import statistics
+import http.server
+from urllib.request import urlopen
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import thunder_reader
+
+
+class PlainHandler(http.server.BaseHTTPRequestHandler):
+    """Stock keep-alive handler: no TCP_NODELAY, headers and body in two writes."""
+    
+    protocol_version = "HTTP/1.1"
+    body = b"[" + b",".join([b'{"type":"ground_model","color":"#f40C00","icon":"LightTank","x":0.5,"y":0.5}']*200) + b"]"
+    
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+    
+    def log_message(self, *args):
+        pass
+
+
+def start_plain_server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), PlainHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    
+    return f"http://127.0.0.1:{server.server_address[1]}/map_obj.json"
+
+
+def measure(fetch, url, requests):
+    timings = []
+    
+    for _ in range(requests):
+        t = time.perf_counter()
+        fetch(url)
+        timings.append((time.perf_counter() - t)*1000)
+    
+    timings.sort()
+    
+    return {
+        "mean": statistics.fmean(timings),
+        "p50": timings[len(timings)//2],
+        "p95": timings[min(len(timings) - 1, int(len(timings)*0.95))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--url", default=thunder_reader.THUNDER_OBJECTS_PATH)
+    parser.add_argument("--plain-server", action="store_true", help="measure against a local stock http.server instead of --url")
+    parser.add_argument("--no-quickack", action="store_true", help="don't set TCP_QUICKACK (like on Windows)")
+    args = parser.parse_args()
+    
+    if args.plain_server:
+        args.url = start_plain_server()
+    
+    if args.no_quickack:
+        thunder_reader.TCP_QUICKACK = None
+    
+    session = thunder_reader.ThunderSession()
+    
+    results = {
+        "urlopen": measure(lambda url: urlopen(url, timeout=thunder_reader.THUNDER_TIMEOUT).read(), args.url, args.requests),
+        "session": measure(session.get, args.url, args.requests),
+    }
+    
+    session.close()
+    
+    print(f"{args.requests} requests to {args.url} (session: {session.stats[args.url]})")
+    for name, res in results.items():
+        print(f"  {name:<8} mean {res['mean']:7.3f}ms   p50 {res['p50']:7.3f}ms   p95 {res['p95']:7.3f}ms")
+    
+    print(f"  speedup  {results['urlopen']['mean']/results['session']['mean']:.2f}x (mean)")
+
+
+if __name__ == "__main__":
+    main()
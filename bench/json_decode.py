@@ -0,0 +1,89 @@
+# pylint: disable=line-too-long, invalid-name, import-error, multiple-imports, unspecified-encoding, broad-exception-caught, trailing-whitespace, no-name-in-module, unused-import
+
+"""
+Compares the installed JSON backends of `thunder_reader` on map_obj.json
+payloads of different sizes.
+    
+    python bench/json_decode.py                         # synthetic payloads
+    python bench/json_decode.py --payload a.json b.json # recorded responses
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import thunder_reader
+
+
+SIZES = (10, 100, 1000, 5000)
+
+
+def make_payload(count, seed=0):
+    """map_obj.json-like body with `count` objects (plus the player)."""
+    rnd = random.Random(seed)
+    
+    objects = [{"type": "aircraft", "color": "#faC81E", "blink": 0, "icon": "Player", "icon_bg": "none", "x": 0.5, "y": 0.5, "dx": 0.7, "dy": 0.7}]
+    
+    for _ in range(count):
+        color = rnd.choice(("#174DFF", "#f40C00"))
+        kind = rnd.random()
+        
+        if kind < 0.6:
+            objects.append({"type": "ground_model", "color": color, "color[]": [23, 77, 255], "blink": 0, "icon": "MediumTank", "icon_bg": "none", "x": rnd.random(), "y": rnd.random()})
+        elif kind < 0.9:
+            objects.append({"type": "aircraft", "color": color, "color[]": [23, 77, 255], "blink": 0, "icon": "Fighter", "icon_bg": "none", "x": rnd.random(), "y": rnd.random(), "dx": rnd.uniform(-1, 1), "dy": rnd.uniform(-1, 1)})
+        elif kind < 0.97:
+            objects.append({"type": "respawn_base_tank", "color": color, "color[]": [23, 77, 255], "blink": 0, "icon": "none", "icon_bg": "none", "x": rnd.random(), "y": rnd.random()})
+        else:
+            objects.append({"type": "airfield", "color": color, "color[]": [23, 77, 255], "blink": 0, "icon": "none", "icon_bg": "none", "sx": rnd.random(), "sy": rnd.random(), "ex": rnd.random(), "ey": rnd.random()})
+    
+    return json.dumps(objects).encode()
+
+
+def timeit(func, buf, min_time=0.2):
+    runs = 0
+    t = time.perf_counter()
+    
+    while True:
+        func(buf)
+        runs += 1
+        
+        elapsed = time.perf_counter() - t
+        if elapsed > min_time:
+            return elapsed/runs*1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payload", nargs="*", default=[], help="recorded map_obj.json files")
+    args = parser.parse_args()
+    
+    payloads = []
+    for path in args.payload:
+        with open(path, "rb") as f:
+            payloads.append((os.path.basename(path), f.read()))
+    
+    if not payloads:
+        payloads = [(f"{n} objects", make_payload(n)) for n in SIZES]
+    
+    backends = [name for name, backend in thunder_reader.JSON_DECODERS.items() if backend]
+    decoders = {name: thunder_reader.get_decoder(name) for name in backends}
+    
+    print(f"{'payload':<16}{'size':>10}  " + "".join(f"{name:>14}" for name in backends) + "   (us per decode_objects)")
+    
+    for label, payload in payloads:
+        buffer = bytearray(payload) # decoded straight from a reused buffer, as the session does
+        view = memoryview(buffer)
+        
+        times = [timeit(decoders[name].decode_objects, view) for name in backends]
+        
+        print(f"{label:<16}{len(payload):>9}B  " + "".join(f"{t:>14.1f}" for t in times))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# pylint: disable=line-too-long, invalid-name, import-error, multiple-imports, unspecified-encoding, broad-exception-caught, trailing-whitespace, no-name-in-module, unused-import
+
+"""
+Checks that the poller backs off against an API port that accepts TCP
+connections but never answers HTTP (`mock_server.py --drop 1.0`): the TCP
+probe succeeds, map_info.json fails, and the delays between the attempts
+must still double up to `probe_max_interval`.
+
+    python bench/poller_backoff.py [--steps 40] [--probe 500] [--probe-max 10000]
+
+The poller states are stepped directly and their delays summed instead of
+slept, so it finishes in about a second. Exits 1 when the delay never
+reaches `probe_max_interval` or when a cycle didn't wait at all.
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import thunder_reader
+from poller import MapPoller, PollScheduler, UNREACHABLE, OUT_OF_BATTLE
+
+MOCK_SERVER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mock_server.py")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_dropping_server(port):
+    server = subprocess.Popen([sys.executable, MOCK_SERVER, "--port", str(port), "--drop", "1.0"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    
+    # wait until it listens
+    for _ in range(50):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    
+    return server
+
+
+def point_reader_at(port):
+    api = f"http://127.0.0.1:{port}"
+    
+    thunder_reader.THUNDER_API = api
+    thunder_reader.THUNDER_OBJECTS_PATH = f"{api}/map_obj.json"
+    thunder_reader.THUNDER_MAP_INFO_PATH = f"{api}/map_info.json"
+    thunder_reader.THUNDER_MAP_IMG = f"{api}/map.img"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=40)
+    parser.add_argument("--probe", type=int, default=500, help="ms, first probe delay")
+    parser.add_argument("--probe-max", type=int, default=10000, help="ms, longest probe delay")
+    args = parser.parse_args()
+    
+    port = free_port()
+    server = start_dropping_server(port)
+    point_reader_at(port)
+    
+    reader = thunder_reader.MapReader()
+    poller = MapPoller(reader, PollScheduler(1, 10, 30), 1000, args.probe, args.probe_max)
+    poller.state = UNREACHABLE
+    
+    waits = []
+    try:
+        for _ in range(args.steps):
+            state = poller.state
+            waits.append((state, getattr(poller, f"_step__{state}")()))
+    finally:
+        reader.close()
+        server.terminate()
+        server.wait()
+    
+    # one cycle: a probe (UNREACHABLE) and a map_info.json attempt (OUT_OF_BATTLE)
+    cycles = [waits[i][1] + waits[i + 1][1] for i in range(0, len(waits) - 1, 2) if waits[i][0] == UNREACHABLE and waits[i + 1][0] == OUT_OF_BATTLE]
+    longest = max(wait for _, wait in waits)
+    
+    print(f"{len(waits)} steps, {len(cycles)} probe + map_info.json cycles against a port that drops every request")
+    print("  cycle delays (s): " + " ".join(f"{wait:.1f}" for wait in cycles))
+    print(f"  simulated time {sum(wait for _, wait in waits):.1f}s, longest delay {longest:.1f}s (probe_max_interval {poller.probe_max_interval:.1f}s)")
+    
+    failed = False
+    
+    if not cycles or min(cycles) <= 0:
+        print("FAIL: a cycle didn't wait at all")
+        failed = True
+    
+    if longest < poller.probe_max_interval:
+        print("FAIL: the delay never reached probe_max_interval")
+        failed = True
+    
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
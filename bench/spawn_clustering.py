@@ -0,0 +1,149 @@
+# pylint: disable=line-too-long, invalid-name, import-error, multiple-imports, unspecified-encoding, broad-exception-caught, trailing-whitespace, no-name-in-module, unused-import
+
+"""
+Times spawn clustering against the previous all-pairs implementation and
+checks that both give identical results.
+    
+    python bench/spawn_clustering.py [--sizes 100 1000 10000 50000] [--reference-limit 10000]
+"""
+
+import os
+import sys
+import math
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clustering import cluster_spawns, mid_spawns__realtime
+
+
+# ------------------------- Previous Implementations ------------------------- #
+
+def reference__cluster_spawns(points, colors, max_distance=300):
+    clusters = {}
+    
+    for pos, color in zip(points, colors):
+        if color not in clusters:
+            clusters[color] = {'points': [], 'color': color}
+        
+        clusters[color]['points'].append(pos)
+    
+    result = []
+    
+    for color, data in clusters.items():
+        clusters_found = []
+        
+        for point in data['points']:
+            found_cluster = False
+            
+            for cluster in clusters_found:
+                if math.sqrt((point[0] - cluster['position'][0])**2 + (point[1] - cluster['position'][1])**2) < max_distance:
+                    cluster['members'].append(point)
+                    
+                    cluster['position'] = (
+                        sum(x[0] for x in cluster['members']) / len(cluster['members']),
+                        sum(x[1] for x in cluster['members']) / len(cluster['members'])
+                    )
+                    found_cluster = True
+                    break
+            
+            if not found_cluster:
+                clusters_found.append({
+                    'name': f'pregenerated_{color}_cluster',
+                    'color': color,
+                    'position': point,
+                    'members': [point]
+                })
+        
+        result.extend(clusters_found)
+    
+    return result
+
+def reference__mid_spawns__realtime(points, colors):
+    spawns = {}
+    
+    for pos, color in zip(points, colors):
+        name = f'{math.floor(pos[0]/250)}x{math.floor(pos[1]/200)}_{color}'
+        
+        if name in spawns:
+            spawns[name]["pos_sum"][0] += pos[0]
+            spawns[name]["pos_sum"][1] += pos[1]
+            spawns[name]["count"] += 1
+        else:
+            spawns[name] = {"pos_sum": [pos[0], pos[1]], "count": 1}
+    
+    mid_spawns = []
+    for name, spawn in spawns.items():
+        name, color = name.split("_")
+        
+        mid_spawns.append({
+            "name": name,
+            "color": color,
+            "position": (spawn["pos_sum"][0]/spawn["count"], spawn["pos_sum"][1]/spawn["count"])
+        })
+    
+    return mid_spawns
+
+
+# ---------------------------------- Inputs ---------------------------------- #
+
+def make_spawns(count, seed=0, map_size=65536):
+    """Spawn points scattered around a few bases per team, like a real map but denser."""
+    rnd = random.Random(seed)
+    
+    bases = [(rnd.uniform(0, map_size), rnd.uniform(0, map_size), rnd.choice(("#174DFF", "#f40C00"))) for _ in range(max(2, count//20))]
+    
+    points, colors = [], []
+    for _ in range(count):
+        bx, by, color = rnd.choice(bases)
+        
+        points.append((bx + rnd.gauss(0, 150), by + rnd.gauss(0, 150)))
+        colors.append(color)
+    
+    return points, colors
+
+
+def timeit(func, *args):
+    t = time.perf_counter()
+    res = func(*args)
+    
+    return (time.perf_counter() - t)*1000, res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="*", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--reference-limit", type=int, default=10000, help="skip the quadratic reference above this size")
+    args = parser.parse_args()
+    
+    print(f"{'points':>8}  {'cluster ref':>12}  {'cluster':>10}  {'realtime ref':>13}  {'realtime':>10}  identical")
+    
+    for size in args.sizes:
+        points, colors = make_spawns(size)
+        
+        codes = {}
+        color_codes = [codes.setdefault(c, len(codes)) for c in colors]
+        
+        t_cluster, clusters = timeit(cluster_spawns, points, colors)
+        t_realtime, realtime = timeit(
+            mid_spawns__realtime, 
+            [p[0] for p in points], [p[1] for p in points], color_codes, list(codes)
+        )
+        
+        t_rt_ref, realtime_ref = timeit(reference__mid_spawns__realtime, points, colors)
+        identical = realtime == realtime_ref
+        
+        if size <= args.reference_limit:
+            t_ref, clusters_ref = timeit(reference__cluster_spawns, points, colors)
+            identical = identical and clusters == clusters_ref
+            ref = f"{t_ref:10.1f}ms"
+        else:
+            ref = f"{'skipped':>12}"
+        
+        print(f"{size:>8}  {ref}  {t_cluster:8.1f}ms  {t_rt_ref:11.1f}ms  {t_realtime:8.1f}ms  {identical}")
+
+
+if __name__ == "__main__":
+    main()
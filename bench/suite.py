@@ -0,0 +1,474 @@
+# pylint: disable=line-too-long, invalid-name, import-error, multiple-imports, unspecified-encoding, broad-exception-caught, trailing-whitespace, no-name-in-module, unused-import
+
+"""
+Micro-benchmarks for the reader, geometry, clustering and drawing hot paths,
+each at 10, 100, 1000 and 10000 objects. Drawing goes to a recording canvas
+stub, so no window is opened; drawing cases redraw the same frame, i.e. they
+time the pooled items path with nothing changed.
+    
+    python bench/suite.py --baseline                     # compare, exit 1 on regressions
+    python bench/suite.py --save bench/baseline.json     # store a new baseline
+    python bench/suite.py --cases geom parse --sizes 1000
+
+`bench/baseline.json` is committed with the machine it was measured on in
+its "meta" block. Timings only compare on similar hardware, so regenerate
+it (and commit it with the change) when moving to another machine.
+
+Without a display, `ImageTk.PhotoImage` can't be created, `generate_text`
+then times the PIL rendering into a stand-in photo object.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import itertools
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import ImageTk
+
+import geom
+import thunder_reader
+from columnar import ObjectColumns, TYPES, COLORS
+from objects import ObjectDrawer
+
+from json_decode import make_payload
+from spawn_clustering import make_spawns
+
+
+SIZES = (10, 100, 1000, 10000)
+MAP_SIZE = 65536
+
+FONT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "local", "font.ttf")
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                     Stubs                                    #
+# ---------------------------------------------------------------------------- #
+
+
+class RecordingCanvas:
+    """Accepts the Canvas calls ObjectDrawer makes and only counts them."""
+    
+    def __init__(self):
+        self.ids = itertools.count(1)
+        self.calls = {}
+    
+    def _record(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+    
+    def __getattr__(self, name):
+        if name.startswith("create_"):
+            def create(*args, **kwargs):
+                self._record(name)
+                return next(self.ids)
+            
+            return create
+        
+        def call(*args, **kwargs):
+            self._record(name)
+        
+        return call
+
+
+class StandInPhoto:
+    def __init__(self, image=None, **kwargs):
+        self.image = image
+    
+    def width(self):
+        return self.image.size[0]
+    
+    def height(self):
+        return self.image.size[1]
+    
+    def paste(self, image):
+        self.image = image
+
+
+def use_photo_stand_in():
+    try:
+        import tkinter
+        tkinter.Tk().withdraw()
+        return False
+    except Exception:
+        ImageTk.PhotoImage = StandInPhoto
+        return True
+
+
+class StaticSession:
+    """ThunderSession stand-in serving one fixed map_obj.json body."""
+    
+    def __init__(self, payload):
+        self.payload = payload
+        self.decoder = thunder_reader.get_decoder()
+        self.stats = {}
+    
+    def get(self, url, reuse_buffer=False):
+        if url == thunder_reader.THUNDER_MAP_INFO_PATH:
+            return b'{"valid": false}' # keeps map_init from touching local/map.png
+        
+        return self.payload
+    
+    def get_json(self, url):
+        return self.decoder.decode(self.get(url))
+    
+    def probe(self, *args):
+        return True
+    
+    def close(self):
+        pass
+
+
+def make_reader(payload=b"[]", columnar=True):
+    reader = thunder_reader.MapReader(session=StaticSession(payload), columnar=columnar)
+    
+    reader._map_size = (MAP_SIZE, MAP_SIZE)
+    reader.isReady = True
+    
+    return reader
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                     Cases                                    #
+# ---------------------------------------------------------------------------- #
+#
+#   Every case takes the object count and returns a function doing the work
+#   once. Setup cost is not timed.
+
+
+CASES = {}
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    
+    return register
+
+
+# ----------------------------------- Reader ---------------------------------- #
+
+def setup__update_objects_data(n, columnar):
+    reader = make_reader(make_payload(n), columnar)
+    
+    def run():
+        reader._objects_fingerprint = None # parse every time, not the unchanged shortcut
+        reader.update_objects_data()
+    
+    return run
+
+@case("parse.columns")
+def setup__parse_columns(n):
+    return setup__update_objects_data(n, True)
+
+@case("parse.dicts")
+def setup__parse_dicts(n):
+    return setup__update_objects_data(n, False)
+
+@case("reader.abs")
+def setup__abs(n):
+    reader = make_reader()
+    rnd = random.Random(0)
+    positions = [(rnd.uniform(0, MAP_SIZE), rnd.uniform(0, MAP_SIZE)) for _ in range(n)]
+    
+    def run():
+        for pos in positions:
+            reader.abs(pos)
+    
+    return run
+
+@case("reader.pabs")
+def setup__pabs(n):
+    reader = make_reader()
+    rnd = random.Random(0)
+    positions = [(rnd.uniform(0, MAP_SIZE), rnd.uniform(0, MAP_SIZE), 0.6, 0.8) for _ in range(n)]
+    
+    def run():
+        for pos in positions:
+            reader.pabs(pos)
+    
+    return run
+
+
+# ---------------------------------- Spawns ---------------------------------- #
+
+def spawn_reader(n, columnar):
+    points, colors = make_spawns(n, map_size=MAP_SIZE)
+    
+    reader = make_reader(columnar=False)
+    reader.objects = {
+        "ground": [],
+        "other": [{"type": "respawn_base_tank", "position": p, "color": c} for p, c in zip(points, colors)],
+        "player": None
+    }
+    
+    if columnar:
+        n = len(points)
+        reader.columns = ObjectColumns(
+            np.array([p[0] for p in points]), np.array([p[1] for p in points]),
+            np.full(n, np.nan), np.full(n, np.nan),
+            np.full(n, TYPES.code("respawn_base_tank"), dtype=np.int32),
+            np.array([COLORS.code(c) for c in colors], dtype=np.int32),
+            np.ones(n, dtype=np.int8),
+            {}, None
+        )
+    
+    return reader
+
+@case("spawns.generate_mid_spawns")
+def setup__generate_mid_spawns(n):
+    reader = spawn_reader(n, False)
+    
+    return reader.generate_mid_spawns
+
+@case("spawns.realtime.dicts")
+def setup__realtime_dicts(n):
+    reader = spawn_reader(n, False)
+    
+    return reader.get_mid_spawns__realtime
+
+@case("spawns.realtime.columns")
+def setup__realtime_columns(n):
+    reader = spawn_reader(n, True)
+    
+    return reader.get_mid_spawns__realtime
+
+
+# ----------------------------------- Geom ----------------------------------- #
+
+@case("geom.rotate_points")
+def setup__rotate_points(n):
+    rnd = random.Random(0)
+    points = [(rnd.uniform(-10, 10), rnd.uniform(-10, 10)) for _ in range(n)]
+    
+    return lambda: geom.rotate_points(points, 0.7)
+
+@case("geom.segment_square_intersection")
+def setup__segment_square_intersection(n):
+    rnd = random.Random(0)
+    segments = [((rnd.uniform(-1, 2), rnd.uniform(-1, 2)), (rnd.uniform(-1, 2), rnd.uniform(-1, 2))) for _ in range(n)]
+    square = ((0, 0), (1, 1))
+    
+    def run():
+        for segment in segments:
+            geom.segment_square_intersection(segment, square)
+    
+    return run
+
+
+# ---------------------------------- Drawing --------------------------------- #
+
+def make_drawer():
+    drawer = ObjectDrawer(RecordingCanvas(), (400, 400), (3, 3), (4, 4))
+    drawer.load_font(FONT_PATH, 10)
+    drawer.set_zoom(3.25)
+    drawer.set_player_pos((0.5, 0.5, 0.6, 0.8))
+    
+    return drawer
+
+@case("draw.generate_text")
+def setup__generate_text(n):
+    drawer = make_drawer()
+    texts = [f"{i/10:.1f}km" for i in range(n)]
+    
+    def run():
+        drawer.text_cache.clear() # cold cache, every text is rendered
+        
+        for text in texts:
+            drawer.generate_text(text, "#174DFF")
+    
+    return run
+
+@case("draw.draw_object__by_points")
+def setup__draw_object__by_points(n):
+    drawer = make_drawer()
+    rnd = random.Random(0)
+    positions = [(rnd.uniform(0.4, 0.6), rnd.uniform(0.4, 0.6)) for _ in range(n)]
+    points = drawer.shape__plane()
+    
+    def run():
+        drawer.begin_frame()
+        
+        for x, y in positions:
+            drawer.draw_object__by_points(x, y, points, "#174DFF")
+        
+        drawer.end_frame()
+    
+    return run
+
+@case("draw.draw_objects__by_points")
+def setup__draw_objects__by_points(n):
+    drawer = make_drawer()
+    rnd = np.random.default_rng(0)
+    xs = rnd.uniform(0.4, 0.6, n)
+    ys = rnd.uniform(0.4, 0.6, n)
+    colors = ["#174DFF"]*n
+    points = drawer.shape__plane()
+    
+    def run():
+        drawer.begin_frame()
+        drawer.draw_objects__by_points(xs, ys, points, colors)
+        drawer.end_frame()
+    
+    return run
+
+@case("draw.draw_object__plane")
+def setup__draw_object__plane(n):
+    drawer = make_drawer()
+    rnd = random.Random(0)
+    planes = [(rnd.uniform(0.4, 0.6), rnd.uniform(0.4, 0.6), rnd.uniform(-1, 1), rnd.uniform(-1, 1)) for _ in range(n)]
+    
+    def run():
+        drawer.begin_frame()
+        
+        for x, y, dx, dy in planes:
+            drawer.draw_object__plane(x, y, dx, dy, "#174DFF")
+        
+        drawer.end_frame()
+    
+    return run
+
+@case("draw.draw_objects__plane")
+def setup__draw_objects__plane(n):
+    drawer = make_drawer()
+    rnd = np.random.default_rng(0)
+    xs = rnd.uniform(0.4, 0.6, n)
+    ys = rnd.uniform(0.4, 0.6, n)
+    dxs = rnd.uniform(-1, 1, n)
+    dys = rnd.uniform(-1, 1, n)
+    colors = ["#174DFF"]*n
+    
+    def run():
+        drawer.begin_frame()
+        drawer.draw_objects__plane(xs, ys, dxs, dys, colors)
+        drawer.end_frame()
+    
+    return run
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                    Runner                                    #
+# ---------------------------------------------------------------------------- #
+
+
+def measure(func, min_time, min_runs):
+    func() # warm up caches and lazy imports
+    
+    timings = []
+    started = time.perf_counter()
+    
+    while len(timings) < min_runs or time.perf_counter() - started < min_time:
+        t = time.perf_counter_ns()
+        func()
+        timings.append((time.perf_counter_ns() - t)/1e6)
+    
+    return {
+        "median_ms": statistics.median(timings),
+        "min_ms": min(timings),
+        "runs": len(timings)
+    }
+
+
+def compare(results, baseline, threshold):
+    """Rows (key, baseline ms, current ms, ratio, regressed) for keys in both runs."""
+    rows = []
+    
+    for key, res in results.items():
+        base = baseline.get(key)
+        
+        if not base:
+            continue
+        
+        ratio = res["median_ms"]/base["median_ms"] if base["median_ms"] else float("inf")
+        rows.append((key, base["median_ms"], res["median_ms"], ratio, ratio > 1 + threshold))
+    
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="*", default=[], help="only cases whose name starts with one of these")
+    parser.add_argument("--sizes", type=int, nargs="*", default=list(SIZES))
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per case and size")
+    parser.add_argument("--min-runs", type=int, default=5)
+    parser.add_argument("--save", help="write the results as JSON")
+    parser.add_argument("--baseline", nargs="?", const=BASELINE_FILE, help=f"JSON from an earlier --save to compare against (default {os.path.relpath(BASELINE_FILE)})")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown against the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+    
+    if args.baseline and not os.path.isfile(args.baseline):
+        parser.error(f"baseline {args.baseline} does not exist, create it with --save {args.baseline}")
+    
+    stand_in = use_photo_stand_in()
+    
+    cases = {name: setup for name, setup in CASES.items() if not args.cases or any(name.startswith(prefix) for prefix in args.cases)}
+    results = {}
+    
+    print(f"{'case':<36}" + "".join(f"{n:>12}" for n in args.sizes) + "   (ms, median)")
+    
+    for name, setup in cases.items():
+        row = []
+        
+        for n in args.sizes:
+            res = measure(setup(n), args.min_time, args.min_runs)
+            results[f"{name}/{n}"] = res
+            row.append(res["median_ms"])
+        
+        print(f"{name:<36}" + "".join(f"{ms:>12.4f}" for ms in row))
+    
+    if stand_in and "draw.generate_text" in cases:
+        print("\n(no display: draw.generate_text timed with a stand-in PhotoImage)")
+    
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "meta": {
+                    "python": platform.python_version(),
+                    "numpy": np.__version__,
+                    "platform": platform.platform(),
+                    "json_backend": thunder_reader.get_decoder().name,
+                    "photo_stand_in": stand_in,
+                    "time": time.strftime("%Y-%m-%d %H:%M:%S")
+                },
+                "results": results
+            }, f, indent=2)
+        
+        print(f"\nResults saved to {args.save}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        
+        meta = baseline.get("meta", {})
+        print(f"\nBaseline {args.baseline}: {meta.get('time', '?')}, {meta.get('platform', '?')}, Python {meta.get('python', '?')}, {meta.get('json_backend', '?')}")
+        
+        rows = compare(results, baseline["results"], args.threshold)
+        regressions = [row for row in rows if row[4]]
+        
+        if not rows:
+            print("No timings in common with the baseline (other cases or sizes)")
+            sys.exit(1)
+        
+        print(f"\n{'case':<44}{'baseline':>12}{'current':>12}{'ratio':>8}")
+        for key, base, cur, ratio, regressed in rows:
+            print(f"{key:<44}{base:>12.4f}{cur:>12.4f}{ratio:>8.2f}" + ("  REGRESSION" if regressed else ""))
+        
+        if regressions:
+            print(f"\n{len(regressions)} of {len(rows)} timings are more than {args.threshold:.0%} slower than the baseline")
+            sys.exit(1)
+        
+        print(f"\nNo regressions above {args.threshold:.0%} ({len(rows)} timings compared)")
+
+
+if __name__ == "__main__":
+    main()
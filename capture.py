@@ -0,0 +1,374 @@
+# pylint: disable=line-too-long, invalid-name, import-error, multiple-imports, unspecified-encoding, broad-exception-caught, trailing-whitespace, no-name-in-module, unused-import
+
+import os
+import mmap
+import struct
+import time
+import zlib
+import hashlib
+import bisect
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                    Format                                    #
+# ---------------------------------------------------------------------------- #
+#
+#   file    = MAGIC, version (u8), codec (u8), records...
+#   record  = kind (u8), flags (u8), time (f64, seconds since capture start),
+#             size (u32), payload (size bytes)
+#
+#   All numbers are little endian. A payload is compressed with the file
+#   codec when flags has FLAG_COMPRESSED, compression is skipped for payloads
+#   that don't get smaller. Map images are written once per distinct image.
+
+
+MAGIC = b"WTMC"
+VERSION = 1
+
+HEADER = struct.Struct("<4sBB")
+RECORD = struct.Struct("<BBdI")
+
+KIND_OBJECTS = 1
+KIND_MAP_INFO = 2
+KIND_MAP_IMG = 3
+
+FLAG_COMPRESSED = 1
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+CODECS = {"none": CODEC_NONE, "zlib": CODEC_ZLIB, "zstd": CODEC_ZSTD}
+
+
+def url_kind(url):
+    """Record kind for an API url, None for urls that are not captured."""
+    path = url.rsplit("/", 1)[-1]
+    
+    return {
+        "map_obj.json": KIND_OBJECTS,
+        "map_info.json": KIND_MAP_INFO,
+        "map.img": KIND_MAP_IMG
+    }.get(path)
+
+
+def get_codec(name="auto"):
+    if name == "auto":
+        return CODEC_ZSTD if zstandard else CODEC_ZLIB
+    
+    if name not in CODECS:
+        raise ValueError(f"Unknown capture codec {name!r} (expected auto, {', '.join(CODECS)})")
+    
+    if name == "zstd" and not zstandard:
+        raise ValueError("Capture codec 'zstd' requires the zstandard package")
+    
+    return CODECS[name]
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                    Writing                                   #
+# ---------------------------------------------------------------------------- #
+
+
+class CaptureWriter:
+    """Appends API responses to a capture file, see the format above."""
+    
+    def __init__(self, path, codec="auto"):
+        self.path = path
+        self.codec = get_codec(codec)
+        
+        if self.codec == CODEC_ZSTD:
+            self._compress = zstandard.ZstdCompressor(level=3).compress
+        elif self.codec == CODEC_ZLIB:
+            self._compress = lambda data: zlib.compress(data, 1)
+        else:
+            self._compress = None
+        
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, self.codec))
+        
+        self._lock = threading.Lock()
+        self._images = set()
+        self._start = time.perf_counter()
+        
+        self.records = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        
+        logger.info("Capturing API responses to %s", path)
+    
+    def write(self, kind, data, t=None):
+        if kind == KIND_MAP_IMG:
+            digest = hashlib.sha1(data).digest()
+            
+            if digest in self._images:
+                return
+            
+            self._images.add(digest)
+        
+        t = (time.perf_counter() if t is None else t) - self._start
+        
+        flags = 0
+        payload = data
+        
+        if self._compress:
+            compressed = self._compress(data)
+            
+            if len(compressed) < len(data):
+                flags |= FLAG_COMPRESSED
+                payload = compressed
+        
+        with self._lock:
+            if self._file.closed:
+                return # closed on shutdown while a request was still running
+            
+            self._file.write(RECORD.pack(kind, flags, t, len(payload)))
+            self._file.write(payload)
+            
+            self.records += 1
+            self.raw_bytes += len(data)
+            self.stored_bytes += RECORD.size + len(payload)
+    
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            
+            self._file.close()
+        
+        logger.info("Capture closed: %d records, %.1f MB -> %.1f MB", self.records, self.raw_bytes/1e6, self.stored_bytes/1e6)
+
+
+
+class CaptureSession:
+    """
+    Wraps a `ThunderSession` (or anything with the same interface) and
+    writes every map_obj.json, map_info.json and map.img body it returns
+    into a `CaptureWriter`.
+    """
+    
+    def __init__(self, http, writer):
+        self.http = http
+        self.writer = writer
+    
+    @property
+    def decoder(self):
+        return self.http.decoder
+    
+    @property
+    def stats(self):
+        return self.http.stats
+    
+    def get(self, url, reuse_buffer=False):
+        body = self.http.get(url, reuse_buffer)
+        kind = url_kind(url)
+        
+        if kind is not None:
+            self.writer.write(kind, body)
+        
+        return body
+    
+    def get_json(self, url):
+        return self.decoder.decode(self.get(url, reuse_buffer=True))
+    
+    def probe(self, *args):
+        return self.http.probe(*args)
+    
+    def close(self):
+        try:
+            self.http.close()
+        finally:
+            self.writer.close()
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                    Reading                                   #
+# ---------------------------------------------------------------------------- #
+
+
+class CaptureReader:
+    """
+    Memory mapped capture file. Opening only scans the record headers,
+    payloads are sliced out of the mapping (and decompressed) on access, so
+    captures of any length don't have to fit into memory.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, version, self.codec = HEADER.unpack_from(self._map, 0)
+        
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported capture version {version}")
+        
+        if self.codec == CODEC_ZSTD:
+            if not zstandard:
+                raise ValueError(f"{path} is zstd compressed, install the zstandard package to read it")
+            
+            self._decompress = zstandard.ZstdDecompressor().decompress
+        else:
+            self._decompress = zlib.decompress
+        
+        # per kind: record times and (offset, flags, size) of the payloads
+        self.times = {KIND_OBJECTS: [], KIND_MAP_INFO: [], KIND_MAP_IMG: []}
+        self.entries = {KIND_OBJECTS: [], KIND_MAP_INFO: [], KIND_MAP_IMG: []}
+        
+        self._scan()
+    
+    def _scan(self):
+        offset = HEADER.size
+        end = len(self._map)
+        
+        while offset + RECORD.size <= end:
+            kind, flags, t, size = RECORD.unpack_from(self._map, offset)
+            offset += RECORD.size
+            
+            if offset + size > end:
+                logger.warning("%s: truncated record at the end, ignored", self.path)
+                break
+            
+            if kind in self.times:
+                self.times[kind].append(t)
+                self.entries[kind].append((offset, flags, size))
+            
+            offset += size
+    
+    def __len__(self):
+        return len(self.times[KIND_OBJECTS])
+    
+    @property
+    def duration(self):
+        times = [t[-1] for t in self.times.values() if t]
+        
+        return max(times) if times else 0.0
+    
+    def payload(self, kind, i):
+        offset, flags, size = self.entries[kind][i]
+        data = self._map[offset:offset + size]
+        
+        if flags & FLAG_COMPRESSED:
+            data = self._decompress(data)
+        
+        return data
+    
+    def latest(self, kind, t):
+        """Index of the last `kind` record at or before `t`, None if there is none."""
+        i = bisect.bisect_right(self.times[kind], t) - 1
+        
+        return i if i >= 0 else None
+    
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+
+class ReplaySession:
+    """
+    Serves a capture through the `ThunderSession` interface, so it can be
+    passed to `MapReader(session=...)`.
+    
+    With a `speed` (1 = real time, 4 = four times faster) every request
+    returns the newest record at the replay clock. With `speed=None` every
+    map_obj.json request returns the next record, as fast as the reader
+    asks. map_info.json and map.img follow the current objects record. Once
+    the capture is over, requests fail like a closed game would.
+    """
+    
+    def __init__(self, path, speed=1.0, decoder=None):
+        self.capture = CaptureReader(path)
+        self.speed = speed
+        self.decoder = decoder # MapReader fills in its own when None
+        
+        self.stats = {}
+        
+        self._cursor = -1
+        self._started = None
+        
+        logger.info("Replaying %s: %d object records, %.1fs, speed %s", path, len(self.capture), self.capture.duration, speed or "max")
+    
+    @property
+    def finished(self):
+        if self.speed is None:
+            return self._cursor >= len(self.capture) - 1
+        
+        # timed: the last poll may fall before the last record, only the clock tells
+        return self._clock() > self.capture.duration
+    
+    def _clock(self):
+        if self._started is None:
+            self._started = time.perf_counter()
+        
+        return (time.perf_counter() - self._started)*self.speed
+    
+    def _now(self, advance):
+        """Capture time the next response comes from."""
+        times = self.capture.times[KIND_OBJECTS]
+        
+        if self.speed is None:
+            if advance:
+                if self._cursor >= len(times) - 1:
+                    raise ConnectionRefusedError("Capture replay finished")
+                
+                self._cursor += 1
+            
+            return times[self._cursor] if self._cursor >= 0 else (times[0] if times else 0.0)
+        
+        t = self._clock()
+        
+        if t > self.capture.duration:
+            self._cursor = len(times) - 1
+            raise ConnectionRefusedError("Capture replay finished")
+        
+        self._cursor = bisect.bisect_right(times, t) - 1
+        
+        return t
+    
+    def get(self, url, reuse_buffer=False):
+        kind = url_kind(url)
+        
+        if kind is None:
+            raise ConnectionRefusedError(f"{url} is not in the capture")
+        
+        t = self._now(advance=kind == KIND_OBJECTS)
+        i = self.capture.latest(kind, t)
+        
+        if i is None:
+            # nothing recorded yet at this point (e.g. the image comes after the first objects)
+            i = 0 if self.capture.times[kind] else None
+        
+        if i is None:
+            raise ConnectionRefusedError(f"No {url.rsplit('/', 1)[-1]} in the capture")
+        
+        self.stats[url] = self.stats.get(url, 0) + 1
+        
+        return self.capture.payload(kind, i)
+    
+    def get_json(self, url):
+        return self.decoder.decode(self.get(url, reuse_buffer=True))
+    
+    def probe(self, *args):
+        return not self.finished
+    
+    def close(self):
+        self.capture.close()
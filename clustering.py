@@ -0,0 +1,144 @@
+# pylint: disable=line-too-long, invalid-name, import-error, multiple-imports, unspecified-encoding, broad-exception-caught, trailing-whitespace, no-name-in-module, unused-import
+
+import math
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+REALTIME_CELL = (250, 200) # meters, grid used by the realtime spawn centers
+
+
+
+# ---------------------------------------------------------------------------- #
+#                              Pregenerated Spawns                             #
+# ---------------------------------------------------------------------------- #
+
+
+def cluster_spawns(points, colors, max_distance=300):
+    """
+    Greedy single-pass clustering of spawn points, per color.
+    
+    A point joins the oldest cluster of its color whose centroid is closer
+    than `max_distance`, otherwise it starts a new one. Centroids are kept as
+    running sums and clusters are hashed into a grid of `max_distance`
+    cells, so only the 3x3 cells around a point have to be checked. The
+    output (order, names, positions, members) is the same as the old
+    all-pairs version in MapReader.generate_mid_spawns.
+    """
+    clusters = {} # color -> clusters in creation order
+    grid = {}     # (color, cell x, cell y) -> indices into clusters[color]
+    
+    def cell(pos):
+        return (math.floor(pos[0]/max_distance), math.floor(pos[1]/max_distance))
+    
+    for point, color in zip(points, colors):
+        found = clusters.setdefault(color, [])
+        
+        cx, cy = cell(point)
+        best = None
+        
+        for ix in (cx - 1, cx, cx + 1):
+            for iy in (cy - 1, cy, cy + 1):
+                for i in grid.get((color, ix, iy), ()):
+                    if best is not None and i > best:
+                        continue
+                    
+                    pos = found[i]['position']
+                    if math.sqrt((point[0] - pos[0])**2 + (point[1] - pos[1])**2) < max_distance:
+                        best = i
+        
+        if best is None:
+            found.append({
+                'name': f'pregenerated_{color}_cluster',
+                'color': color,
+                'position': point,
+                'members': [point],
+                '_sum': [point[0], point[1]],
+                '_cell': (cx, cy)
+            })
+            grid.setdefault((color, cx, cy), []).append(len(found) - 1)
+            continue
+        
+        cluster = found[best]
+        cluster['members'].append(point)
+        
+        # the running sum adds members in the same order as sum(), so the centroid is bit-identical
+        cluster['_sum'][0] += point[0]
+        cluster['_sum'][1] += point[1]
+        cluster['position'] = (
+            cluster['_sum'][0] / len(cluster['members']),
+            cluster['_sum'][1] / len(cluster['members'])
+        )
+        
+        new_cell = cell(cluster['position'])
+        if new_cell != cluster['_cell']:
+            grid[(color, *cluster['_cell'])].remove(best)
+            
+            bucket = grid.setdefault((color, *new_cell), [])
+            bucket.append(best)
+            bucket.sort()
+            
+            cluster['_cell'] = new_cell
+    
+    result = []
+    for found in clusters.values():
+        for cluster in found:
+            del cluster['_sum'], cluster['_cell']
+            result.append(cluster)
+    
+    return result
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                Realtime Spawns                               #
+# ---------------------------------------------------------------------------- #
+
+
+def mid_spawns__realtime(xs, ys, color_codes, color_values, cell=REALTIME_CELL):
+    """
+    Mean position of the spawn points in every (grid cell, color) bucket.
+    
+    Buckets are keyed by integers (cell x, cell y, color code), never by
+    strings, and are returned in first-seen order, with the same sums as
+    adding the points one by one.
+    """
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    
+    if len(xs) == 0:
+        return []
+    
+    gx = np.floor(xs/cell[0]).astype(np.int64)
+    gy = np.floor(ys/cell[1]).astype(np.int64)
+    
+    codes = np.asarray(color_codes, dtype=np.int64)
+    
+    # one integer per (cell x, cell y, color), so np.unique works on a flat array
+    ux = gx - gx.min()
+    uy = gy - gy.min()
+    keys = (ux*(int(uy.max()) + 1) + uy)*(int(codes.max()) + 1) + codes
+    
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    
+    count = np.bincount(inverse)
+    sum_x = np.bincount(inverse, weights=xs)
+    sum_y = np.bincount(inverse, weights=ys)
+    
+    mid_spawns = []
+    for k in np.argsort(first, kind="stable").tolist():
+        i = first[k]
+        
+        mid_spawns.append({
+            "name": f"{gx[i]}x{gy[i]}",
+            "color": color_values[codes[i]],
+            "position": (
+                float(sum_x[k]/count[k]),
+                float(sum_y[k]/count[k])
+            )
+        })
+    
+    return mid_spawns
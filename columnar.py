@@ -0,0 +1,341 @@
+# pylint: disable=line-too-long, invalid-name, import-error, multiple-imports, unspecified-encoding, broad-exception-caught, trailing-whitespace, no-name-in-module, unused-import
+
+import copy
+import math
+import numpy as np
+
+from spatial import GridIndex
+from clustering import mid_spawns__realtime
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                   Interning                                  #
+# ---------------------------------------------------------------------------- #
+
+
+class Interner:
+    """Maps strings (object types, colors) to small stable integer codes."""
+    
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+    
+    def code(self, value):
+        code = self.codes.get(value)
+        
+        if code is None:
+            code = len(self.values)
+            
+            self.codes[value] = code
+            self.values.append(value)
+        
+        return code
+    
+    def value(self, code):
+        return self.values[code]
+
+
+TYPES = Interner()
+COLORS = Interner()
+
+GROUP_GROUND = 0
+GROUP_OTHER = 1
+
+# fields kept in the per row side table (airfield runway ends), the rest are dropped
+EXTRA_FIELDS = ("ex", "ey")
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                 Object Columns                               #
+# ---------------------------------------------------------------------------- #
+
+
+class ObjectColumns:
+    """
+    Columnar form of one map_obj.json response.
+    
+    Positions are in meters (already multiplied by the map size), `dx`/`dy`
+    are NaN for objects without a direction. `type` and `color` hold codes
+    from the module level `TYPES`/`COLORS` interners. Rare fields (airfield
+    end points and the like) are kept per row in `extra`.
+    """
+    
+    __slots__ = ("x", "y", "dx", "dy", "type", "color", "group", "extra", "player", "index", "index_slack", "vx", "vy", "turn", "player_motion", "moving", "_objects")
+    
+    def __init__(self, x, y, dx, dy, type_, color, group, extra, player):
+        self.x = x
+        self.y = y
+        self.dx = dx
+        self.dy = dy
+        
+        self.type = type_
+        self.color = color
+        self.group = group
+        
+        self.extra = extra
+        self.player = player
+        
+        self.index = None
+        self.index_slack = 0 # meters the positions may have moved since the index was built
+        
+        # filled by ObjectTracker: m/s, rad/s and (vx, vy, turn) of the player
+        self.vx = None
+        self.vy = None
+        self.turn = None
+        self.player_motion = None
+        self.moving = False
+        
+        self._objects = None
+    
+    def __len__(self):
+        return len(self.x)
+    
+    
+    # ----------------------------------- Build ---------------------------------- #
+    
+    @classmethod
+    def from_json(cls, data, map_size):
+        mx, my = map_size
+        nan = math.nan
+        
+        # plain lists while walking the objects, one array per column at the end
+        x, y, dx, dy, styles = [], [], [], [], []
+        add_x, add_y, add_dx, add_dy, add_style = x.append, y.append, dx.append, dy.append, styles.append
+        
+        # (icon, type, color) -> row of the style table, interned once per distinct style
+        style_rows = {}
+        
+        extra = {}
+        player = None
+        
+        for obj in data:
+            icon = obj['icon']
+            
+            if icon == "Player":
+                player = (obj['x']*mx, obj['y']*my, obj['dx'], obj['dy'])
+                continue
+            
+            if 'x' in obj:
+                add_x(obj['x'])
+                add_y(obj['y'])
+            else:
+                add_x(obj['sx'])
+                add_y(obj['sy'])
+                
+                if 'ex' in obj: # airfields: the runway end
+                    extra[len(x) - 1] = {field: obj[field] for field in EXTRA_FIELDS}
+            
+            if 'dx' in obj:
+                add_dx(obj['dx'])
+                add_dy(obj['dy'])
+            else:
+                add_dx(nan)
+                add_dy(nan)
+            
+            style = (icon, obj['type'], obj['color'])
+            row = style_rows.get(style)
+            
+            if row is None:
+                row = style_rows[style] = len(style_rows)
+            
+            add_style(row)
+        
+        table = np.array([
+            (
+                TYPES.code(icon if icon != 'none' else kind), 
+                COLORS.code(color), 
+                GROUP_GROUND if kind == "ground_model" else GROUP_OTHER
+            )
+            for icon, kind, color in style_rows
+        ], dtype=np.int32).reshape(-1, 3)
+        
+        rows = np.array(styles, dtype=np.intp)
+        
+        return cls(
+            np.array(x, dtype=float)*mx, np.array(y, dtype=float)*my,
+            np.array(dx, dtype=float), np.array(dy, dtype=float),
+            table[rows, 0], table[rows, 1], table[rows, 2].astype(np.int8),
+            extra, player
+        )
+    
+    
+    def build_index(self, cell_size):
+        self.index = GridIndex(self.x, self.y, cell_size)
+        
+        return self.index
+    
+    
+    def extrapolated(self, dt):
+        """Copy with every tracked object and the player moved `dt` seconds along its motion."""
+        if self.vx is None or dt <= 0:
+            return self
+        
+        angle = self.turn*dt
+        cos = np.cos(angle)
+        sin = np.sin(angle)
+        
+        player = self.player
+        if player and self.player_motion:
+            pvx, pvy, pturn = self.player_motion
+            pcos, psin = math.cos(pturn*dt), math.sin(pturn*dt)
+            
+            player = (
+                player[0] + pvx*dt,
+                player[1] + pvy*dt,
+                player[2]*pcos - player[3]*psin,
+                player[2]*psin + player[3]*pcos
+            )
+        
+        res = ObjectColumns(
+            self.x + self.vx*dt, self.y + self.vy*dt,
+            self.dx*cos - self.dy*sin, self.dx*sin + self.dy*cos,
+            self.type, self.color, self.group,
+            self.extra, player
+        )
+        
+        res.index = self.index
+        res.index_slack = self.index_slack + float(np.hypot(self.vx, self.vy).max(initial=0))*dt
+        
+        res.vx, res.vy, res.turn = self.vx, self.vy, self.turn
+        res.player_motion = self.player_motion
+        res.moving = self.moving
+        
+        return res
+    
+    def at_rest(self):
+        """Copy sharing the positions, with no motion: the server resent the same objects."""
+        if not self.moving:
+            return self
+        
+        res = copy.copy(self)
+        res.vx = np.zeros(len(self))
+        res.vy = np.zeros(len(self))
+        res.turn = np.zeros(len(self))
+        res.player_motion = (0.0, 0.0, 0.0)
+        res.moving = False
+        
+        return res
+    
+    
+    def motion(self):
+        """(fastest speed in m/s, fastest turn in rad/s) over the objects and the player."""
+        if self.vx is None:
+            return 0.0, 0.0
+        
+        speed = float(np.hypot(self.vx, self.vy).max(initial=0))
+        turn = float(np.abs(self.turn).max(initial=0))
+        
+        if self.player_motion:
+            pvx, pvy, pturn = self.player_motion
+            
+            speed = max(speed, math.hypot(pvx, pvy))
+            turn = max(turn, abs(pturn))
+        
+        return speed, turn
+    
+    
+    # ---------------------------------- Selects --------------------------------- #
+    
+    def mask_type(self, type_name):
+        code = TYPES.codes.get(type_name)
+        
+        if code is None:
+            return np.zeros(len(self), dtype=bool)
+        
+        return self.type == code
+    
+    def mask_group(self, group):
+        return self.group == group
+    
+    
+    # ------------------------------ Dict Compatible ----------------------------- #
+    
+    @property
+    def objects(self):
+        """The `MapReader.objects` layout, lists are only built when accessed."""
+        if self._objects is None:
+            self._objects = ObjectsView(self)
+        
+        return self._objects
+    
+    def to_objects(self):
+        objects = {
+            "ground": [],
+            "other": [],
+            "player": self.player
+        }
+        
+        has_dir = ~np.isnan(self.dx)
+        
+        for i, (x, y, t, c, g, d) in enumerate(zip(self.x.tolist(), self.y.tolist(), self.type.tolist(), self.color.tolist(), self.group.tolist(), has_dir.tolist())):
+            data = {
+                "type": TYPES.values[t],
+                "position": (x, y),
+                "color": COLORS.values[c]
+            }
+            
+            if g == GROUP_GROUND:
+                objects["ground"].append(data)
+                continue
+            
+            if d:
+                data["dir"] = (float(self.dx[i]), float(self.dy[i]))
+            
+            objects["other"].append(data)
+        
+        return objects
+    
+    
+    # --------------------------------- Distances -------------------------------- #
+    
+    def distances(self, x, y):
+        return np.hypot(self.x - x, self.y - y)
+    
+    def player__distances(self):
+        if not self.player:
+            return np.zeros(len(self))
+        
+        return self.distances(self.player[0], self.player[1])
+    
+    def player__get_distance(self, x, y):
+        if not self.player:
+            return 0
+        
+        return math.sqrt((x - self.player[0])**2 + (y - self.player[1])**2)
+    
+    
+    # ---------------------------------- Spawns ---------------------------------- #
+    
+    def get_mid_spawns__realtime(self):
+        mask = self.mask_type("respawn_base_tank")
+        
+        if not mask.any():
+            return []
+        
+        return mid_spawns__realtime(self.x[mask], self.y[mask], self.color[mask], COLORS.values)
+
+
+
+class ObjectsView(dict):
+    """
+    Dict with the `MapReader.objects` keys. "player" is set right away,
+    "ground"/"other" are filled from the columns on first access.
+    """
+    
+    def __init__(self, columns):
+        super().__init__(player=columns.player)
+        
+        self.columns = columns
+    
+    def __missing__(self, key):
+        if key not in ("ground", "other"):
+            raise KeyError(key)
+        
+        self.update(self.columns.to_objects())
+        
+        return self[key]
@@ -54,10 +54,13 @@ def segment_square_intersection(segment, square):
 
 
 def rotate_points(points, angle):
+    cos = math.cos(angle)
+    sin = math.sin(angle)
+
     rotated_points = []
     for px, py in points:
-        new_x = px * math.cos(angle) - py * math.sin(angle)
-        new_y = px * math.sin(angle) + py * math.cos(angle)
+        new_x = px * cos - py * sin
+        new_y = px * sin + py * cos
 
         rotated_points.append(new_x)
         rotated_points.append(new_y)
@@ -0,0 +1,72 @@
+# pylint: disable=line-too-long, invalid-name, import-error, multiple-imports, unspecified-encoding, broad-exception-caught, trailing-whitespace, no-name-in-module, unused-import
+
+import math
+from PIL import Image, ImageDraw
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+GLYPHS = "0123456789.km-x" # everything distance, length and zoom labels are made of
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                  Glyph Atlas                                 #
+# ---------------------------------------------------------------------------- #
+
+
+class GlyphAtlas:
+    """
+    The label characters of one font, rendered once per color.
+    
+    `render` composes a label by pasting the cached glyphs next to each
+    other (advances from `font.getlength`, like `ImageDraw.text` without
+    kerning), so a new distance string costs a few pastes instead of a
+    FreeType text pass. Glyphs are drawn with `fontmode = "1"`, the same
+    hard edges `ObjectDrawer.generate_text` used, and pasted with their own
+    alpha, so overhanging glyphs combine like in a single text pass.
+    """
+    
+    def __init__(self, font, height, chars=GLYPHS):
+        self.font = font
+        self.height = height
+        self.chars = frozenset(chars)
+        
+        self.advances = {c: font.getlength(c) for c in chars}
+        self.colors = {} # color -> {char: glyph image}
+    
+    def supports(self, text):
+        return self.chars.issuperset(text)
+    
+    def glyphs(self, color):
+        glyphs = self.colors.get(color)
+        
+        if glyphs is None:
+            glyphs = self.colors[color] = {}
+            
+            for c in self.chars:
+                width = max(math.ceil(self.advances[c]), self.font.getbbox(c)[2], 1)
+                
+                img = Image.new("RGBA", (width, self.height), (255, 255, 255, 0))
+                draw = ImageDraw.Draw(img)
+                draw.fontmode = "1"
+                draw.text((0, 0), c, font=self.font, fill=color)
+                
+                glyphs[c] = img
+        
+        return glyphs
+    
+    def render(self, text, color, size):
+        """`size` RGBA image with `text` at the top left (only `supports`ed characters)."""
+        glyphs = self.glyphs(color)
+        img = Image.new("RGBA", size, (255, 255, 255, 0))
+        
+        x = 0.0
+        for c in text:
+            glyph = glyphs[c]
+            img.paste(glyph, (round(x), 0), glyph)
+            
+            x += self.advances[c]
+        
+        return img
@@ -51,16 +51,58 @@ class Config:
         self.bg_color = self.config.get("settings", "bg_color", fallback="00FFFF")
         self.transparent = bool(int(self.config.get("settings", "transparent", fallback=1)))
         
+        usual = int(self.config.get("update_time", "usual", fallback=50))
+        
         self.update_time = {
-            "usual": int(self.config.get("update_time", "usual", fallback=50)),
-            "not_working": int(self.config.get("update_time", "not_working", fallback=3000))
+            "usual": usual,
+            "fetch": int(self.config.get("update_time", "fetch", fallback=usual)),
+            "render": int(self.config.get("update_time", "render", fallback=usual)),
+            # older config.ini files name this key "not_ready"
+            "not_working": int(self.config.get("update_time", "not_working", fallback=self.config.get("update_time", "not_ready", fallback=3000))),
+            "probe": int(self.config.get("update_time", "probe", fallback=500)),
+            "probe_max": int(self.config.get("update_time", "probe_max", fallback=10000))
+        }
+        
+        # older config.ini files set a poll interval ("fetch" or "usual") instead of target_rate
+        target_rate = 1000/self.update_time["fetch"]
+        
+        self.poll_rate = {
+            "min": float(self.config.get("update_time", "min_rate", fallback=min(2.0, target_rate))),
+            "target": float(self.config.get("update_time", "target_rate", fallback=target_rate)),
+            "max": float(self.config.get("update_time", "max_rate", fallback=max(30.0, target_rate))),
         }
         
         self.cache = {
-            "max_images": int(self.config.get("cache", "max_images", fallback=300)),
+            "text_images_kb": int(self.config.get("cache", "text_images_kb", fallback=4096)),
             "use_cached_spawns_positions": bool(self.config.get("cache", "use_cached_spawns_positions", fallback=True)),
         }
 
+        self.map = {
+            "enabled": bool(int(self.config.get("map", "enabled", fallback=1))),
+            "tile_cache_mb": int(self.config.get("map", "tile_cache_mb", fallback=48)),
+            "disk_cache_mb": int(self.config.get("map", "disk_cache_mb", fallback=256)),
+            "workers": int(self.config.get("map", "workers", fallback=2)),
+        }
+        
+        self.performance = {
+            "columnar_objects": bool(int(self.config.get("performance", "columnar_objects", fallback=1))),
+            "json_backend": self.config.get("performance", "json_backend", fallback="auto"),
+            "hud": bool(int(self.config.get("performance", "hud", fallback=0))),
+            "raster_threshold": int(self.config.get("performance", "raster_threshold", fallback=400)),
+        }
+
+        self.tracking = {
+            "enabled": bool(int(self.config.get("tracking", "enabled", fallback=1))),
+            "max_speed": float(self.config.get("tracking", "max_speed", fallback=1000)),
+            "max_extrapolation": int(self.config.get("tracking", "max_extrapolation", fallback=300)),
+        }
+
+        self.capture = {
+            "record": self.config.get("capture", "record", fallback=""),
+            "replay": self.config.get("capture", "replay", fallback=""),
+            "replay_speed": float(self.config.get("capture", "replay_speed", fallback=1)),
+        }
+
         if self.config.has_section("position"):
             self.position = {
                 "x": int(self.config.get("position", "x", fallback=0)),
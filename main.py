@@ -5,6 +5,9 @@ import os
 import sys
 import time
 
+STARTED = time.perf_counter()
+STARTUP_PROFILE = "--startup-profile" in sys.argv # report the time to the first frame and exit
+
 
 # ---------------------------------- Logger ---------------------------------- #
 
@@ -23,8 +26,6 @@ logging.basicConfig(
 
 logger = log.configure_logger()
 
-os.system('cls')
-
 
 
 # ---------------------------------------------------------------------------- #
@@ -33,11 +34,13 @@ os.system('cls')
 
 
 import subprocess
-from importlib.metadata import distributions
+import importlib
+from importlib.util import find_spec
 
-required = {'pillow'}
-installed = {dist.metadata['Name'] for dist in distributions()}
-missing = required - installed
+# pip package -> module, find_spec only looks the module up on sys.path
+# (no scan of every installed distribution's metadata)
+required = {'pillow': 'PIL', 'numpy': 'numpy'}
+missing = [package for package, module in required.items() if find_spec(module) is None]
 
 if missing:
     logger.warning("Missing dependencies: %s", ", ".join(missing))
@@ -45,6 +48,8 @@ if missing:
     
     python = sys.executable
     subprocess.check_call([python, '-m', 'pip', 'install', *missing], stdout=subprocess.DEVNULL)
+    
+    importlib.invalidate_caches()
 
 
 
@@ -57,8 +62,38 @@ import local.config as clconfig
 from tkinter import *
 from tkinter import ttk
 
+import numpy as np
+
 import thunder_reader
+from columnar import COLORS, GROUP_GROUND, GROUP_OTHER
+from poller import MapPoller, PollScheduler, Deadline
+from capture import ReplaySession
+from perf import PerfMonitor, PerfHUD
 from objects import Player, ObjectDrawer, SpotsManager, MapDrawer
+from maptiles import TileDiskCache
+
+
+# ------------------------------ Startup Profile ----------------------------- #
+
+startup = {} # milestone -> seconds since start
+
+def startup_mark(name):
+    if name in startup:
+        return
+    
+    startup[name] = time.perf_counter() - STARTED
+    
+    if name != "first_frame":
+        return
+    
+    report = ", ".join(f"{key} {value*1000:.0f}ms" for key, value in startup.items())
+    logger.info("Startup: %s", report)
+    
+    if STARTUP_PROFILE:
+        print(f"Startup: {report}")
+        root.after(0, close)
+
+startup_mark("imports")
 
 
 
@@ -110,7 +145,22 @@ root.config(bg=TRANSPARENT_COLOR)
 
 logger.info("Setting up \"close\" button")
 
-b=Button(root,text="close",command=lambda:exit(0))
+POLLER_JOIN_TIMEOUT = 3 # seconds, a request in flight ends after its own timeout
+
+def close():
+    # the poller closes the reader (pooled connections, capture file) when it exits its loop
+    poller.stop()
+    poller.join(POLLER_JOIN_TIMEOUT)
+    
+    if poller.is_alive():
+        logger.warning("Poller did not stop within %ds", POLLER_JOIN_TIMEOUT)
+    
+    reader.close_capture() # no-op when the poller already closed it
+    
+    logger.info("Closed")
+    root.destroy()
+
+b=Button(root,text="close",command=close)
 b.place(x=config.size["x"]-40, rely=0, height=UPPER_PADDING, width=40)
 
 
@@ -156,14 +206,23 @@ drawer = ObjectDrawer(
         config.object_size["ground"]["x"],
         config.object_size["ground"]["y"]
     ),
-    config.zoom_affect_sprites
+    config.zoom_affect_sprites,
+    config.cache["text_images_kb"]*1024,
+    config.performance["raster_threshold"]
 )
 drawer.load_font(os.path.join(sys.path[0], "local", "font.ttf"), config.text_size)
 drawer.set_zoom(ZOOM)
 
 spots_manager = SpotsManager(drawer)
 
-#map_drawer = MapDrawer(drawer, os.path.join(sys.path[0], "local", "map.png"))
+map_drawer = None
+if config.map["enabled"]:
+    map_drawer = MapDrawer(
+        drawer, 
+        cache_bytes=config.map["tile_cache_mb"]*1024*1024,
+        disk_cache=TileDiskCache(max_bytes=config.map["disk_cache_mb"]*1024*1024),
+        workers=config.map["workers"]
+    )
 
 def change_zoom(zoom):
     ZOOM = zoom
@@ -203,7 +262,7 @@ slider.place(
 logger.info("Setting up \"show/hide\" button")
 
 def toggle_canvas():
-    global is_canvas_shown
+    global is_canvas_shown, last_frame_key
     if canvas.winfo_ismapped():
         canvas.place_forget()
         is_canvas_shown=False
@@ -212,6 +271,15 @@ def toggle_canvas():
         
         b2.config(text="show")
         
+        # no render wakeups and no requests until shown again
+        poller.set_visible(False)
+        
+        if render_job is not None:
+            canvas.after_cancel(render_job)
+        
+        drawer.clear()
+        last_frame_key = None
+        
         logger.info("Canvas hidden. Updating stopped")
     else:
         canvas.place(relx=0, y=UPPER_PADDING)
@@ -221,6 +289,11 @@ def toggle_canvas():
         
         b2.config(text="hide")
         
+        poller.set_visible(True)
+        
+        render_clock.reset()
+        schedule_frame(poller, 0)
+        
         logger.info("Canvas shown. Updating resumption")
 
 b2=Button(root,text="hide",command=toggle_canvas)
@@ -229,71 +302,11 @@ b2.place(x=config.size["x"]-80, rely=0, height=UPPER_PADDING, width=40)
 
 
 # ---------------------------------------------------------------------------- #
-#                                     Main                                     #
+#                                    Render                                    #
 # ---------------------------------------------------------------------------- #
 
-is_error_shown=False
-last_zoom=-1
-def main(reader):
-    global is_error_shown, last_zoom
-    
-    # -------------------------------- Clear Cache ------------------------------- #
-    
-    if len(drawer.images__text) > config.cache["max_images"]: 
-        drawer.clear_cache__text_images() # clearing the cache
-    
-    # -------------------------------- Update Data ------------------------------- #
-    
-    beenReady = reader.isReady
-    
-    if not is_canvas_shown:
-        canvas.delete("object")
-        canvas.delete("text")
-        
-        return canvas.after(config.update_time["usual"], main, reader)
-    
-    if not reader.update_objects_data():
-        if not is_error_shown: 
-            logger.exception(reader.last_error)
-        
-        canvas.delete("object")
-        canvas.delete("text")
-        
-        is_error_shown=True
-        return canvas.after(config.update_time["not_working"], main, reader)
-    
-    
-    # ----------------------------- Delete Last Frame ---------------------------- #
-    
-    canvas.delete("object")
-    canvas.delete("text")
-    
-    
-    # ----------------------------- New Frame Prepare ---------------------------- #
-    
-    #if not beenReady and reader.isReady:
-    #    map_img.update_img(reader.get_map_size(), ZOOM)
-    
-    is_error_shown=False
-    
-    ppos = reader.pabs(reader.objects["player"])
-    
-    drawer.set_player_pos(ppos)
-    
-    cx = 0.5*config.size["x"]
-    cy = 0.5*config.size["y"]
-    
-    
-    # ----------------------------- New Frame Render ----------------------------- #
 
-    for i in reader.get_mid_spawns(config.cache["use_cached_spawns_positions"]):
-        try:
-            pos = reader.abs(i["position"])
-            
-            drawer.draw_object__respawn_base_tank(pos[0], pos[1], i["color"])
-        except Exception as e:
-            logger.exception(f"Error drawing object {i['name'] if 'name' in i else None if i else None}: {e}")
-    
+def draw_objects__dicts(reader):
     for i in reader.objects["other"]:
         pos = reader.abs(i["position"])
         
@@ -334,28 +347,221 @@ def main(reader):
             drawer.draw_object__ground(pos[0], pos[1], i["color"])
         except Exception as e:
             logger.exception(f"Error drawing ground object {i['type'] if 'type' in i else None if i else None}: {e}")
+
+
+def draw_objects__columns(reader):
+    cols = reader.columns
+    map_s = reader.get_map_size()
+    
+    # normalized positions and colors for every object, one vectorized pass
+    xs = cols.x/map_s[0]
+    ys = cols.y/map_s[1]
+    colors = np.array(COLORS.values, dtype=object)[cols.color]
+    
+    other = cols.mask_group(GROUP_OTHER)
+    fighter = cols.mask_type("respawn_base_fighter")
+    airfield = cols.mask_type("airfield")
+    special = cols.mask_type("respawn_base_tank") | fighter | airfield # respawn_base_tank replaced with get_mid_spawns
+    has_dir = ~np.isnan(cols.dx)
+    
+    # only markers in the visible window (plus a sprite sized margin) reach the canvas,
+    # airfields are exempt because their distance label is pinned to the border
+    if cols.index is not None:
+        x0, y0, x1, y1 = drawer.view.visible_rect(drawer.view_margin())
+        
+        in_view = np.zeros(len(cols), dtype=bool)
+        slack = cols.index_slack # extrapolated positions may have left their index cell
+        in_view[cols.index.query_rect(x0*map_s[0] - slack, y0*map_s[1] - slack, x1*map_s[0] + slack, y1*map_s[1] + slack)] = True
+    else:
+        in_view = np.ones(len(cols), dtype=bool)
+    
+    fighter &= in_view
+    plane = other & has_dir & ~special & in_view
+    rest = other & ~has_dir & ~special & in_view
+    ground = cols.mask_group(GROUP_GROUND) & in_view
+    
+    try:
+        drawer.draw_objects__respawn_base_fighter(xs[fighter], ys[fighter], colors[fighter])
+        drawer.draw_objects__plane(xs[plane], ys[plane], cols.dx[plane], cols.dy[plane], colors[plane])
+        drawer.draw_objects__other(xs[rest], ys[rest], colors[rest])
+    except Exception as e:
+        logger.exception(f"Error drawing objects: {e}")
+    
+    distances = cols.player__distances()[airfield].tolist()
+    
+    for x, y, color, distance in zip(xs[airfield].tolist(), ys[airfield].tolist(), colors[airfield], distances):
+        try:
+            drawer.draw_object__airfield(x, y, color, round(distance/1000, 1))
+        except Exception as e:
+            logger.exception(f"Error drawing object airfield: {e}")
+    
+    try:
+        drawer.draw_objects__ground(xs[ground], ys[ground], colors[ground])
+    except Exception as e:
+        logger.exception(f"Error drawing ground objects: {e}")
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                     Main                                     #
+# ---------------------------------------------------------------------------- #
+
+is_error_shown=False
+last_zoom=-1
+last_map_size=None
+last_frame_key=None
+last_stacking=None
+frame_stats = {
+    "rendered": 0,
+    "skipped": 0
+}
+IDLE_RENDER_INTERVAL = 250 # ms, while there is nothing to draw
+
+render_clock = Deadline(config.update_time["render"]/1000)
+render_job = None
+def schedule_frame(poller, delay=None):
+    global render_job
+    
+    render_job = canvas.after(render_clock.delay_ms() if delay is None else delay, main, poller)
+    
+    return render_job
+
+def main(poller):
+    global is_error_shown, last_zoom, last_map_size, last_frame_key, last_stacking
+    
+    render_clock.begin()
+    
+    # -------------------------------- Update Data ------------------------------- #
+    
+    startup_mark("window")
+    
+    reader = poller.latest() # newest snapshot published by the poller thread
+    
+    if reader is None:
+        return schedule_frame(poller) # first poll still running
+    
+    startup_mark("first_snapshot")
+    
+    if not reader.isReady:
+        if not is_error_shown: 
+            logger.exception(reader.last_error)
+            
+            drawer.clear()
+        
+        is_error_shown=True
+        last_frame_key = None
+        return schedule_frame(poller, IDLE_RENDER_INTERVAL)
+    
+    # moving objects are extrapolated from the last poll, so frames between polls still change
+    extrapolate = 0
+    if config.tracking["enabled"] and reader.moving:
+        extrapolate = min(time.perf_counter() - reader.received_at, config.tracking["max_extrapolation"]/1000)
+    
+    # same payload, zoom, spots and extrapolation time as the frame on screen: nothing to redraw
+    frame_key = (reader.sequence, drawer.zoom, spots_manager.version, round(extrapolate*1000), map_drawer.version if map_drawer else None)
+    
+    if frame_key == last_frame_key:
+        frame_stats["skipped"] += 1
+        perf_hud.update()
+        
+        return schedule_frame(poller)
+    
+    last_frame_key = frame_key
+    frame_stats["rendered"] += 1
+    
+    frame_started = perf.frame_start(reader.received_at)
+    
+    
+    # ------------------------------ Reuse Last Frame ---------------------------- #
+    
+    # dense scenes are drawn into one bitmap, the rest as canvas items
+    drawer.choose_backend(len(reader.columns) if reader.columns is not None else len(reader.objects["ground"]) + len(reader.objects["other"]))
+    
+    # pooled canvas items are moved/restyled in place, leftovers hidden at the end
+    drawer.begin_frame()
+    
+    
+    # ----------------------------- New Frame Prepare ---------------------------- #
+    
+    #if not beenReady and reader.isReady:
+    #    map_img.update_img(reader.get_map_size(), ZOOM)
+    
+    is_error_shown=False
+    
+    reader = reader.extrapolate(extrapolate)
+    
+    ppos = reader.pabs(reader.objects["player"])
+    
+    drawer.set_player_pos(ppos)
+    
+    cx = 0.5*config.size["x"]
+    cy = 0.5*config.size["y"]
+    
+    
+    # ----------------------------- New Frame Render ----------------------------- #
+    
+    if map_drawer:
+        with perf.timer("map"):
+            if reader.map_hash is not None:
+                map_drawer.load_map(reader.map_image, reader.map_hash)
+            
+            map_drawer.draw_map()
+
+    with perf.timer("spawns"):
+        mid_spawns = reader.get_mid_spawns(config.cache["use_cached_spawns_positions"])
+    
+    with perf.timer("objects"):
+        for i in mid_spawns:
+            try:
+                pos = reader.abs(i["position"])
+                
+                drawer.draw_object__respawn_base_tank(pos[0], pos[1], i["color"])
+            except Exception as e:
+                logger.exception(f"Error drawing object {i['name'] if 'name' in i else None if i else None}: {e}")
+        
+        if reader.columns is not None:
+            draw_objects__columns(reader)
+        else:
+            draw_objects__dicts(reader)
     
     
     # -------------------------------- Finalizing -------------------------------- #
     
-    if last_zoom != drawer.zoom or beenReady != reader.isReady:
+    if last_zoom != drawer.zoom or last_map_size != reader.get_map_size():
         map_s = reader.get_map_size()
         
         drawer.draw_ui__length_text(map_s[0], map_s[1])
         
-        #map_drawer.load_map(map_s)
-        #map_drawer.draw_map()
-        
         last_zoom = drawer.zoom
+        last_map_size = map_s
+    
+    with perf.timer("spots"):
+        spots_manager.draw_spots(reader.get_map_size())
+    
+    drawer.end_frame()
+    
+    # pooled items keep their stacking, restack only when new items may be on top
+    stacking = (drawer.created_items, drawer.zoom, last_map_size)
+    
+    if stacking != last_stacking:
+        canvas.tag_lower("map")
+        canvas.tag_lower("map_coarse")
+        canvas.tag_raise("text")
+        canvas.tag_raise("ui__zoom_text", "ui__length_text")
+        
+        last_stacking = stacking
+    
+    with perf.timer("player"):
+        player.move(cx, cy, reader.player__heading())
+        player.keep_on_top(stacking)
     
-    canvas.tag_raise("text")
-    canvas.tag_raise("ui__zoom_text", "ui__length_text")
+    perf.frame_end(frame_started)
+    perf_hud.update(stacking=stacking)
     
-    spots_manager.draw_spots(reader.get_map_size())
-    player.move(cx, cy, reader.player__heading())
+    startup_mark("first_frame")
     
     
-    canvas.after(config.update_time["usual"], main, reader)
+    schedule_frame(poller)
 
 
 
@@ -365,8 +571,46 @@ def main(reader):
 
 logger.info("Starting the main loop")
 
-reader = thunder_reader.MapReader()
+session = None
+if config.capture["replay"]:
+    session = ReplaySession(config.capture["replay"], config.capture["replay_speed"] or None)
+
+perf = PerfMonitor()
+
+def text_cache__hud_line():
+    stats = drawer.text_cache.stats()
+    
+    return f"text {stats['images']} ({stats['bytes']/1024:.0f}KB) hit {stats['hit_rate']:.0%} evicted {stats['evictions']} reused {stats['recycled']}"
+
+def payload__hud_line():
+    snapshot = poller.latest()
+    hits, misses = snapshot.payload_stats if snapshot is not None else (0, 0)
+    frames = frame_stats["rendered"] + frame_stats["skipped"]
+    
+    return f"unchanged polls {hits}/{hits + misses}, skipped frames {frame_stats['skipped']}/{frames}"
+
+perf_hud = PerfHUD(canvas, perf, config.size["x"] - 14, visible=config.performance["hud"], lines=[text_cache__hud_line, payload__hud_line])
+root.bind("<F3>", perf_hud.toggle)
+
+reader = thunder_reader.MapReader(
+    session=session,
+    perf=perf,
+    capture=config.capture["record"] or None,
+    columnar=config.performance["columnar_objects"],
+    json_backend=config.performance["json_backend"],
+    tracker=thunder_reader.ObjectTracker(config.tracking["max_speed"]) if config.tracking["enabled"] else None
+)
+
+scheduler = PollScheduler(config.poll_rate["min"], config.poll_rate["target"], config.poll_rate["max"])
+
+poller = MapPoller(
+    reader, scheduler, 
+    config.update_time["not_working"], 
+    config.update_time["probe"], 
+    config.update_time["probe_max"]
+)
+poller.start()
 
 root.wm_attributes("-topmost", 1)
-canvas.after(0, main, reader)
+schedule_frame(poller, 0)
 root.mainloop()
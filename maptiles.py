@@ -0,0 +1,263 @@
+# pylint: disable=line-too-long, invalid-name, import-error, multiple-imports, unspecified-encoding, broad-exception-caught, trailing-whitespace, no-name-in-module, unused-import
+
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import threading
+from io import BytesIO
+from PIL import Image
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+TILE_CACHE_DIR = os.path.join(sys.path[0], "local", "map_tiles")
+TILE_CACHE_BYTES = 256*1024*1024
+
+MANIFEST = "manifest.json"
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                Tile Disk Cache                               #
+# ---------------------------------------------------------------------------- #
+
+
+class TileDiskCache:
+    """
+    Pyramid tiles on disk, one directory per map image and tile size
+    (`<root>/<image sha1>_<tile size>/<level>/<col>_<row>.png`). A map's
+    `manifest.json` (the level sizes) is written last, so only complete
+    pyramids are used.
+    
+    The cache is capped at `max_bytes`: whole maps are evicted, least
+    recently used (directory mtime, touched on every use) first.
+    """
+    
+    def __init__(self, root=TILE_CACHE_DIR, max_bytes=TILE_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+    
+    def map_dir(self, image_hash, tile_size):
+        return os.path.join(self.root, f"{image_hash}_{tile_size}")
+    
+    def tile_path(self, image_hash, tile_size, level, col, row):
+        return os.path.join(self.map_dir(image_hash, tile_size), str(level), f"{col}_{row}.png")
+    
+    def manifest(self, image_hash, tile_size):
+        """Level sizes of a complete cached pyramid, None if there is none."""
+        path = os.path.join(self.map_dir(image_hash, tile_size), MANIFEST)
+        
+        try:
+            with open(path) as f:
+                levels = [tuple(size) for size in json.load(f)["levels"]]
+        except (OSError, ValueError, KeyError):
+            return None
+        
+        os.utime(self.map_dir(image_hash, tile_size)) # most recently used
+        
+        return levels
+    
+    def load(self, image_hash, tile_size, level, col, row):
+        try:
+            with Image.open(self.tile_path(image_hash, tile_size, level, col, row)) as img:
+                return img.convert("RGB")
+        except OSError as e:
+            logger.warning(f"Could not read cached map tile {level}/{col}_{row}: {e}")
+            return None
+    
+    def save(self, image_hash, tile_size, level, col, row, tile):
+        path = self.tile_path(image_hash, tile_size, level, col, row)
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tile.save(path, "PNG", compress_level=1)
+    
+    def finish(self, image_hash, tile_size, levels):
+        """Marks a pyramid as complete and trims the cache."""
+        with open(os.path.join(self.map_dir(image_hash, tile_size), MANIFEST), "w") as f:
+            json.dump({"levels": levels, "time": time.time()}, f)
+        
+        self.trim(keep=self.map_dir(image_hash, tile_size))
+    
+    
+    # ---------------------------------- Size Cap -------------------------------- #
+    
+    @staticmethod
+    def dir_size(path):
+        total = 0
+        
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        
+        return total
+    
+    def trim(self, keep=None):
+        """Deletes least recently used maps (never `keep`) until the cache fits `max_bytes`."""
+        try:
+            entries = [entry for entry in os.scandir(self.root) if entry.is_dir()]
+        except OSError:
+            return 0
+        
+        maps = sorted(((entry.stat().st_mtime, entry.path, self.dir_size(entry.path)) for entry in entries), reverse=True)
+        total = sum(size for _, _, size in maps)
+        removed = 0
+        
+        while total > self.max_bytes and maps:
+            _, path, size = maps.pop() # oldest
+            
+            if os.path.normpath(path) == os.path.normpath(keep or ""):
+                continue
+            
+            shutil.rmtree(path, ignore_errors=True)
+            
+            total -= size
+            removed += 1
+        
+        if removed:
+            logger.info(f"Map tile cache: removed {removed} old maps, {round(total/1024/1024, 1)} MB left")
+        
+        return removed
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                 Tile Pyramid                                 #
+# ---------------------------------------------------------------------------- #
+
+
+class TilePyramid:
+    """
+    Source tiles of one map image: the image rotated by 180 degrees (the
+    view mirrors both map axes) and halved per level, sliced into
+    `tile_size` squares.
+    
+    `build` runs on a worker thread. With a complete disk cache for the
+    image it only reads the manifest, tiles are loaded on demand.
+    Otherwise it slices the levels coarsest first, so `ready(level)` turns
+    true level by level and the drawer can show a coarse map right away.
+    `render` (also on a worker) resizes a tile to its on-screen size.
+    """
+    
+    def __init__(self, image_hash, tile_size, disk=None, on_ready=None):
+        self.image_hash = image_hash
+        self.tile_size = tile_size
+        self.disk = disk
+        self.on_ready = on_ready # called (on the worker) whenever a level is ready
+        
+        self.levels = None # [(width, height)] per level once known
+        self.tiles = {} # (level, col, row) -> PIL image
+        
+        self._ready = set()
+        self._from_disk = False
+        self._lock = threading.Lock()
+        
+        self.cancelled = False
+    
+    def ready(self, level):
+        return self._from_disk or level in self._ready
+    
+    def grid(self, level):
+        """(cols, rows) of a level."""
+        width, height = self.levels[level]
+        
+        return math.ceil(width/self.tile_size), math.ceil(height/self.tile_size)
+    
+    
+    # ----------------------------------- Build ---------------------------------- #
+    
+    def build(self, image_bytes):
+        t = time.perf_counter()
+        
+        if self.disk:
+            levels = self.disk.manifest(self.image_hash, self.tile_size)
+            
+            if levels:
+                self._from_disk = True
+                self.levels = levels
+                
+                if self.on_ready:
+                    self.on_ready()
+                
+                logger.info(f"Map tiles found in the disk cache ({len(levels)} levels)")
+                return
+        
+        with Image.open(BytesIO(image_bytes)) as img:
+            level = img.convert("RGB").transpose(Image.Transpose.ROTATE_180)
+        
+        images = [level]
+        while max(level.size) > self.tile_size:
+            level = level.reduce(2)
+            images.append(level)
+        
+        self.levels = [img.size for img in images]
+        
+        for i in reversed(range(len(images))):
+            self._slice(i, images[i])
+            
+            if self.cancelled:
+                return
+        
+        if self.disk:
+            try:
+                self.disk.finish(self.image_hash, self.tile_size, self.levels)
+            except OSError as e:
+                logger.warning(f"Could not store map tiles: {e}")
+        
+        logger.info(f"Map pyramid built: {len(images)} levels from {images[0].size}, {round((time.perf_counter() - t)*1000, 1)} ms")
+    
+    def _slice(self, level, img):
+        cols, rows = self.grid(level)
+        step = self.tile_size
+        
+        for row in range(rows):
+            for col in range(cols):
+                tile = img.crop((col*step, row*step, min((col + 1)*step, img.size[0]), min((row + 1)*step, img.size[1])))
+                
+                with self._lock:
+                    self.tiles[(level, col, row)] = tile
+                
+                if self.disk:
+                    try:
+                        self.disk.save(self.image_hash, self.tile_size, level, col, row, tile)
+                    except OSError as e:
+                        logger.warning(f"Could not store map tile: {e}")
+                        self.disk = None
+        
+        self._ready.add(level)
+        
+        if self.on_ready:
+            self.on_ready()
+    
+    
+    # ---------------------------------- Render ---------------------------------- #
+    
+    def source(self, level, col, row):
+        key = (level, col, row)
+        
+        with self._lock:
+            tile = self.tiles.get(key)
+        
+        if tile is None and self._from_disk:
+            tile = self.disk.load(self.image_hash, self.tile_size, level, col, row)
+            
+            if tile is not None:
+                with self._lock:
+                    self.tiles[key] = tile
+        
+        return tile
+    
+    def render(self, level, col, row, size):
+        """Tile resized to `size` (w, h), None if it is not available."""
+        tile = self.source(level, col, row)
+        
+        if tile is None:
+            return None
+        
+        return tile.resize(size, Image.Resampling.BILINEAR)
@@ -0,0 +1,332 @@
+# pylint: disable=line-too-long, invalid-name, import-error, multiple-imports, unspecified-encoding, broad-exception-caught, trailing-whitespace, no-name-in-module, unused-import
+
+"""
+Stand-in for the War Thunder localhost API (map_info.json, map_obj.json and
+map.img) with synthetic battles, for load testing without the game.
+    
+    python mock_server.py --scenario large
+    python mock_server.py --port 8112 --ground 3000 --latency 5 --jitter 3 --drop 0.01
+
+Point the minimap at it with the THUNDER_API environment variable when it
+doesn't run on the default port:
+    
+    THUNDER_API=http://127.0.0.1:8112 python main.py
+"""
+
+import io
+import sys
+import json
+import math
+import time
+import random
+import socket
+import argparse
+import threading
+import http.server
+
+from PIL import Image, ImageDraw
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                   Scenarios                                  #
+# ---------------------------------------------------------------------------- #
+
+
+ALLY_COLOR = "#174DFF"
+ENEMY_COLOR = "#f40C00"
+PLAYER_COLOR = "#faC81E"
+
+GROUND_ICONS = ("LightTank", "MediumTank", "HeavyTank", "TankDestroyer", "SPAA", "Wheeled")
+AIR_ICONS = ("Fighter", "Assault", "Bomber")
+
+SCENARIOS = {
+    "empty":  {"ground": 0,     "planes": 0,   "airfields": 0, "spawn_clusters": 0},
+    "small":  {"ground": 10,    "planes": 4,   "airfields": 2, "spawn_clusters": 2},
+    "medium": {"ground": 100,   "planes": 30,  "airfields": 2, "spawn_clusters": 4},
+    "large":  {"ground": 1000,  "planes": 150, "airfields": 4, "spawn_clusters": 8},
+    "huge":   {"ground": 10000, "planes": 500, "airfields": 6, "spawn_clusters": 16},
+}
+
+
+def triangle(t, period):
+    """0..1..0 wave, keeps linear motion inside the map by bouncing off the borders."""
+    phase = (t/period) % 1.0
+    
+    return 2*phase if phase < 0.5 else 2 - 2*phase
+
+
+class Battle:
+    """
+    One synthetic battle. Object positions are closed form functions of the
+    battle time, so a request costs the same no matter how long the battle
+    runs: ground units drive straight lines bouncing off the map borders,
+    planes (and the player) fly circles.
+    """
+    
+    def __init__(self, generation, counts, map_size=4096, seed=0):
+        self.generation = generation
+        self.map_size = map_size
+        self.started = time.perf_counter()
+        
+        rnd = random.Random(seed)
+        
+        self.ground = []
+        for i in range(counts["ground"]):
+            color = ALLY_COLOR if i % 2 else ENEMY_COLOR
+            speed = rnd.uniform(3, 15)/map_size # map units per second
+            angle = rnd.uniform(0, 2*math.pi)
+            
+            self.ground.append((
+                rnd.choice(GROUND_ICONS), color,
+                rnd.random(), rnd.random(), # start
+                abs(speed*math.cos(angle)) or 1e-6, abs(speed*math.sin(angle)) or 1e-6
+            ))
+        
+        self.planes = []
+        for i in range(counts["planes"]):
+            color = ALLY_COLOR if i % 2 else ENEMY_COLOR
+            
+            self.planes.append((
+                rnd.choice(AIR_ICONS), color,
+                rnd.uniform(0.2, 0.8), rnd.uniform(0.2, 0.8), # center
+                rnd.uniform(500, 3000)/map_size, # radius
+                rnd.uniform(100, 250)/map_size*rnd.choice((-1, 1)), # signed speed
+                rnd.uniform(0, 2*math.pi)
+            ))
+        
+        self.static = []
+        for i in range(counts["airfields"]):
+            color = ALLY_COLOR if i % 2 else ENEMY_COLOR
+            sx, sy = rnd.uniform(0.1, 0.9), rnd.uniform(0.1, 0.9)
+            angle = rnd.uniform(0, 2*math.pi)
+            length = 1500/map_size
+            
+            self.static.append({"type": "airfield", "color": color, "blink": 0, "icon": "none", "icon_bg": "none", "sx": sx, "sy": sy, "ex": sx + length*math.cos(angle), "ey": sy + length*math.sin(angle)})
+            self.static.append({"type": "respawn_base_fighter", "color": color, "blink": 0, "icon": "none", "icon_bg": "none", "x": sx, "y": sy})
+        
+        for i in range(counts["spawn_clusters"]):
+            color = ALLY_COLOR if i % 2 else ENEMY_COLOR
+            cx, cy = rnd.uniform(0.1, 0.9), rnd.uniform(0.1, 0.9)
+            
+            for _ in range(rnd.randint(2, 4)):
+                self.static.append({"type": "respawn_base_tank", "color": color, "blink": 0, "icon": "none", "icon_bg": "none", "x": cx + rnd.uniform(-150, 150)/map_size, "y": cy + rnd.uniform(-150, 150)/map_size})
+    
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+    
+    def map_info(self, valid=True):
+        return {
+            "grid_size": [self.map_size, self.map_size],
+            "grid_steps": [400, 400],
+            "grid_zero": [0, self.map_size],
+            "hud_type": 0,
+            "map_generation": self.generation,
+            "map_max": [self.map_size, self.map_size],
+            "map_min": [0, 0],
+            "valid": valid
+        }
+    
+    def objects(self, with_player=True):
+        t = self.elapsed
+        res = list(self.static)
+        
+        for icon, color, x, y, vx, vy in self.ground:
+            res.append({"type": "ground_model", "color": color, "blink": 0, "icon": icon, "icon_bg": "none", "x": triangle(x/(2*vx) + t, 1/vx), "y": triangle(y/(2*vy) + t, 1/vy)})
+        
+        for icon, color, cx, cy, r, v, phase in self.planes:
+            a = phase + v/r*t
+            direction = math.copysign(1, v)
+            
+            res.append({"type": "aircraft", "color": color, "blink": 0, "icon": icon, "icon_bg": "none", "x": cx + r*math.cos(a), "y": cy + r*math.sin(a), "dx": -math.sin(a)*direction, "dy": math.cos(a)*direction})
+        
+        if with_player:
+            a = 0.05*t
+            
+            res.append({"type": "aircraft", "color": PLAYER_COLOR, "blink": 0, "icon": "Player", "icon_bg": "none", "x": 0.5 + 0.2*math.cos(a), "y": 0.5 + 0.2*math.sin(a), "dx": -math.sin(a), "dy": math.cos(a)})
+        
+        return res
+
+
+def make_map_image(size=1024, seed=0):
+    rnd = random.Random(seed)
+    
+    img = Image.new("RGB", (size, size), (86, 96, 70))
+    draw = ImageDraw.Draw(img)
+    
+    for _ in range(40):
+        x, y, r = rnd.randrange(size), rnd.randrange(size), rnd.randrange(20, size//6)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=(rnd.randrange(70, 120), rnd.randrange(80, 130), rnd.randrange(50, 90)))
+    
+    for i in range(0, size, size//10):
+        draw.line((i, 0, i, size), fill=(60, 60, 60))
+        draw.line((0, i, size, i), fill=(60, 60, 60))
+    
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    
+    return buf.getvalue()
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                     World                                    #
+# ---------------------------------------------------------------------------- #
+
+
+class World:
+    """
+    Battle timeline: `lobby` seconds without a map, then battles of
+    `battle_length` seconds (forever when 0), each one with a new map
+    generation. Every `player_lost_every` seconds of a battle the player is
+    missing for `player_lost_for` seconds (dead / respawning).
+    """
+    
+    def __init__(self, args):
+        self.args = args
+        self.counts = {key: getattr(args, key) if getattr(args, key) is not None else value for key, value in SCENARIOS[args.scenario].items()}
+        
+        self.started = time.perf_counter()
+        self.generation = 0
+        self.battle = None
+        
+        self.images = {}
+        self._lock = threading.Lock()
+    
+    def state(self):
+        """(battle or None while in the lobby, player present)"""
+        args = self.args
+        t = time.perf_counter() - self.started
+        
+        cycle = args.lobby + args.battle_length if args.battle_length else None
+        local = t % cycle if cycle else t
+        
+        if local < args.lobby:
+            return None, False
+        
+        generation = 1 + (int(t//cycle) if cycle else 0)
+        
+        with self._lock:
+            if self.battle is None or self.battle.generation != generation:
+                self.battle = Battle(generation, self.counts, args.map_size, seed=args.seed + generation)
+                logger.info("Battle %d started: %s", generation, self.counts)
+        
+        battle = self.battle
+        
+        player = True
+        if args.player_lost_every:
+            player = battle.elapsed % args.player_lost_every >= args.player_lost_for
+        
+        return battle, player
+    
+    def image(self, generation):
+        if generation not in self.images:
+            self.images[generation] = make_map_image(seed=self.args.seed + generation)
+        
+        return self.images[generation]
+    
+    def respond(self, path):
+        battle, player = self.state()
+        
+        if path == "/map_info.json":
+            if battle is None:
+                return "application/json", json.dumps({"valid": False}).encode()
+            
+            return "application/json", json.dumps(battle.map_info()).encode()
+        
+        if path == "/map_obj.json":
+            return "application/json", json.dumps(battle.objects(player) if battle else []).encode()
+        
+        if path.startswith("/map.img"):
+            return "image/png", self.image(battle.generation if battle else 0)
+        
+        return None, None
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                    Server                                    #
+# ---------------------------------------------------------------------------- #
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, like the game
+    
+    world = None
+    args = None
+    
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    
+    def do_GET(self):
+        args = self.args
+        
+        if args.drop and random.random() < args.drop:
+            self.close_connection = True # no response at all, the client sees a dropped connection
+            return
+        
+        delay = args.latency + random.uniform(-args.jitter, args.jitter)
+        if delay > 0:
+            time.sleep(delay/1000)
+        
+        content_type, body = self.world.respond(self.path)
+        
+        if body is None:
+            self.send_error(404)
+            return
+        
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8111)
+    parser.add_argument("--scenario", choices=SCENARIOS, default="medium", help="object counts preset")
+    parser.add_argument("--ground", type=int, help="ground units (overrides the scenario)")
+    parser.add_argument("--planes", type=int, help="planes besides the player (overrides the scenario)")
+    parser.add_argument("--airfields", type=int, help="airfields (overrides the scenario)")
+    parser.add_argument("--spawn-clusters", type=int, help="tank spawn clusters (overrides the scenario)")
+    parser.add_argument("--map-size", type=int, default=4096, help="map side in meters")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0, help="added response delay, ms")
+    parser.add_argument("--jitter", type=float, default=0, help="random +- delay on top of --latency, ms")
+    parser.add_argument("--drop", type=float, default=0, help="probability of closing a connection without answering")
+    parser.add_argument("--lobby", type=float, default=0, help="seconds without a map before every battle")
+    parser.add_argument("--battle-length", type=float, default=0, help="seconds per battle, 0 = endless")
+    parser.add_argument("--player-lost-every", type=float, default=0, help="seconds between 'player not found' phases, 0 = never")
+    parser.add_argument("--player-lost-for", type=float, default=5, help="length of a 'player not found' phase, seconds")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    
+    Handler.world = World(args)
+    Handler.args = args
+    
+    server = http.server.ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    
+    logger.info("Mock War Thunder API on http://%s:%d (scenario %s)", args.host, args.port, args.scenario)
+    
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,17 @@
 import math
 import sys
 import time
-from PIL import Image, ImageFont, ImageDraw, ImageTk, ImageOps
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageFont, ImageDraw, ImageTk, ImageOps, ImageColor
 from geom import segment_square_intersection, rotate_points
+from transform import ViewTransform
+from glyphs import GlyphAtlas
+from maptiles import TilePyramid
+from shapes import ShapeTemplates, SPOT_PARTS, shape__plane, shape__respawn_base_tank, shape__respawn_base_fighter
+from spatial import GridIndex
 
-import gc
 
 import logging
 logger = logging.getLogger(__name__)
@@ -59,59 +66,457 @@ class Object:
 
 
 class Player(Object):
+    """
+    The player's marker, the one item redrawn every frame. It keeps a single
+    polygon that is moved with `coords`, and skips the update when the
+    position moved less than `POSITION_EPSILON` pixels and the heading
+    turned less than `ROTATION_EPSILON` radians.
+    """
+    
+    POSITION_EPSILON = 0.25 # px
+    ROTATION_EPSILON = math.radians(0.5)
     
     
     # ----------------------------------- Init ----------------------------------- #
     
     def __init__(self, canvas, width=10, height=10, x=0, y=0, rotation=0, color="white"):
         super().__init__(canvas, width, height, x, y, color)
+        self.canvas.delete(self.id) # the marker is a polygon, not the base rectangle
         
         self.rotation = rotation
         
+        self.offsets = [
+            (-width, -height),
+            (width, -height),
+            (0, height)
+        ]
+        
         points = self.calculate_points(x, y, self.width, self.height, rotation)
         self.id = self.canvas.create_polygon(
             points,
             fill=color
         )
         
+        self._stacking = None
+    
     
     # ----------------------------------- Move ----------------------------------- #
-        
+    
     def move(self, x, y, rotation=0):
-        self.canvas.delete(self.id)
-
-        self.rotation = rotation-math.pi/2*3
-
+        rotation = rotation-math.pi/2*3
+        
+        if (
+            abs(x - self.x) < self.POSITION_EPSILON and abs(y - self.y) < self.POSITION_EPSILON
+                and
+            abs(math.remainder(rotation - self.rotation, 2*math.pi)) < self.ROTATION_EPSILON
+        ):
+            return False
+        
+        self.rotation = rotation
+        
         self.x = x
         self.y = y
+        
+        self.canvas.coords(self.id, self.calculate_points(x, y, self.width, self.height, self.rotation))
+        
+        return True
+    
+    def keep_on_top(self, stacking):
+        """
+        Raises the marker when `stacking` (anything that changes when items
+        may have been created or raised above it) differs from last time.
+        """
+        if stacking != self._stacking:
+            self.canvas.tag_raise(self.id)
+            self._stacking = stacking
+    
+    
+    # ------------------------------- Calc. Points ------------------------------- #
+    
+    def calculate_points(self, x, y, width, height, rotation):
+        cos = math.cos(rotation)
+        sin = math.sin(rotation)
+        
+        if (width, height) == (self.width, self.height):
+            offsets = self.offsets
+        else:
+            offsets = [(-width, -height), (width, -height), (0, height)]
+        
+        res = []
+        for px, py in offsets:
+            res.append(px*cos - py*sin + x)
+            res.append(px*sin + py*cos + y)
+        
+        return res
+
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                   Item Pool                                  #
+# ---------------------------------------------------------------------------- #
 
-        points = self.calculate_points(x, y, self.width, self.height, self.rotation)
 
-        self.canvas.delete(self.id)
-        self.id = self.canvas.create_polygon(points, fill=self.color)
+class ItemPool:
+    """
+    Reusable canvas items of one kind ("oval", "polygon", "image", ...) and
+    one tag set.
     
+    Between `begin` and `end` every `draw` takes the next item of the pool.
+    An item is only moved (`coords`) or restyled (`itemconfigure`) when its
+    coordinates or options differ from what it showed last frame, new
+    items are created only when the pool runs out, and items left over at
+    `end` are hidden instead of deleted. Coordinates must be passed as
+    lists, so they compare equal between frames.
+    """
     
-    # ------------------------------- Calc. Points ------------------------------- #
+    TRIM_MIN = 64 # never trim below this many items
+    
+    def __init__(self, canvas, kind, tags):
+        self.canvas = canvas
+        self.create = getattr(canvas, f"create_{kind}")
+        self.tags = tags
+        
+        self.ids = []
+        self.coords = []
+        self.styles = []
+        self.hidden = []
+        
+        self.used = 0
+        
+        self.created = 0
+        self.moved = 0
+        self.restyled = 0
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def begin(self):
+        self.used = 0
+    
+    def draw(self, coords, **style):
+        i = self.used
+        self.used += 1
+        
+        if i == len(self.ids):
+            self.ids.append(self.create(coords, tags=self.tags, **style))
+            self.coords.append(coords)
+            self.styles.append(style)
+            self.hidden.append(False)
+            
+            self.created += 1
+            return self.ids[i]
+        
+        item = self.ids[i]
+        
+        if self.coords[i] != coords:
+            self.canvas.coords(item, coords)
+            self.coords[i] = coords
+            self.moved += 1
+        
+        last = self.styles[i]
+        changes = {key: value for key, value in style.items() if last.get(key) != value}
+        
+        if self.hidden[i]:
+            changes["state"] = "normal"
+            self.hidden[i] = False
+        
+        if changes:
+            self.canvas.itemconfigure(item, **changes)
+            self.styles[i] = style
+            self.restyled += 1
+        
+        return item
+    
+    def end(self):
+        for i in range(self.used, len(self.ids)):
+            if not self.hidden[i]:
+                self.canvas.itemconfigure(self.ids[i], state="hidden")
+                self.hidden[i] = True
+        
+        # a big battle is over: give back most of the hidden items
+        keep = max(self.TRIM_MIN, 2*self.used)
+        if len(self.ids) > 2*keep:
+            for item in self.ids[keep:]:
+                self.canvas.delete(item)
+            
+            del self.ids[keep:], self.coords[keep:], self.styles[keep:], self.hidden[keep:]
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                 Raster Layer                                 #
+# ---------------------------------------------------------------------------- #
+
+
+RASTER_KINDS = ("oval", "rectangle", "polygon", "line")
+RASTER_HYSTERESIS = 0.8 # back to vector items below this share of the threshold
+
+
+class RasterLayer:
+    """
+    Alternative to the item pools for dense scenes: every marker of a frame
+    is drawn into one RGBA buffer with `ImageDraw`, and the buffer is shown
+    by a single canvas image item, updated with one `PhotoImage.paste` per
+    frame. `pool(kind)` returns an object with the `ItemPool.draw`
+    signature, so drawing code doesn't care which backend is active.
+    
+    Costs a full-canvas upload per frame no matter how many markers there
+    are, so it only pays off above a few hundred of them.
+    """
+    
+    def __init__(self, canvas, size, tags="object"):
+        self.canvas = canvas
+        self.tags = tags
+        
+        self.photo = None
+        self.item = None
+        self.visible = False
+        
+        self.created = 0
+        self.drawn = 0
+        
+        self._pools = {}
+        self._colors = {}
+        
+        self.set_size(size)
+    
+    def set_size(self, size):
+        self.size = (int(size[0]), int(size[1]))
+        
+        self.image = Image.new("RGBA", self.size, (0, 0, 0, 0))
+        self.draw_ = ImageDraw.Draw(self.image)
+        
+        if self.item is not None:
+            self.canvas.delete(self.item)
+        
+        self.photo = None
+        self.item = None
+        self.visible = False
+    
+    def pool(self, kind):
+        pool = self._pools.get(kind)
+        if pool is None:
+            pool = self._pools[kind] = RasterPool(self, kind)
+        
+        return pool
+    
+    def color(self, color):
+        if color is None or color == "":
+            return None
+        
+        rgb = self._colors.get(color)
+        if rgb is None:
+            rgb = self._colors[color] = ImageColor.getrgb(color)
+        
+        return rgb
+    
+    
+    # ---------------------------------- Frames ---------------------------------- #
+    
+    def begin(self):
+        self.image.paste((0, 0, 0, 0), (0, 0) + self.size)
+        self.drawn = 0
+    
+    def end(self):
+        if self.photo is None:
+            self.photo = ImageTk.PhotoImage(self.image)
+            self.item = self.canvas.create_image((0, 0), image=self.photo, anchor="nw", tags=self.tags)
+            self.created += 1
+        else:
+            self.photo.paste(self.image)
+        
+        if not self.visible:
+            self.canvas.itemconfigure(self.item, state="normal")
+            self.visible = True
+    
+    def hide(self):
+        if self.visible:
+            self.canvas.itemconfigure(self.item, state="hidden")
+            self.visible = False
+
 
-    def calculate_points(self, x, y, width, height, rotation):
-        points = [
-            (-width, -height),
-            (width, -height),
-            (0, height)
-        ]
 
-        angle = rotation
+class RasterPool:
+    """`ItemPool.draw` for one item kind, drawing into a `RasterLayer`."""
+    
+    __slots__ = ("layer", "paint")
+    
+    def __init__(self, layer, kind):
+        self.layer = layer
+        self.paint = getattr(self, f"paint__{kind}")
+    
+    def draw(self, coords, fill=None, outline=None, width=1, **style):
+        self.layer.drawn += 1
+        self.paint(coords, self.layer.color(fill), self.layer.color(outline), width)
+    
+    def paint__polygon(self, coords, fill, outline, width):
+        self.layer.draw_.polygon(coords, fill=fill, outline=outline)
+    
+    def paint__oval(self, coords, fill, outline, width):
+        x1, y1, x2, y2 = coords
+        self.layer.draw_.ellipse((min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)), fill=fill, outline=outline)
+    
+    def paint__rectangle(self, coords, fill, outline, width):
+        x1, y1, x2, y2 = coords
+        self.layer.draw_.rectangle((min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)), fill=fill, outline=outline)
+    
+    def paint__line(self, coords, fill, outline, width):
+        self.layer.draw_.line(coords, fill=fill, width=round(width))
 
-        rotated_points = []
-        for px, py in points:
-            new_x = px * math.cos(angle) - py * math.sin(angle)
-            new_y = px * math.sin(angle) + py * math.cos(angle)
 
-            rotated_points.append((new_x + x, new_y + y))
 
-        return [coord for point in rotated_points for coord in point]
+# ---------------------------------------------------------------------------- #
+#                                  Image Cache                                 #
+# ---------------------------------------------------------------------------- #
 
 
+TEXT_CACHE_BYTES = 4*1024*1024
+
+
+class ImageCache:
+    """
+    LRU cache of rendered `PhotoImage`s with a byte budget.
+    
+    An image is accounted as width*height*4 bytes (what Tk keeps for a
+    photo). Going over `max_bytes` evicts at most `evict_batch` of the
+    least recently used images per `put`/`trim`, so the cache shrinks a
+    little every frame instead of being dropped at once. Images used
+    during the current frame (see `begin_frame`) and images `hold` by
+    long-lived canvas items are never evicted, Tk would blank their items.
+    
+    Up to `max_spare` evicted images are kept by size, `take` hands them
+    out again so a new label can `paste` into an existing photo instead of
+    creating one. Only images no visible item uses are evicted, so
+    overwriting them is safe.
+    """
+    
+    BYTES_PER_PIXEL = 4
+    
+    def __init__(self, max_bytes=TEXT_CACHE_BYTES, evict_batch=16, max_spare=32):
+        self.max_bytes = max_bytes
+        self.evict_batch = evict_batch
+        self.max_spare = max_spare
+        
+        self.entries = OrderedDict() # key -> [image, bytes, last frame used, size]
+        self.bytes = 0
+        
+        self.spare = {} # size -> evicted images
+        self.spare_count = 0
+        
+        self.frame = 0
+        self.held = {} # owner -> keys
+        self._held_keys = set()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.recycled = 0
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def __contains__(self, key):
+        return key in self.entries
+    
+    def get(self, key):
+        entry = self.entries.get(key)
+        
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        self.entries.move_to_end(key)
+        entry[2] = self.frame
+        
+        self.hits += 1
+        return entry[0]
+    
+    def put(self, key, image, size):
+        """Adds an image rendered at `size` (w, h) and trims the cache."""
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+        
+        nbytes = size[0]*size[1]*self.BYTES_PER_PIXEL
+        
+        self.entries[key] = [image, nbytes, self.frame, tuple(size)]
+        self.bytes += nbytes
+        
+        self.trim()
+        
+        return image
+    
+    def take(self, size):
+        """An evicted image of `size` to reuse, None if there is none."""
+        images = self.spare.get(tuple(size))
+        
+        if not images:
+            return None
+        
+        self.spare_count -= 1
+        self.recycled += 1
+        
+        return images.pop()
+    
+    def begin_frame(self):
+        self.frame += 1
+    
+    def hold(self, owner, *keys):
+        """Protects `keys` until the next `hold` of the same owner (a canvas item outside the pools)."""
+        self.held[owner] = keys
+        self._held_keys = {key for keys in self.held.values() for key in keys}
+    
+    def trim(self, limit=None):
+        """Evicts up to `limit` (default `evict_batch`) images while over budget, returns how many."""
+        limit = self.evict_batch if limit is None else limit
+        evicted = 0
+        
+        for _ in range(len(self.entries)):
+            if self.bytes <= self.max_bytes or evicted >= limit:
+                break
+            
+            key, entry = next(iter(self.entries.items()))
+            
+            if entry[2] == self.frame:
+                break # LRU order, everything after it was used this frame too
+            
+            if key in self._held_keys:
+                self.entries.move_to_end(key)
+                continue
+            
+            del self.entries[key]
+            self.bytes -= entry[1]
+            
+            if self.spare_count < self.max_spare:
+                self.spare.setdefault(entry[3], []).append(entry[0])
+                self.spare_count += 1
+            
+            evicted += 1
+        
+        self.evictions += evicted
+        
+        return evicted
+    
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+        
+        self.spare = {}
+        self.spare_count = 0
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        
+        return {
+            "images": len(self.entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "recycled": self.recycled,
+            "hit_rate": self.hits/lookups if lookups else 0.0
+        }
+
 
 
 # ---------------------------------------------------------------------------- #
@@ -124,7 +529,7 @@ class ObjectDrawer:
     
     # ----------------------------------- Init ----------------------------------- #
     
-    def __init__(self, canvas, size, object_size__other, object_size__ground, is_zoom_affect_sprites=True):
+    def __init__(self, canvas, size, object_size__other, object_size__ground, is_zoom_affect_sprites=True, text_cache_bytes=TEXT_CACHE_BYTES, raster_threshold=0):
         logger.info("ObjectDrawer init started")
         
         self.canvas = canvas
@@ -136,16 +541,29 @@ class ObjectDrawer:
         self.os_other = object_size__other
         self.gs_other = object_size__ground
         
-        self.images__text = {} # caching distance text
+        self.text_cache = ImageCache(text_cache_bytes) # rendered distance/label text
+        
+        self.pools = {} # (kind, tags) -> ItemPool
+        
+        # markers go to one bitmap instead of canvas items from `raster_threshold` objects on (0 = never)
+        self.raster = RasterLayer(canvas, size)
+        self.raster_threshold = raster_threshold
+        self.raster_mode = False
         
         self.zoom = 1
         self.zoom_affect_sprites = is_zoom_affect_sprites
         
         self.ppos = (0, 0)
         
+        self.view = ViewTransform(self.size, self.zoom_affect_sprites)
+        
+        self.shapes = ShapeTemplates()
+        self.update_shapes()
+        
         self.font_mult = 1
         self.font_path = None
         self.font = None
+        self.glyphs = None
         
         logger.info("ObjectDrawer init complete")
     
@@ -154,6 +572,8 @@ class ObjectDrawer:
     
     def set_zoom(self, zoom):
         self.zoom = zoom
+        self.view.update(zoom=zoom)
+        self.update_shapes()
         
         self.draw_ui__zoom_text()
     
@@ -162,9 +582,20 @@ class ObjectDrawer:
             pos[0]*self.size[0],
             pos[1]*self.size[1]
         )
+        self.view.update(ppos=self.ppos)
     
     def set_size(self, size):
         self.size = size
+        
+        self.cx = 0.5*self.size[0]
+        self.cy = 0.5*self.size[1]
+        
+        self.view.update(size=size)
+        self.raster.set_size(size)
+    
+    def update_shapes(self):
+        """Rebuilds the shape templates if the object sizes or the sprite scale changed."""
+        self.shapes.update(self.os_other, self.gs_other, self.view.k)
     
     def load_font(self, path, font_size_multiplier):
         logger.info("Loading font")
@@ -175,13 +606,16 @@ class ObjectDrawer:
         self.update_font()
         
         logger.info("Font loaded")
-        
+    
     def update_font(self):
         if not self.font_path:
             logger.exception("No font path. Cannot update font")
             return
         
         self.font = ImageFont.truetype(self.font_path, round(self.os_other[0]*self.font_mult))
+        self.glyphs = GlyphAtlas(self.font, round(self.os_other[0]*self.font_mult))
+        
+        self.text_cache.clear() # rendered with the old font
         
         logger.info("Font update complete")
     
@@ -198,12 +632,16 @@ class ObjectDrawer:
     def draw_ui__zoom_text(self):
         self.canvas.delete("ui__zoom_text")
         
+        text = f"{round(self.zoom, 2)}x"
+        
         self.canvas.create_image( 
             (5, 5), 
-            image=self.generate_text(f"{round(self.zoom, 2)}x", "white"),
+            image=self.generate_text(text, "white"),
             tags="ui__zoom_text",
             anchor="nw"
         )
+        
+        self.text_cache.hold("ui__zoom_text", self.text_key(text, "white"))
     
     def draw_ui__length_text(self, mwidth, mheight):
         self.canvas.delete("ui__length_text")
@@ -225,76 +663,220 @@ class ObjectDrawer:
             tags="ui__length_text",
             anchor="sw"
         )
+        
+        self.text_cache.hold(
+            "ui__length_text", 
+            self.text_key(f"{length}km", "white", 270), 
+            self.text_key(f"{length2}km", "white")
+        )
     
     
     # ---------------------------------- Convert --------------------------------- #
     
     def rx(self, x, offset=0):
-        if self.zoom_affect_sprites:
-            return self.cx + (self.ppos[0] - x*self.size[0] + offset)*self.zoom
-        
-        return self.cx + (self.ppos[0] - x*self.size[0])*self.zoom + offset
+        return self.view.x(x, offset)
     
     def ry(self, y, offset=0):
-        if self.zoom_affect_sprites:
-            return self.cy + (self.ppos[1] - y*self.size[1] + offset)*self.zoom
-        
-        return self.cy + (self.ppos[1] - y*self.size[1])*self.zoom + offset
+        return self.view.y(y, offset)
     
     def dx(self, x, offset=0):
-        if self.zoom_affect_sprites:
-            return ((x - self.cx) / self.zoom - self.ppos[0] - offset) / (-self.size[0])
-    
-        return ((x - self.cx - offset) / self.zoom - self.ppos[0]) / (-self.size[0])
+        return self.view.inv_x(x, offset)
     
     def dy(self, y, offset=0):
-        if self.zoom_affect_sprites:
-            return ((y - self.cy) / self.zoom - self.ppos[1] - offset) / (-self.size[1])
+        return self.view.inv_y(y, offset)
+    
+    def view_margin(self):
+        # largest sprite extent in pixels, planes reach twice the ground size
+        return 2*max(max(self.os_other), max(self.gs_other))*self.view.k
+    
+    # ----------------------------------- Pools ---------------------------------- #
+    
+    def pool(self, kind, tags="object"):
+        tags = (tags,) if isinstance(tags, str) else tuple(tags)
+        
+        if self.raster_mode and tags == ("object",) and kind in RASTER_KINDS:
+            return self.raster.pool(kind)
+        
+        pool = self.pools.get((kind, tags))
+        if pool is None:
+            pool = self.pools[(kind, tags)] = ItemPool(self.canvas, kind, tags)
+        
+        return pool
+    
+    @property
+    def created_items(self):
+        """Items created by the pools so far, grows whenever new items land on top."""
+        return sum(pool.created for pool in self.pools.values()) + self.raster.created
+    
+    def choose_backend(self, object_count):
+        """Switches between canvas items and the raster layer for a frame with `object_count` objects."""
+        threshold = self.raster_threshold
+        
+        if not threshold:
+            raster = False
+        elif self.raster_mode:
+            raster = object_count >= threshold*RASTER_HYSTERESIS
+        else:
+            raster = object_count >= threshold
+        
+        if raster != self.raster_mode:
+            logger.info(f"Drawing {object_count} objects as {'one bitmap' if raster else 'canvas items'}")
+            self.raster_mode = raster
+        
+        return raster
+    
+    def begin_frame(self):
+        self.text_cache.begin_frame()
+        
+        for pool in self.pools.values():
+            pool.begin()
+        
+        if self.raster_mode:
+            self.raster.begin()
+    
+    def end_frame(self):
+        """Hides every pooled item that wasn't drawn since `begin_frame`."""
+        for pool in self.pools.values():
+            pool.end()
+        
+        if self.raster_mode:
+            self.raster.end()
+        else:
+            self.raster.hide()
+        
+        self.text_cache.trim()
+    
+    def clear(self):
+        for pool in self.pools.values():
+            pool.begin()
+            pool.end()
+        
+        self.raster.hide()
     
-        return ((y - self.cy - offset) / self.zoom - self.ppos[1]) / (-self.size[1])
     
     # ---------------------------------- Simple ---------------------------------- #
     
+    def is_box_outside(self, x1, y1, x2, y2):
+        return (
+            max(x1, x2) < 0 or min(x1, x2) > self.size[0]
+                or
+            max(y1, y2) < 0 or min(y1, y2) > self.size[1]
+        )
+    
     def draw_object__other(self, x, y, color):
-        self.canvas.create_oval(
+        box = [
             self.rx(x, -self.os_other[0]), 
             self.ry(y, -self.os_other[1]),
             self.rx(x, self.os_other[0]), 
-            self.ry(y, self.os_other[1]),
+            self.ry(y, self.os_other[1])
+        ]
+        
+        if self.is_box_outside(*box):
+            return
+        
+        self.pool("oval").draw(
+            box,
             fill=color,
-            outline=color,
-            tags="object"
+            outline=color
         )
-
+    
     def draw_object__ground(self, x, y, color):
-        self.canvas.create_rectangle(
+        box = [
             self.rx(x, -self.gs_other[0]), 
             self.ry(y, -self.gs_other[1]),
             self.rx(x, self.gs_other[0]), 
-            self.ry(y, self.gs_other[1]),
+            self.ry(y, self.gs_other[1])
+        ]
+        
+        if self.is_box_outside(*box):
+            return
+        
+        self.pool("rectangle").draw(
+            box,
             fill=color,
-            outline="black",
-            tags="object"
+            outline="black"
         )
     
     
+    # ---------------------------------- Batched --------------------------------- #
+    
+    def draw_objects__other(self, xs, ys, colors):
+        boxes = self.view.boxes(xs, ys, self.os_other[0], self.os_other[1])
+        draw = self.pool("oval").draw
+        
+        for coords, color in zip(boxes.tolist(), colors):
+            draw(
+                coords,
+                fill=color,
+                outline=color
+            )
+    
+    def draw_objects__ground(self, xs, ys, colors):
+        boxes = self.view.boxes(xs, ys, self.gs_other[0], self.gs_other[1])
+        draw = self.pool("rectangle").draw
+        
+        for coords, color in zip(boxes.tolist(), colors):
+            draw(
+                coords,
+                fill=color,
+                outline="black"
+            )
+    
+    def draw_objects__by_points(self, xs, ys, points, colors, outline=None, tags=["object"], angles=None):
+        if angles is None:
+            coords = self.view.shapes(xs, ys, points)
+        else:
+            coords = self.view.rotated_shapes(xs, ys, points, angles)
+        
+        return self.draw_objects__coords(coords, colors, outline, tags)
+    
+    def draw_objects__template(self, xs, ys, templates, colors, outline=None, tags=["object"]):
+        """`templates` is one `ShapeTemplates` template or one row per object."""
+        return self.draw_objects__coords(self.view.place_many(xs, ys, templates), colors, outline, tags)
+    
+    def draw_objects__coords(self, coords, colors, outline=None, tags=["object"]):
+        visible = self.view.visible(coords)
+        draw = self.pool("polygon", tags).draw
+        
+        for i in visible.nonzero()[0].tolist():
+            draw(
+                coords[i].tolist(),
+                fill=colors[i],
+                outline=outline or colors[i]
+            )
+        
+        return visible
+    
+    
     # ----------------------------------- Utils ---------------------------------- #
     
-    def generate_text(self, text, color, rotate=None):
+    @staticmethod
+    def text_key(text, color, rotate=None):
         identifier = f"{text}_{color}"
         
         if rotate:
             identifier += f"_r{rotate}"
         
-        if identifier not in self.images__text:
-            size = [
-                round(self.os_other[0]*len(text)*self.font_mult//2), 
-                round(self.os_other[0]*self.font_mult)
-            ]
-            
+        return identifier
+    
+    def generate_text(self, text, color, rotate=None):
+        identifier = self.text_key(text, color, rotate)
+        
+        image = self.text_cache.get(identifier)
+        if image is not None:
+            return image
+        
+        size = (
+            round(self.os_other[0]*len(text)*self.font_mult//2), 
+            round(self.os_other[0]*self.font_mult)
+        )
+        
+        if self.glyphs and self.glyphs.supports(text):
+            img = self.glyphs.render(text, color, size)
+        else:
             img = (Image.new(
                 "RGBA", 
-                tuple(size),
+                size,
                 (255, 255, 255, 0))
             )
             draw = ImageDraw.Draw(img)
@@ -305,32 +887,18 @@ class ObjectDrawer:
                 font=self.font, 
                 fill=color
             )
-            
-            if rotate:
-                img = img.rotate(rotate, expand=True)
-            
-            self.images__text[identifier] = ImageTk.PhotoImage(img)
         
-        return self.images__text[identifier]
-    
-    def clear_cache__text_images(self):
-        t = time.time()
-        logger.info(f"Image Cache clear started")
-        
-        ln = len(self.images__text)
-        bt = sys.getsizeof(self.images__text)
-        k = list(self.images__text.keys())
-        
-        for key in k:
-            del self.images__text[key]
+        if rotate:
+            img = img.rotate(rotate, expand=True)
         
-        self.images__text = {}
-        del k
+        photo = self.text_cache.take(img.size)
         
-        gc.collect()
-        self.draw_ui__zoom_text()
+        if photo is None:
+            photo = ImageTk.PhotoImage(img)
+        else:
+            photo.paste(img)
         
-        logger.info(f"Cleared {ln} imgs ({round(bt/1024, 3)}Kb). Time: {round((time.time() - t) * 1000, 4)} miliseconds")
+        return self.text_cache.put(identifier, photo, img.size)
     
     def draw_object__by_points(self, x, y, points, color, outline=None, tags=["object"]):
         res = []
@@ -340,10 +908,12 @@ class ObjectDrawer:
         
         is_outside = True
         
+        view = self.view
+        
         for i, p in enumerate(points):
             xy = i % 2
             
-            pos = self.rx(x, p) if xy == 0 else self.ry(y, p)
+            pos = view.x(x, p) if xy == 0 else view.y(y, p)
             
             if xy == 1:
                 is_outside = is_outside and (
@@ -357,15 +927,43 @@ class ObjectDrawer:
         if is_outside:
             return False
         
-        self.canvas.create_polygon(
+        self.pool("polygon", tags).draw(
             res,
             fill=color,
-            outline=outline,
-            tags=tags
+            outline=outline
+        )
+        
+        return True
+    
+    def draw_object__template(self, x, y, pairs, color, outline=None, tags=["object"]):
+        coords = self.view.place(x, y, pairs)
+        
+        width, height = self.size
+        
+        for px, py in zip(coords[0::2], coords[1::2]):
+            if 0 <= px <= width and 0 <= py <= height:
+                break
+        else:
+            return False
+        
+        self.pool("polygon", tags).draw(
+            coords,
+            fill=color,
+            outline=outline or color
         )
         
         return True
     
+    def draw_object__templates(self, x, y, parts, color, outline=None, tags=["object"]):
+        is_visible = False
+        
+        for pairs in parts:
+            v = self.draw_object__template(x, y, pairs, color, outline, tags)
+            
+            is_visible = is_visible or v
+        
+        return is_visible
+    
     def draw_object__multiple_points(self, x, y, objects, color, outline=None, tags=["object"]):
         if not outline:
             outline = color
@@ -383,93 +981,72 @@ class ObjectDrawer:
             )
             
             is_visible = is_visible or v
-
+        
         return is_visible
     
     def draw_object__line(self, x1, y1, x2, y2, color, width=None, tags=["object"], offset=[0, 0, 0, 0]):
         if not width:
             width = self.os_other[0]
         
-        self.canvas.create_line(
-            self.rx(x1, offset[0]), 
-            self.ry(y1, offset[1]),
-            self.rx(x2, offset[2]),
-            self.ry(y2, offset[3]),
+        self.pool("line", tags).draw(
+            [
+                self.rx(x1, offset[0]), 
+                self.ry(y1, offset[1]),
+                self.rx(x2, offset[2]),
+                self.ry(y2, offset[3])
+            ],
             width=width, 
-            fill=color,
-            tags=tags
+            fill=color
         )
     
-        
+    
     # ------------------------------- Respawn Bases ------------------------------ #
     
+    def shape__plane(self):
+        return shape__plane(self.os_other, self.gs_other)
+    
+    def shape__respawn_base_tank(self):
+        return shape__respawn_base_tank(self.os_other, self.gs_other)
+    
+    def shape__respawn_base_fighter(self):
+        return shape__respawn_base_fighter(self.os_other, self.gs_other)
+    
+    
     def draw_object__plane(self, x, y, dx, dy, color):
-        points = [
-            [- self.gs_other[0], - self.gs_other[1]*2],
-            [self.gs_other[0], - self.gs_other[1]*2],
-            [0, self.gs_other[1]*2]
-        ]
+        template = self.shapes.rotated("plane", math.atan2(dx, dy)-math.pi/2*3)
         
-        p = rotate_points(points, math.atan2(dx, dy)-math.pi/2*3)
+        self.draw_object__template(x, y, template, color, "black")
+    
+    def draw_objects__plane(self, xs, ys, dxs, dys, colors):
+        templates = self.shapes.rotated_many("plane", np.arctan2(dxs, dys)-math.pi/2*3)
         
-        self.draw_object__by_points(x, y, p, color, "black")
+        return self.draw_objects__template(xs, ys, templates, colors, "black")
     
     
     def draw_object__respawn_base_tank(self, x, y, color):
-        points = [
-            - self.os_other[0],
-            - self.os_other[1],
-            + self.os_other[0],
-            - self.os_other[1],
-            + self.os_other[0]*0.5,
-            0,
-            + self.os_other[0],
-            + self.os_other[1],
-            - self.os_other[0],
-            + self.os_other[1],
-            - self.os_other[0]*0.5,
-            0
-        ]
-        
-        self.draw_object__by_points(x, y, points, color)
+        self.draw_object__template(x, y, self.shapes.pairs("respawn_base_tank"), color)
+    
+    def draw_objects__respawn_base_tank(self, xs, ys, colors):
+        return self.draw_objects__template(xs, ys, self.shapes["respawn_base_tank"], colors)
     
     
     def draw_object__respawn_base_fighter(self, x, y, color):
-        points = [
-            - self.os_other[0],
-            0,
-            0,
-            + self.os_other[1],
-            + self.os_other[0],
-            0,
-            0,
-            - self.os_other[1]
-        ]
-        
-        self.draw_object__by_points(x, y, points, color)
+        self.draw_object__template(x, y, self.shapes.pairs("respawn_base_fighter"), color)
+    
+    def draw_objects__respawn_base_fighter(self, xs, ys, colors):
+        return self.draw_objects__template(xs, ys, self.shapes["respawn_base_fighter"], colors)
     
     
     # --------------------------------- Airfield --------------------------------- #
     
     def draw_object__airfield(self, x, y, color, distance_from_player):
-        points = [
-            - self.os_other[0],
-            - self.os_other[1],
-            + self.os_other[0],
-            - self.os_other[1],
-            + self.os_other[0]*0.5,
-            + self.os_other[1],
-            - self.os_other[0]*0.5,
-            + self.os_other[1],
-        ]
-        
         text_pos = [
             self.rx(x),
             self.ry(y, -self.os_other[1])
         ]
         anchor='s' # n e s w
         
-        if not self.draw_object__by_points(x, y, points, color):
+        if not self.draw_object__template(x, y, self.shapes.pairs("airfield"), color):
             anchor = ""
             text_pos = segment_square_intersection(
                 ((int(self.cx), int(self.cy)), (int(text_pos[0]), int(text_pos[1]))), 
@@ -491,38 +1068,48 @@ class ObjectDrawer:
         else:
             color = "white"
         
-        self.canvas.create_image( 
-            text_pos, 
+        self.pool("image", "text").draw( 
+            list(text_pos), 
             image=self.generate_text(f"{distance_from_player}km", color),
-            tags="text",
             anchor=anchor
         )
 
 
+SPOTS_INDEX_CELL = 0.05 # spots are in normalized map coordinates
+
+
 class SpotsManager:
     def __init__(self, drawer: ObjectDrawer):
         self.drawer = drawer
         self.spots = []
+        self.version = 0 # bumped on every change, lets the render loop skip unchanged frames
+        self._index = None
         
         self.drawer.canvas.bind("<Button-1>", self.on_click_1)
         self.drawer.canvas.bind("<Button-3>", self.on_click_0)
     
     def add_spot(self, rx, ry):
         self.spots.append((self.drawer.dx(rx), self.drawer.dy(ry)))
+        self.version += 1
+        self._index = None
     
-    def remove_spot(self, rx, ry):
-        nearest = [None, 0]
+    def get_index(self):
+        if self._index is None:
+            self._index = GridIndex(
+                [x for x, _ in self.spots], 
+                [y for _, y in self.spots], 
+                SPOTS_INDEX_CELL
+            )
         
-        dx = self.drawer.dx(rx)
-        dy = self.drawer.dy(ry)
-        for i, (x, y) in enumerate(self.spots):
-            dist = math.sqrt((dx - x)**2 + (dy - y)**2)
-            
-            if nearest[0] is None or dist < nearest[1]:
-                nearest = [i, dist]
+        return self._index
+    
+    def remove_spot(self, rx, ry):
+        nearest = self.get_index().nearest(self.drawer.dx(rx), self.drawer.dy(ry))
         
-        if nearest[0] is not None:
-            self.spots.pop(nearest[0])
+        if len(nearest):
+            self.spots.pop(int(nearest[0]))
+            self.version += 1
+            self._index = None
     
     def on_click_1(self, event):
         self.add_spot(event.x, event.y)
@@ -531,58 +1118,15 @@ class SpotsManager:
         self.remove_spot(event.x, event.y)
     
     def draw_spots(self, map_size):
-        points = [
-            [
-                + self.drawer.os_other[0],
-                + self.drawer.os_other[1]*2,
-                - self.drawer.os_other[0],
-                + self.drawer.os_other[1]*2,
-                - self.drawer.os_other[0],
-                + self.drawer.os_other[1]*1.5,
-                + self.drawer.os_other[0],
-                + self.drawer.os_other[1]*1.5,
-            ],
-            [
-                + self.drawer.os_other[0],
-                - self.drawer.os_other[1]*2,
-                - self.drawer.os_other[0],
-                - self.drawer.os_other[1]*2,
-                - self.drawer.os_other[0],
-                - self.drawer.os_other[1]*1.5,
-                + self.drawer.os_other[0],
-                - self.drawer.os_other[1]*1.5,
-            ],
-            [
-                + self.drawer.os_other[0]*2,
-                - self.drawer.os_other[1],
-                + self.drawer.os_other[0]*2,
-                + self.drawer.os_other[1],
-                + self.drawer.os_other[0]*1.5,
-                + self.drawer.os_other[1],
-                + self.drawer.os_other[0]*1.5,
-                - self.drawer.os_other[1],
-            ],
-            [
-                - self.drawer.os_other[0]*2,
-                - self.drawer.os_other[1],
-                - self.drawer.os_other[0]*2,
-                + self.drawer.os_other[1],
-                - self.drawer.os_other[0]*1.5,
-                + self.drawer.os_other[1],
-                - self.drawer.os_other[0]*1.5,
-                - self.drawer.os_other[1],
-            ]
-        ]
+        parts = [self.drawer.shapes.pairs(name) for name in SPOT_PARTS]
         
         pad = max(self.drawer.os_other)*4
         
-        self.drawer.canvas.delete("spot")
-        
         for i, pos in enumerate(self.spots):
-            self.drawer.draw_object__multiple_points(
+            self.drawer.draw_object__templates(
                 pos[0],
                 pos[1],
-                points,
+                parts,
                 "lime",
                 tags=["spot"]
             )
@@ -617,10 +1161,9 @@ class SpotsManager:
             mid_ry = self.drawer.ry(mid_y)
             
             text = f"{length}km"
-            self.drawer.canvas.create_image(
-                (mid_rx, mid_ry),
-                image=self.drawer.generate_text(text, "white"),
-                tags="spot"
+            self.drawer.pool("image", "spot").draw(
+                [mid_rx, mid_ry],
+                image=self.drawer.generate_text(text, "white")
             )
             
             pad2 = self.drawer.os_other[0]*len(text)*self.drawer.font_mult//4
@@ -652,90 +1195,249 @@ class SpotsManager:
             )
 
 
-# I still dont understand how to do this
+# ---------------------------------------------------------------------------- #
+#                                  Map Drawer                                  #
+# ---------------------------------------------------------------------------- #
+
+
+MAP_TILE = 256 # tile side in pixels of its pyramid level
+MAP_TILE_CACHE_BYTES = 48*1024*1024
+MAP_UPLOADS_PER_FRAME = 4 # finished tiles turned into PhotoImages per frame
+MAP_FALLBACK_LEVELS = 2 # coarser levels searched for a stand-in while a tile is generated
+
+
 class MapDrawer:
-    def __init__(self, drawer, map_path):
+    """
+    Map image background as a tile pyramid (see `maptiles.TilePyramid`).
+    
+    The pyramid is built on worker threads once per map, tiles are resized
+    to the screen scale there too; the Tk thread only turns finished tiles
+    into `PhotoImage`s (a few per frame) and places them. A frame draws
+    the tiles intersecting the canvas at the level closest above the
+    on-screen resolution. Tiles that aren't ready yet are covered by a
+    tile of a coarser level (tag "map_coarse", below "map"), so the map
+    shows up coarse first and sharpens as tiles arrive.
+    
+    Screen tiles are kept in an `ImageCache`, the canvas items come from
+    item pools, so a frame with the same tiles only moves them.
+    """
+    
+    def __init__(self, drawer, tile_size=MAP_TILE, cache_bytes=MAP_TILE_CACHE_BYTES, disk_cache=None, workers=2):
         self.drawer = drawer
+        self.tile_size = tile_size
+        self.disk_cache = disk_cache
         
-        self.map_path = map_path
+        self.pyramid = None
+        self.tiles = ImageCache(cache_bytes, evict_batch=4)
         
-        self.map_size = (2048, 2048)
-        self.tile_size = (0, 0)
+        self.pending = {} # screen tile key -> Future of the resized tile
+        self.failed = set()
         
-        self.tiles = []
-        self.tiles_ids = []
+        self.completed = 0 # bumped by the workers
+        self.drawn = 0
+        self._backlog = False
+        self._uploads = 0
+        self._wanted = set()
+        
+        self._build = None
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="MapTiles")
     
-    def load_map(self, map_size):
-        with Image.open(self.map_path) as img:
-            input_image = ImageOps.flip(ImageOps.mirror(img))
-
-            self.map_size = (
-                map_size[0] * self.drawer.zoom,
-                map_size[1] * self.drawer.zoom
-            )
+    @property
+    def map_hash(self):
+        return self.pyramid.image_hash if self.pyramid else None
+    
+    @property
+    def version(self):
+        """Changes whenever a new frame would show more of the map (part of the render loop's frame key)."""
+        return (self.completed, self.drawn) if self._backlog else self.completed
+    
+    def _changed(self, *args):
+        self.completed += 1
+    
+    def _built(self, future):
+        self.completed += 1
+        
+        if future.exception():
+            logger.error(f"Could not build the map pyramid: {future.exception()}")
+    
+    def load_map(self, image_bytes, image_hash):
+        """Starts building the pyramid for a new map image (bytes of map.img), nothing to do for the current one."""
+        if image_hash == self.map_hash:
+            return False
+        
+        self.unload()
+        
+        self.pyramid = TilePyramid(image_hash, self.tile_size, self.disk_cache, on_ready=self._changed)
+        
+        self._build = self._pool.submit(self.pyramid.build, image_bytes)
+        self._build.add_done_callback(self._built)
+        
+        return True
+    
+    def unload(self):
+        if self.pyramid:
+            self.pyramid.cancelled = True
+        
+        for future in self.pending.values():
+            future.cancel()
+        
+        self.pyramid = None
+        self.pending = {}
+        self.failed = set()
+        self.tiles.clear()
+    
+    
+    # ---------------------------------- Tiles ---------------------------------- #
+    
+    def choose_level(self, scale):
+        """Pyramid level for `scale` screen pixels per full size image pixel and its own scale (0.5, 1]."""
+        level = 0
+        
+        while level + 1 < len(self.pyramid.levels) and scale*2**(level + 1) <= 1:
+            level += 1
+        
+        return level, scale*2**level
+    
+    def tile(self, level, col, row, origin, scale, request):
+        """
+        (PhotoImage or None, canvas position) of a tile. Finished tiles are
+        uploaded (within the per frame budget), missing ones are submitted
+        to the workers when `request` is set.
+        """
+        pyramid = self.pyramid
+        step = self.tile_size
+        width, height = pyramid.levels[level]
+        
+        kx = scale[0]*2**level # screen pixels per level pixel
+        ky = scale[1]*2**level
+        
+        # tile edges are rounded once, so neighbours share them and leave no gaps
+        sx0 = round(col*step*kx)
+        sy0 = round(row*step*ky)
+        sx1 = round(min((col + 1)*step, width)*kx)
+        sy1 = round(min((row + 1)*step, height)*ky)
+        
+        xy = [origin[0] + sx0, origin[1] + sy0]
+        size = (sx1 - sx0, sy1 - sy0)
+        
+        if size[0] <= 0 or size[1] <= 0:
+            return None, xy
+        
+        key = (level, col, row, size)
+        self._wanted.add(key)
+        
+        photo = self.tiles.get(key)
+        if photo is not None:
+            return photo, xy
+        
+        future = self.pending.get(key)
+        
+        if future is not None and future.done():
+            if self._uploads <= 0:
+                self._backlog = True
+                return None, xy
             
-            image_width, image_height = input_image.size
+            self._uploads -= 1
+            del self.pending[key]
             
-            tile_width = image_width // 32
-            tile_height = image_height // 32
+            img = future.result() if not future.exception() else None
             
-            resize = (
-                self.map_size[0] // image_width,
-                self.map_size[1] // image_height
-            )
+            if img is None:
+                self.failed.add(key)
+                return None, xy
             
-            self.tile_size = (
-                tile_width*resize[0],
-                tile_height*resize[1]
-            )
+            photo = self.tiles.take(size)
+            if photo is None:
+                photo = ImageTk.PhotoImage(img)
+            else:
+                photo.paste(img)
             
-            self.tiles = []
-            for y in range(0, image_height, tile_height):
-                tiles = []
-                
-                for x in range(0, image_width, tile_width):
-                    left = x
-                    upper = y
-                    right = x + tile_width
-                    lower = y + tile_height
-
-                    tile = input_image\
-                        .crop((left, upper, right, lower))\
-                        .resize(
-                            (
-                                math.ceil(self.tile_size[0]), 
-                                math.ceil(self.tile_size[1])
-                            )
-                        )
-                    
-                    tiles.append(ImageTk.PhotoImage(tile))
-                
-                self.tiles.append(tiles)
+            return self.tiles.put(key, photo, size), xy
+        
+        if future is None and request and key not in self.failed and pyramid.ready(level):
+            future = self.pending[key] = self._pool.submit(pyramid.render, level, col, row, size)
+            future.add_done_callback(self._changed)
+        
+        return None, xy
+    
+    
+    # ----------------------------------- Draw ----------------------------------- #
     
     def draw_map(self):
-        self.drawer.canvas.delete("map")
+        """Draws the visible tiles, call between `drawer.begin_frame` and `drawer.end_frame`."""
+        pyramid = self.pyramid
         
-        zero = (
-            self.drawer.rx(-1),
-            self.drawer.ry(-1)
-        )
-
-        for y, row in enumerate(self.tiles):
-            ids = []
-            
-            for x, tile in enumerate(row):
-                ids.append(
-                    self.drawer.canvas.create_image(
-                        (
-                            zero[0] - x*self.tile_size[0], 
-                            zero[1] - y*self.tile_size[1]
-                        ),
-                        image=tile,
-                        tags="map",
-                        anchor="se"
-                    )
-                )
-            
-            self.tiles_ids.append(ids)
+        if pyramid is None or pyramid.levels is None:
+            return
+        
+        view = self.drawer.view
+        width, height = self.drawer.size
+        base_w, base_h = pyramid.levels[0]
+        
+        # top left corner of the rotated image is the map's (1, 1) corner
+        ox = view.x(1)
+        oy = view.y(1)
+        origin = (round(ox), round(oy))
+        
+        scale = (-view.ax/base_w, -view.ay/base_h)
+        level, _ = self.choose_level(max(scale))
+        
+        kx = scale[0]*2**level
+        ky = scale[1]*2**level
+        
+        step = self.tile_size
+        cols, rows = pyramid.grid(level)
+        
+        col0 = max(0, int(-ox/(kx*step)))
+        row0 = max(0, int(-oy/(ky*step)))
+        col1 = min(cols, int((width - ox)/(kx*step)) + 1)
+        row1 = min(rows, int((height - oy)/(ky*step)) + 1)
+        
+        self.tiles.begin_frame()
+        self.drawn += 1
+        self._backlog = False
+        self._uploads = MAP_UPLOADS_PER_FRAME
+        self._wanted = set()
+        
+        draw = self.drawer.pool("image", "map").draw
+        draw_coarse = self.drawer.pool("image", "map_coarse").draw
+        
+        missing = []
+        covered = set()
+        
+        for row in range(row0, row1):
+            for col in range(col0, col1):
+                photo, xy = self.tile(level, col, row, origin, scale, request=False)
+                
+                if photo is not None:
+                    draw(xy, image=photo, anchor="nw")
+                    continue
+                
+                missing.append((col, row))
+                
+                # stand-in from a coarser level, the coarsest one is requested first
+                top = min(level + MAP_FALLBACK_LEVELS, len(pyramid.levels) - 1)
+                
+                for up in range(1, top - level + 1):
+                    key = (level + up, col >> up, row >> up)
+                    
+                    if key in covered:
+                        break
+                    
+                    photo, xy = self.tile(*key, origin, scale, request=level + up == top)
+                    
+                    if photo is not None:
+                        covered.add(key)
+                        draw_coarse(xy, image=photo, anchor="nw")
+                        break
+        
+        for col, row in missing:
+            self.tile(level, col, row, origin, scale, request=True)
+        
+        # drop jobs for tiles that are no longer wanted (zoom changed, scrolled away)
+        for key in [key for key in self.pending if key not in self._wanted]:
+            self.pending.pop(key).cancel()
+        
+        self._backlog = self._backlog or any(future.done() for future in self.pending.values())
         
-        print(self.tiles_ids, zero)
\ No newline at end of file
+        self.tiles.trim()
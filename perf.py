@@ -0,0 +1,247 @@
+# pylint: disable=line-too-long, invalid-name, import-error, multiple-imports, unspecified-encoding, broad-exception-caught, trailing-whitespace, no-name-in-module, unused-import
+
+import time
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+STAGES = ("fetch", "decode", "parse", "map", "spawns", "objects", "spots", "player", "frame", "idle")
+PERCENTILES = (50, 95, 99)
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                  Ring Buffer                                 #
+# ---------------------------------------------------------------------------- #
+
+
+class RingBuffer:
+    """Last `size` int64 samples, oldest ones are overwritten."""
+    
+    def __init__(self, size=512):
+        self.data = np.zeros(size, dtype=np.int64)
+        self.size = size
+        self.count = 0
+    
+    def add(self, value):
+        self.data[self.count % self.size] = value
+        self.count += 1
+    
+    def values(self):
+        """Samples in insertion order."""
+        if self.count <= self.size:
+            return self.data[:self.count]
+        
+        i = self.count % self.size
+        
+        return np.concatenate((self.data[i:], self.data[:i]))
+    
+    def last(self):
+        return int(self.data[(self.count - 1) % self.size]) if self.count else None
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                 Perf Monitor                                 #
+# ---------------------------------------------------------------------------- #
+
+
+class PerfMonitor:
+    """
+    Per-stage durations (ns, from `time.perf_counter_ns`) in ring buffers.
+    
+    The poller thread records fetch/decode/parse, the Tk thread the render
+    stages; each buffer has a single writer, so there are no locks. `frame`
+    also keeps the start time of every rendered frame (for the FPS) and
+    `age` how old the displayed data was when it was drawn.
+    """
+    
+    def __init__(self, size=512, stages=STAGES):
+        self.size = size
+        
+        self.stages = {name: RingBuffer(size) for name in stages}
+        self.frames = RingBuffer(size) # frame start timestamps
+        self.age = RingBuffer(size)
+        
+        self._idle_from = None
+    
+    def stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = RingBuffer(self.size)
+        
+        return self.stages[name]
+    
+    def record(self, name, duration_ns):
+        self.stage(name).add(duration_ns)
+    
+    def timer(self, name):
+        """`with perf.timer("objects"): ...` records the block duration."""
+        return StageTimer(self, name)
+    
+    
+    # ---------------------------------- Frames ---------------------------------- #
+    
+    def frame_start(self, data_received_at=None):
+        """Call when a frame starts rendering, `data_received_at` is the snapshot's `perf_counter` time."""
+        now = time.perf_counter_ns()
+        
+        if self._idle_from is not None:
+            self.stages["idle"].add(now - self._idle_from)
+            self._idle_from = None
+        
+        self.frames.add(now)
+        
+        if data_received_at is not None:
+            self.age.add(now - int(data_received_at*1e9))
+        
+        return now
+    
+    def frame_end(self, started):
+        now = time.perf_counter_ns()
+        
+        self.stages["frame"].add(now - started)
+        self._idle_from = now
+    
+    
+    # ---------------------------------- Output ---------------------------------- #
+    
+    def fps(self, window_ns=2_000_000_000):
+        """Rendered frames per second over the last `window_ns`."""
+        starts = self.frames.values()
+        
+        if len(starts) < 2:
+            return 0.0
+        
+        recent = starts[starts >= starts[-1] - window_ns]
+        
+        if len(recent) < 2:
+            return 0.0
+        
+        return (len(recent) - 1)*1e9/(recent[-1] - recent[0])
+    
+    def percentiles(self, name, percentiles=PERCENTILES):
+        """{pXX: ms} of a stage, None without samples."""
+        buffer = self.stages.get(name) if name != "age" else self.age
+        
+        if buffer is None or not buffer.count:
+            return None
+        
+        values = np.percentile(buffer.values(), percentiles)/1e6
+        
+        return {f"p{p}": float(v) for p, v in zip(percentiles, values)}
+    
+    def summary(self):
+        """All numbers shown by the HUD, as a dict."""
+        return {
+            "fps": self.fps(),
+            "age": self.percentiles("age"),
+            "stages": {name: self.percentiles(name) for name in self.stages}
+        }
+
+
+
+class StageTimer:
+    __slots__ = ("perf", "name", "started")
+    
+    def __init__(self, perf, name):
+        self.perf = perf
+        self.name = name
+        self.started = 0
+    
+    def __enter__(self):
+        self.started = time.perf_counter_ns()
+        return self
+    
+    def __exit__(self, *exc):
+        self.perf.record(self.name, time.perf_counter_ns() - self.started)
+        return False
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                      HUD                                     #
+# ---------------------------------------------------------------------------- #
+
+
+class PerfHUD:
+    """
+    Text block in the top right canvas corner (`x`, `y` is its top right
+    point) with the `PerfMonitor` numbers. Refreshed at most every
+    `interval` seconds, the canvas item is reused (tag "perf_hud") and only
+    raised when the `stacking` passed to `update` changes. `lines` are
+    callables returning extra lines (cache counters and the like).
+    """
+    
+    def __init__(self, canvas, perf, x, y=4, interval=0.5, visible=False, lines=()):
+        self.canvas = canvas
+        self.perf = perf
+        self.interval = interval
+        self.visible = visible
+        self.lines = list(lines)
+        
+        self.x = x
+        self.y = y
+        
+        self.item = None
+        self._updated = 0
+        self._stacking = None
+    
+    def toggle(self, *args):
+        self.visible = not self.visible
+        
+        if not self.visible and self.item is not None:
+            self.canvas.delete(self.item)
+            self.item = None
+        
+        self._updated = 0
+    
+    def text(self):
+        summary = self.perf.summary()
+        age = summary["age"]
+        
+        lines = [f"FPS {summary['fps']:5.1f}   age p50 {age['p50']:.0f}ms" if age else f"FPS {summary['fps']:5.1f}"]
+        lines.append(f"{'ms':<8}{'p50':>7}{'p95':>7}{'p99':>7}")
+        
+        for name, res in summary["stages"].items():
+            if res:
+                lines.append(f"{name:<8}{res['p50']:>7.2f}{res['p95']:>7.2f}{res['p99']:>7.2f}")
+        
+        lines.append(f"items {len(self.canvas.find_all())}")
+        lines.extend(line() for line in self.lines)
+        
+        return "\n".join(lines)
+    
+    def update(self, force=False, stacking=None):
+        """
+        `stacking` is the drawer's stacking key (see `Player.keep_on_top`),
+        None keeps the last one: nothing new was drawn above the HUD.
+        """
+        if not self.visible:
+            return
+        
+        if stacking is not None and stacking != self._stacking:
+            if self.item is not None:
+                self.canvas.tag_raise(self.item)
+            
+            self._stacking = stacking
+        
+        now = time.perf_counter()
+        if not force and now - self._updated < self.interval:
+            return
+        
+        self._updated = now
+        text = self.text()
+        
+        if self.item is None:
+            self.item = self.canvas.create_text(
+                self.x, self.y,
+                anchor="ne",
+                text=text,
+                fill="#ffffff",
+                font="consolas 8",
+                tags="perf_hud"
+            )
+        else:
+            self.canvas.itemconfigure(self.item, text=text)
@@ -0,0 +1,349 @@
+# pylint: disable=line-too-long, invalid-name, import-error, multiple-imports, unspecified-encoding, broad-exception-caught, trailing-whitespace, no-name-in-module, unused-import
+
+import threading
+import time
+import math
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                  Latest Slot                                 #
+# ---------------------------------------------------------------------------- #
+
+
+class LatestSlot:
+    """
+    Single-value mailbox between the poller thread and the Tk thread.
+    
+    Publishing is one reference assignment (atomic under the GIL), so neither
+    side ever takes a lock. Readers always get the newest published value;
+    older values are simply dropped.
+    """
+    
+    def __init__(self):
+        self._value = None
+    
+    def publish(self, value):
+        self._value = value
+    
+    def peek(self):
+        return self._value
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                   Scheduling                                 #
+# ---------------------------------------------------------------------------- #
+
+
+class Deadline:
+    """
+    Fixed-rate schedule. Call `begin` when the work starts; `delay` then
+    returns the time left until the next tick, so the cost of the work does
+    not stretch the period. When the work overruns, the schedule restarts
+    from now instead of bursting to catch up. Work durations are kept as an
+    exponential moving average in `work_ms`.
+    """
+    
+    def __init__(self, interval, smoothing=0.2):
+        self.interval = interval
+        self.smoothing = smoothing
+        
+        self.work_ms = 0.0
+        self.overruns = 0
+        
+        self._started = None
+        self._next = time.perf_counter()
+    
+    def begin(self):
+        self._started = time.perf_counter()
+    
+    def delay(self):
+        now = time.perf_counter()
+        
+        if self._started is not None:
+            self.work_ms += self.smoothing*((now - self._started)*1000 - self.work_ms)
+            self._started = None
+        
+        self._next += self.interval
+        
+        if self._next < now:
+            self.overruns += 1
+            self._next = now
+        
+        return self._next - now
+    
+    def reset(self, delay=0):
+        """Drop the current work measurement and restart the schedule `delay` seconds from now."""
+        self._started = None
+        self._next = time.perf_counter() + delay
+    
+    def delay_ms(self):
+        return int(self.delay()*1000)
+
+
+
+class PollScheduler(Deadline):
+    """
+    Deadline schedule for the poller whose rate follows the scene.
+    
+    Static scenes (nothing tracked is moving) are polled at `min_rate`.
+    Otherwise the rate goes from `target_rate` up to `max_rate` as the
+    fastest object approaches FAST_SPEED or the fastest turn approaches
+    FAST_TURN. Rises apply at once, drops are smoothed, and the period never
+    gets shorter than the measured fetch time. Rates are in Hz.
+    """
+    
+    FAST_SPEED = 300 # m/s
+    FAST_TURN = math.radians(90) # rad/s
+    
+    def __init__(self, min_rate, target_rate, max_rate):
+        self.min_rate = min_rate
+        self.target_rate = target_rate
+        self.max_rate = max_rate
+        
+        self.rate = target_rate
+        self._reported_rate = target_rate
+        
+        super().__init__(1/target_rate)
+    
+    def wanted_rate(self, snapshot):
+        columns = snapshot.columns if snapshot is not None else None
+        
+        if columns is None or columns.vx is None:
+            return self.target_rate # no tracking, nothing to adapt to
+        
+        if not columns.moving:
+            return self.min_rate
+        
+        speed, turn = columns.motion()
+        score = min(max(speed/self.FAST_SPEED, turn/self.FAST_TURN), 1.0)
+        
+        return self.target_rate + score*(self.max_rate - self.target_rate)
+    
+    def observe(self, snapshot):
+        wanted = self.wanted_rate(snapshot)
+        
+        if wanted >= self.rate:
+            self.rate = wanted
+        else:
+            self.rate += 0.2*(wanted - self.rate)
+        
+        self.interval = max(1/self.rate, self.work_ms/1000)
+        
+        if abs(self.rate - self._reported_rate) > 0.25*self._reported_rate:
+            logger.info("Poll rate %.1f Hz (fetch %.1fms)", self.rate, self.work_ms)
+            self._reported_rate = self.rate
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                    Poller                                    #
+# ---------------------------------------------------------------------------- #
+
+
+# the poller's idle states, see MapPoller
+ACTIVE = "active" # in battle, polling map_obj.json at the scheduler rate
+HIDDEN = "hidden" # minimap hidden, no requests at all
+UNREACHABLE = "unreachable" # nothing listens on the API port, TCP probes with backoff
+OUT_OF_BATTLE = "out_of_battle" # game is up but no map, slow map_info.json polls
+NO_PLAYER = "no_player" # map is up but the player is not (dead, spectating), slow full polls
+
+
+class MapPoller(threading.Thread):
+    """
+    Runs `MapReader.update_objects_data` on its own thread and publishes a
+    `MapSnapshot` after every attempt. The reader must not be touched by any
+    other thread once the poller is started.
+    
+    Requests are only made while it pays off:
+    
+    - HIDDEN: blocks until `set_visible(True)`, no wakeups at all
+    - UNREACHABLE: only a TCP connect probe, the delay doubles from
+      `probe_interval` up to `probe_max_interval` and only resets once
+      map_info.json answers (an open port whose HTTP fails keeps backing off)
+    - OUT_OF_BATTLE: only map_info.json, every `error_interval`
+    - NO_PLAYER: full polls every `error_interval`, back to ACTIVE once the
+      player is in map_obj.json again
+    - ACTIVE: full polls, failures fall back to one of the states above
+    """
+    
+    def __init__(self, reader, scheduler, error_interval, probe_interval=500, probe_max_interval=10000):
+        super().__init__(name="MapPoller", daemon=True)
+        
+        self.reader = reader
+        
+        self.scheduler = scheduler
+        self.error_interval = error_interval/1000
+        self.probe_interval = probe_interval/1000
+        self.probe_max_interval = probe_max_interval/1000
+        
+        self.slot = LatestSlot()
+        self.sequence = 0
+        
+        self.state = ACTIVE
+        self._state_before_hidden = ACTIVE
+        self._backoff = self.probe_interval
+        
+        self._visible = threading.Event()
+        self._visible.set()
+        self._stop_event = threading.Event()
+    
+    
+    # ---------------------------------- States ---------------------------------- #
+    
+    def _set_state(self, state):
+        if state != self.state:
+            logger.info("Poller state: %s -> %s", self.state, state)
+            self.state = state
+    
+    def _failed_state(self):
+        """State to fall back to after a failed poll."""
+        if self.reader.unreachable:
+            return UNREACHABLE
+        
+        if self.reader.player_missing:
+            return NO_PLAYER
+        
+        return OUT_OF_BATTLE
+    
+    def set_visible(self, visible):
+        """Called by the Tk thread when the minimap is shown or hidden."""
+        if visible:
+            self._visible.set()
+        else:
+            self._visible.clear()
+    
+    def _step__hidden(self):
+        self._visible.wait() # stop() sets it too
+        
+        self._set_state(self._state_before_hidden)
+        self.scheduler.reset()
+        
+        return 0
+    
+    def _next_backoff(self):
+        """Current probe delay, doubled (up to `probe_max_interval`) for the next one."""
+        wait = self._backoff
+        self._backoff = min(2*self._backoff, self.probe_max_interval)
+        
+        return wait
+    
+    def _step__unreachable(self):
+        if not self.reader.http.probe():
+            return self._next_backoff()
+        
+        # something listens, but that's not an answering API yet: the backoff
+        # only resets once map_info.json answers with a map
+        self._set_state(OUT_OF_BATTLE)
+        
+        return self._backoff
+    
+    def _step__out_of_battle(self):
+        if self.reader.map_available():
+            self._backoff = self.probe_interval
+            self._set_state(ACTIVE)
+            
+            return 0
+        
+        if self.reader.unreachable:
+            self._set_state(UNREACHABLE)
+            
+            return self._next_backoff()
+        
+        return self.error_interval
+    
+    def _step__no_player(self):
+        try:
+            ok = self.poll()
+        except Exception as e:
+            logger.exception(f"Poller iteration failed: {e}")
+            ok = False
+        
+        if ok:
+            self._set_state(ACTIVE)
+            self.scheduler.reset()
+            
+            return 0
+        
+        self._set_state(self._failed_state())
+        
+        return self.error_interval
+    
+    def _step__active(self):
+        scheduler = self.scheduler
+        scheduler.begin()
+        
+        try:
+            ok = self.poll()
+        except Exception as e:
+            logger.exception(f"Poller iteration failed: {e}")
+            ok = False
+        
+        if ok:
+            scheduler.observe(self.slot.peek())
+            return scheduler.delay()
+        
+        self._set_state(self._failed_state())
+        scheduler.reset(self.error_interval)
+        
+        return self.error_interval
+    
+    
+    # ----------------------------------- Loop ----------------------------------- #
+    
+    def poll(self):
+        ok = self.reader.update_objects_data()
+        
+        # the same payload as the published snapshot keeps its sequence (the
+        # render loop skips the frame), only the payload counters move on
+        if not (self.reader.unchanged and self.slot.peek() is not None):
+            self.sequence += 1
+        
+        self.slot.publish(self.reader.snapshot(self.sequence))
+        
+        return ok
+    
+    def run(self):
+        scheduler = self.scheduler
+        logger.info("Poller started (%.0f-%.0f Hz, target %.0f Hz)", scheduler.min_rate, scheduler.max_rate, scheduler.target_rate)
+        
+        steps = {
+            ACTIVE: self._step__active,
+            UNREACHABLE: self._step__unreachable,
+            OUT_OF_BATTLE: self._step__out_of_battle,
+            NO_PLAYER: self._step__no_player,
+            HIDDEN: self._step__hidden,
+        }
+        
+        try:
+            while not self._stop_event.is_set():
+                if not self._visible.is_set() and self.state != HIDDEN:
+                    self._state_before_hidden = self.state
+                    self._set_state(HIDDEN)
+                
+                wait = steps[self.state]()
+                
+                if wait:
+                    self._stop_event.wait(wait)
+        finally:
+            self.reader.close() # pooled connections and the capture file
+        
+        logger.info("Poller stopped (last rate %.1f Hz, fetch %.1fms, %d overruns)", scheduler.rate, scheduler.work_ms, scheduler.overruns)
+    
+    def stop(self):
+        self._stop_event.set()
+        self._visible.set()
+    
+    
+    # ---------------------------------- Output ---------------------------------- #
+    
+    def latest(self):
+        return self.slot.peek()
+    
+    @property
+    def rate(self):
+        return self.scheduler.rate
@@ -0,0 +1,208 @@
+# pylint: disable=line-too-long, invalid-name, import-error, multiple-imports, unspecified-encoding, broad-exception-caught, trailing-whitespace, no-name-in-module, unused-import
+
+import math
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+HEADING_STEPS = 360 # pre-rotated copies per rotated shape, 1 degree apart
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                    Shapes                                    #
+# ---------------------------------------------------------------------------- #
+#
+#   Every shape is a function of the object sizes (`os` for other objects,
+#   `gs` for ground units, both (x, y) in pixels) returning flat vertex
+#   offsets x0, y0, x1, y1, ... around the object position.
+
+
+SHAPES = {}
+
+def shape(name):
+    def register(make):
+        SHAPES[name] = make
+        return make
+    
+    return register
+
+
+@shape("plane")
+def shape__plane(os, gs):
+    return [
+        - gs[0], - gs[1]*2,
+        gs[0], - gs[1]*2,
+        0, gs[1]*2
+    ]
+
+@shape("respawn_base_tank")
+def shape__respawn_base_tank(os, gs):
+    return [
+        - os[0], - os[1],
+        + os[0], - os[1],
+        + os[0]*0.5, 0,
+        + os[0], + os[1],
+        - os[0], + os[1],
+        - os[0]*0.5, 0
+    ]
+
+@shape("respawn_base_fighter")
+def shape__respawn_base_fighter(os, gs):
+    return [
+        - os[0], 0,
+        0, + os[1],
+        + os[0], 0,
+        0, - os[1]
+    ]
+
+@shape("airfield")
+def shape__airfield(os, gs):
+    return [
+        - os[0], - os[1],
+        + os[0], - os[1],
+        + os[0]*0.5, + os[1],
+        - os[0]*0.5, + os[1]
+    ]
+
+
+# ------------------------- Spot (four bars around it) ------------------------ #
+
+@shape("spot__bottom")
+def shape__spot__bottom(os, gs):
+    return [
+        + os[0], + os[1]*2,
+        - os[0], + os[1]*2,
+        - os[0], + os[1]*1.5,
+        + os[0], + os[1]*1.5
+    ]
+
+@shape("spot__top")
+def shape__spot__top(os, gs):
+    return [
+        + os[0], - os[1]*2,
+        - os[0], - os[1]*2,
+        - os[0], - os[1]*1.5,
+        + os[0], - os[1]*1.5
+    ]
+
+@shape("spot__right")
+def shape__spot__right(os, gs):
+    return [
+        + os[0]*2, - os[1],
+        + os[0]*2, + os[1],
+        + os[0]*1.5, + os[1],
+        + os[0]*1.5, - os[1]
+    ]
+
+@shape("spot__left")
+def shape__spot__left(os, gs):
+    return [
+        - os[0]*2, - os[1],
+        - os[0]*2, + os[1],
+        - os[0]*1.5, + os[1],
+        - os[0]*1.5, - os[1]
+    ]
+
+SPOT_PARTS = ("spot__bottom", "spot__top", "spot__right", "spot__left")
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                Shape Templates                               #
+# ---------------------------------------------------------------------------- #
+
+
+class ShapeTemplates:
+    """
+    Every registered shape as a flat float array of screen pixel offsets,
+    already multiplied by the view's sprite scale `k`. Placing a marker is
+    then only a translate (`ViewTransform.place_many` for arrays, `place`
+    with the `pairs` form for single objects, where NumPy overhead on a
+    handful of vertices would cost more than the math).
+    
+    Rotated shapes come from a lookup table of `steps` pre-rotated copies,
+    headings are rounded to the nearest step. The tables are built on first
+    use; everything is rebuilt only when the object sizes or `k` change.
+    """
+    
+    def __init__(self, steps=HEADING_STEPS):
+        self.steps = steps
+        self.step = 2*math.pi/steps
+        
+        self.key = None
+        self.templates = {}
+        self.tables = {}
+        self._pairs = {}
+        self._rotated_pairs = {}
+        
+        self.builds = 0
+    
+    def update(self, os, gs, k):
+        """Rebuilds the templates when sizes or `k` changed, returns whether it did."""
+        key = (tuple(os), tuple(gs), k)
+        
+        if key == self.key:
+            return False
+        
+        self.key = key
+        self.templates = {name: np.asarray(make(os, gs), dtype=float)*k for name, make in SHAPES.items()}
+        self.tables = {}
+        self._pairs = {}
+        self._rotated_pairs = {}
+        
+        self.builds += 1
+        
+        return True
+    
+    def __getitem__(self, name):
+        return self.templates[name]
+    
+    def pairs(self, name):
+        """Template as a tuple of (x, y) offset tuples."""
+        pairs = self._pairs.get(name)
+        
+        if pairs is None:
+            pairs = self._pairs[name] = tuple(map(tuple, self.templates[name].reshape(-1, 2).tolist()))
+        
+        return pairs
+    
+    
+    # --------------------------------- Rotation --------------------------------- #
+    
+    def table(self, name):
+        """(steps, len(template)) array, row i is the template rotated by i*step."""
+        table = self.tables.get(name)
+        
+        if table is None:
+            offsets = self.templates[name].reshape(-1, 2)
+            angles = np.arange(self.steps)*self.step
+            
+            cos = np.cos(angles)[:, None]
+            sin = np.sin(angles)[:, None]
+            
+            table = np.empty((self.steps, offsets.shape[0], 2))
+            table[:, :, 0] = offsets[:, 0]*cos - offsets[:, 1]*sin
+            table[:, :, 1] = offsets[:, 0]*sin + offsets[:, 1]*cos
+            
+            table = self.tables[name] = table.reshape(self.steps, -1)
+        
+        return table
+    
+    def rotated(self, name, angle):
+        """`pairs` of the template rotated by `angle` radians (quantized)."""
+        rotated = self._rotated_pairs.get(name)
+        
+        if rotated is None:
+            rows = self.table(name).reshape(self.steps, -1, 2).tolist()
+            rotated = self._rotated_pairs[name] = [tuple(map(tuple, row)) for row in rows]
+        
+        return rotated[round(angle/self.step) % self.steps]
+    
+    def rotated_many(self, name, angles):
+        """One rotated template row per angle of the `angles` array."""
+        i = np.rint(np.asarray(angles, dtype=float)/self.step).astype(np.int64) % self.steps
+        
+        return self.table(name)[i]
@@ -0,0 +1,122 @@
+# pylint: disable=line-too-long, invalid-name, import-error, multiple-imports, unspecified-encoding, broad-exception-caught, trailing-whitespace, no-name-in-module, unused-import
+
+import math
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                  Grid Index                                  #
+# ---------------------------------------------------------------------------- #
+
+
+class GridIndex:
+    """
+    Uniform grid over 2D points, built once per snapshot.
+    
+    Points are sorted by cell, so every occupied cell is one contiguous slice
+    of `order`. Queries first select occupied cells with array math and then
+    filter the points in them exactly. All queries return indices into the
+    arrays the index was built from.
+    """
+    
+    def __init__(self, xs, ys, cell_size):
+        self.xs = np.asarray(xs, dtype=float)
+        self.ys = np.asarray(ys, dtype=float)
+        
+        self.cell_size = float(cell_size)
+        
+        if len(self.xs) == 0:
+            self.origin = (0.0, 0.0)
+            self.order = np.empty(0, dtype=np.intp)
+            self.cells_x = self.cells_y = self.starts = self.ends = np.empty(0, dtype=np.intp)
+            return
+        
+        self.origin = (float(self.xs.min()), float(self.ys.min()))
+        
+        cx = ((self.xs - self.origin[0])//self.cell_size).astype(np.int64)
+        cy = ((self.ys - self.origin[1])//self.cell_size).astype(np.int64)
+        
+        key = cx*(int(cy.max()) + 1) + cy
+        self.order = np.argsort(key, kind="stable")
+        
+        sorted_key = key[self.order]
+        self.starts = np.flatnonzero(np.r_[True, sorted_key[1:] != sorted_key[:-1]])
+        self.ends = np.r_[self.starts[1:], len(sorted_key)]
+        
+        first = self.order[self.starts]
+        self.cells_x = cx[first]
+        self.cells_y = cy[first]
+    
+    def __len__(self):
+        return len(self.xs)
+    
+    
+    # ---------------------------------- Helpers --------------------------------- #
+    
+    def _cell(self, x, y):
+        return (
+            math.floor((x - self.origin[0])/self.cell_size),
+            math.floor((y - self.origin[1])/self.cell_size)
+        )
+    
+    def _candidates(self, x0, y0, x1, y1):
+        (c0x, c0y), (c1x, c1y) = self._cell(x0, y0), self._cell(x1, y1)
+        
+        cells = np.flatnonzero(
+            (self.cells_x >= c0x) & (self.cells_x <= c1x)
+                &
+            (self.cells_y >= c0y) & (self.cells_y <= c1y)
+        )
+        
+        if len(cells) == 0:
+            return np.empty(0, dtype=np.intp)
+        
+        return np.concatenate([self.order[self.starts[c]:self.ends[c]] for c in cells.tolist()])
+    
+    
+    # ---------------------------------- Queries --------------------------------- #
+    
+    def query_rect(self, x0, y0, x1, y1):
+        """Indices of points inside the rectangle (corners in any order)."""
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
+        
+        idx = self._candidates(x0, y0, x1, y1)
+        
+        px = self.xs[idx]
+        py = self.ys[idx]
+        
+        return np.sort(idx[(px >= x0) & (px <= x1) & (py >= y0) & (py <= y1)])
+    
+    def query_radius(self, x, y, radius):
+        """Indices of points within `radius` of (x, y)."""
+        idx = self._candidates(x - radius, y - radius, x + radius, y + radius)
+        
+        d2 = (self.xs[idx] - x)**2 + (self.ys[idx] - y)**2
+        
+        return np.sort(idx[d2 <= radius*radius])
+    
+    def nearest(self, x, y, k=1):
+        """Indices of the `k` nearest points to (x, y), closest first."""
+        k = min(k, len(self))
+        
+        if k == 0:
+            return np.empty(0, dtype=np.intp)
+        
+        radius = self.cell_size
+        while True:
+            idx = self._candidates(x - radius, y - radius, x + radius, y + radius)
+            
+            if len(idx) >= k:
+                d2 = (self.xs[idx] - x)**2 + (self.ys[idx] - y)**2
+                best = np.argsort(d2, kind="stable")[:k]
+                
+                # everything closer than the k-th candidate must be in the searched square
+                if d2[best[-1]] <= radius*radius or len(idx) == len(self):
+                    return idx[best]
+            
+            radius *= 2
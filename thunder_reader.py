@@ -2,10 +2,37 @@
 
 import os
 import sys
-from urllib.request import urlopen
+import socket
+import http.client
+from urllib.parse import urlsplit
 import json
 import time
 import math
+import threading
+import copy
+import hashlib
+import zlib
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+from typing import List, TypedDict
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+from columnar import ObjectColumns, COLORS, GROUP_OTHER
+from capture import CaptureSession, CaptureWriter
+from perf import PerfMonitor
+from spatial import GridIndex
+from clustering import cluster_spawns, mid_spawns__realtime
 
 import logging
 logger = logging.getLogger(__name__)
@@ -17,146 +44,701 @@ logger = logging.getLogger(__name__)
 # ---------------------------------------------------------------------------- #
 
 
-THUNDER_OBJECTS_PATH = "http://127.0.0.1:8111/map_obj.json"
-THUNDER_MAP_INFO_PATH = "http://127.0.0.1:8111/map_info.json"
-THUNDER_MAP_IMG = "http://localhost:8111/map.img"
+THUNDER_HOST = "127.0.0.1" # not "localhost": it may resolve to ::1 first and stall
+THUNDER_PORT = 8111
+THUNDER_TIMEOUT = 1.0 # seconds, for connect and for every read
+
+# keep-alive guard: the first requests of an endpoint are timed on fresh and on
+# pooled connections, pooling is turned off for it when it turns out slower
+# (a server that leaves Nagle on stalls every pooled response by a delayed ACK)
+KEEPALIVE_SAMPLES = 8 # requests per kind before deciding
+KEEPALIVE_SLOWDOWN = 3 # pooled median above this many fresh medians...
+KEEPALIVE_MARGIN_MS = 1.0 # ...plus this, means one connection per request
+
+# the THUNDER_API environment variable points the reader elsewhere (e.g. at mock_server.py)
+THUNDER_API = os.environ.get("THUNDER_API", f"http://{THUNDER_HOST}:{THUNDER_PORT}").rstrip("/")
+THUNDER_OBJECTS_PATH = f"{THUNDER_API}/map_obj.json"
+THUNDER_MAP_INFO_PATH = f"{THUNDER_API}/map_info.json"
+THUNDER_MAP_IMG = f"{THUNDER_API}/map.img"
+
+TCP_QUICKACK = getattr(socket, "TCP_QUICKACK", None) # Linux only
 
 OUR_COLOR = '#174DFF'
 
+PLAYER_NOT_FOUND = "Player not found" # map_obj.json without the player: dead, spectating, respawn screen
+
+INDEX_GRID_CELLS = 64 # spatial index cells along the longer map side
+TRACK_MAX_SPEED = 1000 # m/s, objects moving faster between polls are not matched
+
+MAP_IMG_FILE = os.path.join(sys.path[0], "local", "map.png")
+
 
 
 # ---------------------------------------------------------------------------- #
-#                                   MapReader                                  #
+#                                 JSON Decoding                                #
 # ---------------------------------------------------------------------------- #
 
 
-# ----------------------------------- Utils ---------------------------------- #
+class MapObjectFields(TypedDict, total=False):
+    """The map_obj.json fields the minimap reads, typed decoders drop the rest."""
+    type: str
+    icon: str
+    color: str
+    x: float
+    y: float
+    sx: float
+    sy: float
+    ex: float
+    ey: float
+    dx: float
+    dy: float
 
-def get_type(obj):
-    return obj["icon"] if obj["icon"] != 'none' else obj['type']
 
+class JsonDecoder:
+    """Standard library backend, always available."""
+    
+    name = "json"
+    
+    def decode(self, buf):
+        if isinstance(buf, memoryview):
+            buf = bytes(buf)
+        
+        return json.loads(buf)
+    
+    def decode_objects(self, buf):
+        return self.decode(buf)
 
-# ----------------------------------- Class ---------------------------------- #
 
-class MapReader:
+class OrjsonDecoder(JsonDecoder):
+    name = "orjson"
     
+    def decode(self, buf):
+        return orjson.loads(buf)
+
+
+class MsgspecDecoder(JsonDecoder):
+    name = "msgspec"
     
-    # ----------------------------------- Init ----------------------------------- #
+    def __init__(self):
+        self._any = msgspec.json.Decoder()
+        self._objects = msgspec.json.Decoder(List[MapObjectFields])
+    
+    def decode(self, buf):
+        return self._any.decode(buf)
+    
+    def decode_objects(self, buf):
+        return self._objects.decode(buf)
+
+
+JSON_DECODERS = {
+    "msgspec": MsgspecDecoder if msgspec else None,
+    "orjson": OrjsonDecoder if orjson else None,
+    "json": JsonDecoder,
+}
+
+def get_decoder(name="auto"):
+    if name == "auto":
+        name = next(n for n, backend in JSON_DECODERS.items() if backend)
     
+    if not JSON_DECODERS.get(name):
+        logger.warning("JSON backend %s is not installed, using json", name)
+        name = "json"
+    
+    return JSON_DECODERS[name]()
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                 HTTP Session                                 #
+# ---------------------------------------------------------------------------- #
+
+
+class EndpointStats:
     def __init__(self):
-        self._map_data = None
+        self.requests = 0
+        self.reconnects = 0
+        self.total_ms = 0.0
+        self.last_ms = 0.0
         
-        self.objects = {
-            "ground": [],
-            "other": [],
-            "player": None
-        }
+        self.keep_alive = None # None while the guard is still timing both kinds of connections
+        self.fresh_ms = []
+        self.pooled_ms = []
+    
+    def add(self, ms):
+        self.requests += 1
+        self.total_ms += ms
+        self.last_ms = ms
+    
+    def mean_ms(self):
+        return self.total_ms/self.requests if self.requests else 0.0
+    
+    def wants_fresh(self):
+        """Whether the next request gets a connection of its own (closed after the response)."""
+        return self.keep_alive is False or (self.keep_alive is None and len(self.fresh_ms) < KEEPALIVE_SAMPLES)
+    
+    def calibrate(self, ms, fresh):
+        """Records a guard sample, returns True once keep_alive is decided."""
+        (self.fresh_ms if fresh else self.pooled_ms).append(ms)
         
-        self.isReady = False
-        self.last_error = None
+        if len(self.fresh_ms) < KEEPALIVE_SAMPLES or len(self.pooled_ms) < KEEPALIVE_SAMPLES:
+            return False
+        
+        self.keep_alive = statistics.median(self.pooled_ms) <= KEEPALIVE_SLOWDOWN*statistics.median(self.fresh_ms) + KEEPALIVE_MARGIN_MS
         
-        self.update_objects_data()
+        return True
+    
+    def __repr__(self):
+        mode = {None: "calibrating", True: "keep-alive", False: "fresh connections"}[self.keep_alive]
+        
+        return f"{self.requests} req, avg {self.mean_ms():.2f}ms, last {self.last_ms:.2f}ms, {self.reconnects} reconnects, {mode}"
+
 
-    def map_init(self):
-        data = json.loads(urlopen(THUNDER_MAP_INFO_PATH).read())
+class ThunderSession:
+    """
+    Pool of persistent (keep-alive) HTTP connections to the game API.
+    
+    Every endpoint gets its own `http.client` connection, so a request only
+    pays for TCP setup when the previous connection was dropped. Stale
+    keep-alive sockets are detected and the request is retried once on a
+    fresh connection.
+    
+    Pooled sockets use TCP_NODELAY and, where the OS has it, TCP_QUICKACK
+    (so a server that sends headers and body in two writes with Nagle on
+    is not held up by our delayed ACK). On top of that every endpoint
+    starts with `KEEPALIVE_SAMPLES` requests on fresh connections and as
+    many on a pooled one, and goes back to a connection per request (like
+    the old `urlopen` reader) when pooling is clearly slower.
+    """
+    
+    RETRY_ERRORS = (
+        http.client.RemoteDisconnected,
+        http.client.CannotSendRequest,
+        http.client.ResponseNotReady,
+        BrokenPipeError,
+        ConnectionResetError,
+        ConnectionAbortedError,
+    )
+    
+    def __init__(self, timeout=THUNDER_TIMEOUT, decoder=None):
+        self.timeout = timeout
+        self.decoder = decoder or get_decoder()
         
-        self._map_data = data
+        self._connections = {}
+        self._buffers = {}
+        self._locks = {}
+        self._pool_lock = threading.Lock()
         
-        img = urlopen(THUNDER_MAP_IMG).read()
-        with open(os.path.join(sys.path[0], "local", "map.png"), 'wb') as f:
-            f.write(img)
+        self.closed = False
+        self.stats = {}
+    
+    
+    # -------------------------------- Connections ------------------------------- #
+    
+    def _endpoint(self, url):
+        with self._pool_lock:
+            if url not in self._locks:
+                self._locks[url] = threading.Lock()
+                self.stats[url] = EndpointStats()
+            
+            return self._locks[url], self.stats[url]
+    
+    def _connect(self, url):
+        parts = urlsplit(url)
         
-        self._map_size = [
-            self._map_data["map_max"][0] - self._map_data["map_min"][0],
-            self._map_data["map_max"][1] - self._map_data["map_min"][1]
-        ]
-
+        conn = http.client.HTTPConnection(
+            parts.hostname or THUNDER_HOST, 
+            parts.port or THUNDER_PORT, 
+            timeout=self.timeout
+        )
+        conn.connect()
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        
+        self._connections[url] = conn
+        
+        return conn
     
-    # ---------------------------------- Update ---------------------------------- #
+    def _drop(self, url):
+        conn = self._connections.pop(url, None)
+        
+        if conn:
+            conn.close()
     
-    def update_objects_data(self):
+    def close(self):
+        """
+        Drops every pooled connection. Requests in flight finish first (each
+        endpoint's lock is taken), later `get` calls fail.
+        """
+        with self._pool_lock:
+            self.closed = True
+            locks = list(self._locks.items())
+        
+        for url, lock in locks:
+            with lock:
+                self._drop(url)
+    
+    def probe(self, url=None):
+        """
+        Whether anything accepts TCP connections at the API address (no HTTP).
+        Without `url` it probes the host of `THUNDER_OBJECTS_PATH` as it is at
+        call time, so overriding the endpoint constants redirects probes too.
+        """
+        parts = urlsplit(url or THUNDER_OBJECTS_PATH)
+        
         try:
-            if not self.isReady:
-                self.map_init()
-
-            self._objects_data = json.loads(urlopen(THUNDER_OBJECTS_PATH).read())
+            with socket.create_connection((parts.hostname or THUNDER_HOST, parts.port or THUNDER_PORT), timeout=self.timeout):
+                return True
+        except OSError:
+            return False
+    
+    
+    # ---------------------------------- Request --------------------------------- #
+    
+    def _read_into_buffer(self, response, url):
+        length = response.getheader("Content-Length")
+        
+        if length is None:
+            return response.read()
+        
+        length = int(length)
+        
+        buffer = self._buffers.get(url)
+        if buffer is None or len(buffer) < length:
+            # a new bytearray instead of resizing, views handed out earlier stay valid
+            buffer = bytearray(max(length, 2*len(buffer or b"")))
+            self._buffers[url] = buffer
+        
+        view = memoryview(buffer)[:length]
+        
+        read = 0
+        while read < length:
+            n = response.readinto(view[read:])
             
-            self.objects = {
-                "ground": [],
-                "other": [],
-                "player": None
-            }
+            if not n:
+                raise http.client.IncompleteRead(bytes(view[:read]), length - read)
             
-            for i in self._objects_data:
-                if i['icon'] == "Player":
-                    self.objects["player"] = (
-                        i['x']*self._map_size[0], 
-                        i['y']*self._map_size[1], 
-                        i['dx'], 
-                        i['dy'])
-                    continue
+            read += n
+        
+        return view
+    
+    def _request(self, conn, url, reuse_buffer=False, keep_alive=True):
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        
+        if parts.query:
+            path += "?" + parts.query
+        
+        conn.request("GET", path, headers={"Connection": "keep-alive" if keep_alive else "close"})
+        
+        if keep_alive and TCP_QUICKACK is not None:
+            # Linux falls back to delayed ACKs after a while, re-armed per request
+            conn.sock.setsockopt(socket.IPPROTO_TCP, TCP_QUICKACK, 1)
+        
+        response = conn.getresponse()
+        
+        if reuse_buffer and response.status == 200:
+            return self._read_into_buffer(response, url)
+        
+        body = response.read()
+        
+        if response.status != 200:
+            raise http.client.HTTPException(f"{url} returned {response.status} {response.reason}")
+        
+        return body
+    
+    def get(self, url, reuse_buffer=False):
+        """
+        Body of `url` as bytes. With `reuse_buffer` the body is read into a
+        per-endpoint buffer and returned as a memoryview, which stays valid
+        only until the next `reuse_buffer` request to the same endpoint.
+        """
+        lock, stats = self._endpoint(url)
+        
+        with lock:
+            if self.closed:
+                raise ConnectionAbortedError(f"Session closed, {url} not requested")
+            
+            t = time.perf_counter()
+            
+            fresh = stats.wants_fresh()
+            if fresh:
+                self._drop(url)
+            
+            conn = self._connections.get(url)
+            reused = conn is not None
+            
+            try:
+                if not reused:
+                    conn = self._connect(url)
                 
-                if i['type'] == "ground_model":
-                    self.objects["ground"].append({
-                        "type": get_type(i), 
-                        "position":(
-                            i['x']*self._map_size[0], 
-                            i['y']*self._map_size[1]
-                        ),
-                        "color": i['color']})
-                else:
-                    data = {}
-                    
-                    if 'x' in i:
-                        data = {
-                            "type": get_type(i), 
-                            "position":(
-                                i['x']*self._map_size[0], 
-                                i['y']*self._map_size[1]
-                            ),
-                            "color": i['color']}
-                    else:
-                        data = {
-                            "type": get_type(i), 
-                            "position":(
-                                i['sx']*self._map_size[0], 
-                                i['sy']*self._map_size[1]
-                            ),
-                            "color": i['color']}
+                try:
+                    body = self._request(conn, url, reuse_buffer, keep_alive=not fresh)
+                except self.RETRY_ERRORS:
+                    if not reused:
+                        raise
                     
-                    if 'dx' in i:
-                        data["dir"] = (
-                            i["dx"],
-                            i["dy"]
-                        )
-                    
-                    self.objects["other"].append(data)
+                    # the game closed the idle keep-alive socket, try again on a new one
+                    stats.reconnects += 1
+                    self._drop(url)
+                    body = self._request(self._connect(url), url, reuse_buffer)
+            except Exception:
+                self._drop(url)
+                raise
             
-            if not self.objects["player"]:
-                self.last_error = "Player not found"
-                self.isReady = False
+            if fresh:
+                self._drop(url)
+            
+            ms = (time.perf_counter() - t)*1000
+            stats.add(ms)
+            
+            if stats.keep_alive is None and stats.calibrate(ms, fresh):
+                self._report_keep_alive(url, stats)
+            
+            return body
+    
+    @staticmethod
+    def _report_keep_alive(url, stats):
+        fresh_ms = statistics.median(stats.fresh_ms)
+        pooled_ms = statistics.median(stats.pooled_ms)
+        
+        if stats.keep_alive:
+            logger.info("Keep-alive for %s: %.2fms pooled vs %.2fms fresh (median)", url, pooled_ms, fresh_ms)
+        else:
+            logger.warning("Keep-alive is slower for %s (%.2fms pooled vs %.2fms fresh), using a connection per request", url, pooled_ms, fresh_ms)
+    
+    def get_json(self, url):
+        return self.decoder.decode(self.get(url, reuse_buffer=True))
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                  Map Session                                 #
+# ---------------------------------------------------------------------------- #
+
+
+class MapSession:
+    """
+    Tracks which map the game is currently on.
+    
+    `refresh` always re-reads the small map_info.json, but map.img is only
+    downloaded when (map_generation, map_min, map_max) changes. The image
+    bytes are kept in memory (the map background decodes them into its
+    tile pyramid), `local/map.png` is rewritten only when its content
+    actually changes.
+    """
+    
+    EMPTY = "empty"
+    LOADING = "loading"
+    READY = "ready"
+    
+    def __init__(self, http, map_file=MAP_IMG_FILE):
+        self.http = http
+        
+        self.map_file = map_file
+        
+        self.state = self.EMPTY
+        
+        self.info = None
+        self.key = None
+        
+        self.image_bytes = None
+        self.image_hash = None
+        
+        self._map_file_hash = None
+    
+    
+    # -------------------------------- Fingerprint ------------------------------- #
+    
+    @staticmethod
+    def info_key(info):
+        return (
+            info["map_generation"], 
+            tuple(info["map_min"]), 
+            tuple(info["map_max"])
+        )
+    
+    @property
+    def fingerprint(self):
+        if self.state != self.READY:
+            return None
+        
+        return self.key + (self.image_hash,)
+    
+    @property
+    def map_size(self):
+        return [
+            self.info["map_max"][0] - self.info["map_min"][0],
+            self.info["map_max"][1] - self.info["map_min"][1]
+        ]
+    
+    
+    # ---------------------------------- Refresh --------------------------------- #
+    
+    def refresh(self, info=None):
+        """
+        `info` lets the caller request map_info.json concurrently with other
+        requests, otherwise it is fetched here. map.img is only requested
+        after `info` shows a valid map with a new key.
+        """
+        if info is None:
+            info = self.http.get_json(THUNDER_MAP_INFO_PATH)
+        
+        if not info.get("valid", True):
+            raise ValueError("Map is not available (map_info.json is not valid)")
+        
+        key = self.info_key(info)
+        
+        if self.state == self.READY and key == self.key:
+            self.info = info
+            return False
+        
+        logger.info("New map detected (gen: %d), loading map image", key[0])
+        
+        self.state = self.LOADING
+        self.set_image(self.http.get(THUNDER_MAP_IMG))
+        
+        self.info = info
+        self.key = key
+        self.state = self.READY
+        
+        return True
+    
+    
+    # ----------------------------------- Image ---------------------------------- #
+    
+    def set_image(self, img):
+        self.image_bytes = img
+        self.image_hash = hashlib.sha1(img).hexdigest()
+        
+        try:
+            self.store_image()
+        except OSError as e:
+            logger.warning("Could not store map image: %s", e)
+    
+    def store_image(self):
+        if self._map_file_hash is None and os.path.exists(self.map_file):
+            with open(self.map_file, 'rb') as f:
+                self._map_file_hash = hashlib.sha1(f.read()).hexdigest()
+        
+        if self._map_file_hash != self.image_hash:
+            with open(self.map_file, 'wb') as f:
+                f.write(self.image_bytes)
+            
+            self._map_file_hash = self.image_hash
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                Object Tracker                                #
+# ---------------------------------------------------------------------------- #
+
+
+def wrap_angle(angle):
+    return (angle + math.pi) % (2*math.pi) - math.pi
+
+
+class ObjectTracker:
+    """
+    Associates objects between consecutive ObjectColumns and estimates their
+    motion, so the renderer can move markers between polls.
+    
+    Objects only match objects of the same type and color. A match is the
+    nearest unclaimed previous position within `max_speed*dt` meters
+    (greedy, closest pairs first). Velocities (m/s) and heading rates
+    (rad/s) are smoothed exponentially. Objects without a match start at
+    rest.
+    """
+    
+    MATRIX_LIMIT = 1 << 18 # pairs per group before switching to a grid join
+    
+    def __init__(self, max_speed=TRACK_MAX_SPEED, smoothing=0.5, max_gap=2.0):
+        self.max_speed = max_speed
+        self.smoothing = smoothing
+        self.max_gap = max_gap # seconds, older history is not trusted
+        
+        self._prev = None
+        self._prev_t = None
+        self._prev_heading = None
+    
+    def reset(self):
+        self._prev = None
+    
+    
+    # -------------------------------- Association ------------------------------- #
+    
+    def _pairs(self, prev, cur, pi, ci, gate):
+        if len(pi)*len(ci) <= self.MATRIX_LIMIT:
+            d = np.hypot(cur.x[ci, None] - prev.x[None, pi], cur.y[ci, None] - prev.y[None, pi])
+            c, p = np.nonzero(d <= gate)
+            
+            return d[c, p], c, p
+        
+        return self._pairs__grid(prev.x[pi], prev.y[pi], cur.x[ci], cur.y[ci], gate)
+    
+    @staticmethod
+    def _pairs__grid(px, py, cx, cy, gate):
+        """
+        Candidate pairs of big groups without the full distance matrix: both
+        sides are binned into `gate` sized cells and every current point is
+        joined with the previous points of its 3x3 cells (`searchsorted`
+        over the sorted previous cell keys), all vectorized.
+        """
+        cell = max(gate, 1.0)
+        x0 = min(px.min(), cx.min())
+        y0 = min(py.min(), cy.min())
+        
+        pkx = ((px - x0)//cell).astype(np.int64)
+        pky = ((py - y0)//cell).astype(np.int64)
+        ckx = ((cx - x0)//cell).astype(np.int64)
+        cky = ((cy - y0)//cell).astype(np.int64)
+        
+        span = int(max(pky.max(), cky.max())) + 3 # rows -1 .. max + 1 around every cell
+        
+        order = np.argsort(pkx*span + pky + 1, kind="stable")
+        keys = (pkx*span + pky + 1)[order]
+        
+        rows = np.arange(len(cx))
+        dist, cs, ps = [], [], []
+        
+        for ox in (-1, 0, 1):
+            for oy in (-1, 0, 1):
+                key = (ckx + ox)*span + cky + 1 + oy
                 
-                return None
+                lo = np.searchsorted(keys, key, "left")
+                counts = np.searchsorted(keys, key, "right") - lo
+                total = int(counts.sum())
+                
+                if not total:
+                    continue
+                
+                c = np.repeat(rows, counts)
+                p = order[np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(total)]
+                d = np.hypot(cx[c] - px[p], cy[c] - py[p])
+                
+                near = d <= gate
+                dist.append(d[near])
+                cs.append(c[near])
+                ps.append(p[near])
+        
+        if not dist:
+            return np.empty(0), np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        
+        # same (current, previous) order as the matrix, so ties match the same way
+        c, p = np.concatenate(cs), np.concatenate(ps)
+        order = np.lexsort((p, c))
+        
+        return np.concatenate(dist)[order], c[order], p[order]
+    
+    def associate(self, prev, cur, gate):
+        """For every current row the matched previous row, or -1."""
+        match = np.full(len(cur), -1, dtype=np.intp)
+        
+        prev_key = prev.type.astype(np.int64)*65536 + prev.color
+        cur_key = cur.type.astype(np.int64)*65536 + cur.color
+        
+        for key in np.intersect1d(prev_key, cur_key).tolist():
+            pi = np.flatnonzero(prev_key == key)
+            ci = np.flatnonzero(cur_key == key)
             
-            if not self.isReady:
-                self.map_spawns_cached = self.generate_mid_spawns()
-                logger.info("Spawns calculated: %s", "".join(
-                                    map(
-                                        lambda obj: f'\n{" "*25} {obj["name"]} ({obj["position"][0]}x{obj["position"][1]})', 
-                                        self.map_spawns_cached
-                                    )
-                                )
-                            )
+            dist, c, p = self._pairs(prev, cur, pi, ci, gate)
+            
+            order = np.argsort(dist, kind="stable")
+            c, p = c[order], p[order]
+            
+            # greedy closest-first matching, in rounds: a pair that is the best
+            # remaining one for both of its rows is exactly what the greedy
+            # scan would take, so take all of them at once and drop their rows
+            while len(c):
+                first = np.zeros(len(c), dtype=bool)
+                first[np.unique(c, return_index=True)[1]] = True
                 
-                logger.info("Map initialization complete (map size: %dx%d, gen: %d)", self._map_size[0], self._map_size[1], self._map_data["map_generation"])
+                take = np.zeros(len(c), dtype=bool)
+                take[np.unique(p, return_index=True)[1]] = True
+                take &= first
+                
+                match[ci[c[take]]] = pi[p[take]]
+                
+                used_c = np.zeros(len(ci), dtype=bool)
+                used_p = np.zeros(len(pi), dtype=bool)
+                used_c[c[take]] = True
+                used_p[p[take]] = True
+                
+                keep = ~(used_c[c] | used_p[p])
+                c, p = c[keep], p[keep]
+        
+        return match
+    
+    
+    # ---------------------------------- Update ---------------------------------- #
+    
+    def update(self, columns, t):
+        n = len(columns)
+        
+        columns.vx = np.zeros(n)
+        columns.vy = np.zeros(n)
+        columns.turn = np.zeros(n)
+        columns.player_motion = (0.0, 0.0, 0.0)
+        
+        heading = np.arctan2(columns.dy, columns.dx) # NaN for objects without direction
+        
+        prev = self._prev
+        dt = t - self._prev_t if prev is not None else 0
+        
+        if prev is not None and 0 < dt <= self.max_gap:
+            a = self.smoothing
             
-            self.isReady = True
-            return True
-        except Exception as e:
-            self.last_error = e
-            self.isReady = False
+            match = self.associate(prev, columns, self.max_speed*dt)
+            m = np.flatnonzero(match >= 0)
+            pm = match[m]
             
-            return None
+            columns.vx[m] = a*(columns.x[m] - prev.x[pm])/dt + (1 - a)*prev.vx[pm]
+            columns.vy[m] = a*(columns.y[m] - prev.y[pm])/dt + (1 - a)*prev.vy[pm]
+            
+            turn = a*wrap_angle(heading[m] - self._prev_heading[pm])/dt + (1 - a)*prev.turn[pm]
+            columns.turn[m] = np.nan_to_num(turn)
+            
+            pp, cp = prev.player, columns.player
+            if pp and cp and math.hypot(cp[0] - pp[0], cp[1] - pp[1]) <= self.max_speed*dt:
+                pvx, pvy, pturn = prev.player_motion
+                
+                columns.player_motion = (
+                    a*(cp[0] - pp[0])/dt + (1 - a)*pvx,
+                    a*(cp[1] - pp[1])/dt + (1 - a)*pvy,
+                    a*wrap_angle(math.atan2(cp[3], cp[2]) - math.atan2(pp[3], pp[2]))/dt + (1 - a)*pturn
+                )
+        
+        columns.moving = bool(
+            np.any(columns.vx) or np.any(columns.vy) or np.any(columns.turn) 
+                or 
+            any(columns.player_motion)
+        )
+        
+        self._prev = columns
+        self._prev_t = t
+        self._prev_heading = heading
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                   MapReader                                  #
+# ---------------------------------------------------------------------------- #
+
+
+# ----------------------------------- Utils ---------------------------------- #
+
+def get_type(obj):
+    return obj["icon"] if obj["icon"] != 'none' else obj['type']
+
+
+# ------------------------------- Calculations ------------------------------- #
+
+class MapView:
+    """
+    Queries over parsed map data. Expects `objects`, `columns`, `_map_size`
+    and `map_spawns_cached` on the instance, see MapReader and MapSnapshot.
+    `columns` is an ObjectColumns when the reader runs in columnar mode.
+    """
+    
+    __slots__ = ()
     
     
     # ------------------------------- Get Variables ------------------------------ #
@@ -199,8 +781,15 @@ class MapReader:
     
     # ------------------------------- Calculations ------------------------------- #
     
+    def has_other(self):
+        """Whether there are any non-ground objects (columns are checked directly, no dict lists)."""
+        if self.columns is not None:
+            return bool(self.columns.mask_group(GROUP_OTHER).any())
+        
+        return bool(self.objects["other"])
+    
     def get_mid_spawns(self, use_cached=False):
-        if not self.objects["other"]:
+        if not self.has_other():
             return []
         
         if use_cached:
@@ -209,92 +798,44 @@ class MapReader:
         return self.get_mid_spawns__realtime()
     
     def get_mid_spawns__realtime(self):
-        spawns = {}
+        if self.columns is not None:
+            return self.columns.get_mid_spawns__realtime()
         
-        for sp in self.objects["other"]:
-            if sp["type"] != "respawn_base_tank":
-                continue
-            
-            name = f'{math.floor(sp["position"][0]/250)}x{math.floor(sp["position"][1]/200)}_{sp["color"]}'
-            
-            if name in spawns:
-                spawns[name]["pos_sum"][0] += sp["position"][0]
-                spawns[name]["pos_sum"][1] += sp["position"][1]
-                spawns[name]["count"] += 1
-            else:
-                spawns[name] = {
-                    "pos_sum": [sp["position"][0], sp["position"][1]],
-                    "count": 1
-                }
-            
-        mid_spawns = []
-        for name, spawn in spawns.items():
-            name, color = name.split("_")
-            
-            mid_spawns.append({
-                "name": name,
-                "color": color,
-                "position": (
-                    spawn["pos_sum"][0]/spawn["count"],
-                    spawn["pos_sum"][1]/spawn["count"]
-                )
-            })
-            
-        return mid_spawns
+        spawns = [sp for sp in self.objects["other"] if sp["type"] == "respawn_base_tank"]
+        
+        color_codes = {}
+        codes = [color_codes.setdefault(sp["color"], len(color_codes)) for sp in spawns]
+        
+        return mid_spawns__realtime(
+            [sp["position"][0] for sp in spawns],
+            [sp["position"][1] for sp in spawns],
+            codes,
+            list(color_codes)
+        )
     
     def get_mid_spawns__cached(self):
         return self.map_spawns_cached
     
     def generate_mid_spawns(self, max_distance=300):
-        if not self.objects["other"]:
+        if not self.has_other():
             return []
         
-        objects = list(filter(lambda x: x["type"] == "respawn_base_tank", self.objects["other"]))
+        if self.columns is not None:
+            mask = self.columns.mask_type("respawn_base_tank")
+            
+            return cluster_spawns(
+                list(zip(self.columns.x[mask].tolist(), self.columns.y[mask].tolist())),
+                [COLORS.values[code] for code in self.columns.color[mask].tolist()],
+                max_distance
+            )
         
-        clusters = {}
-
-        for obj in objects:
-            pos = obj['position']
-            color = obj['color']
-
-            if color not in clusters:
-                clusters[color] = {'points': [], 'color': color}
-
-            clusters[color]['points'].append(pos)
-
-        result = []
-
-        for color, data in clusters.items():
-            points = data['points']
-            clusters_found = []
-
-            for point in points:
-                found_cluster = False
-
-                for cluster in clusters_found:
-
-                    if self.calculate_distance(point, cluster['position']) < max_distance:
-                        cluster['members'].append(point)
-
-                        cluster['position'] = (
-                            sum(x[0] for x in cluster['members']) / len(cluster['members']),
-                            sum(x[1] for x in cluster['members']) / len(cluster['members'])
-                        )
-                        found_cluster = True
-                        break
-                
-                if not found_cluster:
-                    new_cluster = {
-                        'name': f'pregenerated_{color}_cluster',
-                        'color': color,
-                        'position': point,
-                        'members': [point]
-                    }
-                    clusters_found.append(new_cluster)
-
-            result.extend(clusters_found)
-
-        return result
+        spawns = [sp for sp in self.objects["other"] if sp["type"] == "respawn_base_tank"]
+        
+        return cluster_spawns(
+            [sp['position'] for sp in spawns], 
+            [sp['color'] for sp in spawns], 
+            max_distance
+        )
     
     
     # ----------------------- Convert To Absolute Position ----------------------- #
@@ -312,3 +853,313 @@ class MapReader:
             pos[0]/self._map_size[0],
             pos[1]/self._map_size[1]
         )
+
+
+
+# --------------------------------- Snapshot --------------------------------- #
+
+class MapSnapshot(MapView):
+    """
+    Immutable result of one MapReader update, published by the poller thread
+    and read by the Tk thread. Nothing in it is mutated after creation.
+    """
+    
+    __slots__ = ("objects", "columns", "_map_size", "map_spawns_cached", "map_hash", "map_image", "isReady", "last_error", "sequence", "received_at", "payload_stats")
+    
+    def __init__(self, reader, sequence):
+        self.objects = reader.objects
+        self.columns = reader.columns
+        self._map_size = reader._map_size
+        self.map_spawns_cached = reader.map_spawns_cached
+        
+        # map.img bytes (immutable) of the current map, for the map background
+        self.map_hash = reader.map_session.image_hash
+        self.map_image = reader.map_session.image_bytes
+        
+        self.isReady = reader.isReady
+        self.last_error = reader.last_error
+        
+        self.sequence = sequence
+        self.received_at = reader.received_at
+        
+        # (unchanged, changed) map_obj.json responses so far
+        self.payload_stats = (reader.payload_stats["hits"], reader.payload_stats["misses"])
+    
+    @property
+    def moving(self):
+        return self.columns is not None and self.columns.moving
+    
+    def extrapolate(self, dt):
+        """Copy with tracked objects and the player moved `dt` seconds ahead."""
+        if not self.moving or dt <= 0:
+            return self
+        
+        res = copy.copy(self)
+        res.columns = self.columns.extrapolated(dt)
+        res.objects = res.columns.objects
+        
+        return res
+
+
+# ----------------------------------- Class ---------------------------------- #
+
+class MapReader(MapView):
+    
+    
+    # ----------------------------------- Init ----------------------------------- #
+    
+    def __init__(self, session=None, columnar=False, json_backend="auto", tracker=None, capture=None, perf=None):
+        self.http = session or ThunderSession(decoder=get_decoder(json_backend))
+        
+        if self.http.decoder is None: # replay sessions don't pick one themselves
+            self.http.decoder = get_decoder(json_backend)
+        
+        logger.info("JSON backend: %s", self.http.decoder.name)
+        
+        self.capture = None
+        if capture:
+            self.capture = CaptureWriter(capture)
+            self.http = CaptureSession(self.http, self.capture)
+        
+        self.columnar = columnar
+        self.columns = None
+        
+        self.tracker = tracker if columnar else None
+        self.perf = perf or PerfMonitor() # fetch, decode and parse timings
+        self.received_at = time.perf_counter()
+        self.map_session = MapSession(self.http)
+        
+        self._map_data = None
+        self._map_size = None
+        self.map_spawns_cached = []
+        
+        self.objects = {
+            "ground": [],
+            "other": [],
+            "player": None
+        }
+        
+        self.isReady = False
+        self.last_error = None
+        
+        self.unchanged = False
+        self._objects_fingerprint = None
+        self.payload_stats = {
+            "hits": 0,
+            "misses": 0
+        }
+        
+        self._pool = None # map_init requests, created on first use
+        
+        # no request here: the first update_objects_data (on the poller
+        # thread) fetches the map and the objects, so the window shows at once
+
+    def map_init(self, prefetch_objects=False):
+        """
+        Re-reads the map. map_info.json and with `prefetch_objects`
+        map_obj.json are requested concurrently, map.img only once map_info
+        shows a valid new map (not in the lobby or hangar); returns the
+        `fetch_objects` result or None.
+        """
+        pool = self._init_pool()
+        
+        info_future = pool.submit(self.http.get_json, THUNDER_MAP_INFO_PATH)
+        objects_future = pool.submit(self.fetch_objects) if prefetch_objects else None
+        
+        self.map_session.refresh(info_future.result())
+        
+        self._map_data = self.map_session.info
+        self._map_size = self.map_session.map_size
+        
+        return objects_future.result() if objects_future else None
+    
+    def _init_pool(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="MapInit")
+        
+        return self._pool
+
+    
+    # ---------------------------------- Update ---------------------------------- #
+    
+    def parse_objects(self, objects_data):
+        objects = {
+            "ground": [],
+            "other": [],
+            "player": None
+        }
+        
+        for i in objects_data:
+            if i['icon'] == "Player":
+                objects["player"] = (
+                    i['x']*self._map_size[0], 
+                    i['y']*self._map_size[1], 
+                    i['dx'], 
+                    i['dy'])
+                continue
+            
+            if i['type'] == "ground_model":
+                objects["ground"].append({
+                    "type": get_type(i), 
+                    "position":(
+                        i['x']*self._map_size[0], 
+                        i['y']*self._map_size[1]
+                    ),
+                    "color": i['color']})
+            else:
+                data = {}
+                
+                if 'x' in i:
+                    data = {
+                        "type": get_type(i), 
+                        "position":(
+                            i['x']*self._map_size[0], 
+                            i['y']*self._map_size[1]
+                        ),
+                        "color": i['color']}
+                else:
+                    data = {
+                        "type": get_type(i), 
+                        "position":(
+                            i['sx']*self._map_size[0], 
+                            i['sy']*self._map_size[1]
+                        ),
+                        "color": i['color']}
+                
+                if 'dx' in i:
+                    data["dir"] = (
+                        i["dx"],
+                        i["dy"]
+                    )
+                
+                objects["other"].append(data)
+        
+        return objects
+    
+    def fetch_objects(self):
+        """Raw map_obj.json body and its arrival time (`perf_counter`)."""
+        t = time.perf_counter_ns()
+        raw = self.http.get(THUNDER_OBJECTS_PATH, reuse_buffer=True)
+        self.perf.record("fetch", time.perf_counter_ns() - t)
+        
+        return raw, time.perf_counter()
+    
+    def update_objects_data(self):
+        self.unchanged = False
+        
+        try:
+            fetched = None
+            if not self.isReady:
+                fetched = self.map_init(prefetch_objects=True)
+            
+            raw, received_at = fetched or self.fetch_objects()
+            fingerprint = (len(raw), zlib.crc32(raw))
+            
+            if self.isReady and fingerprint == self._objects_fingerprint:
+                # byte-identical to the last parsed response: nothing to parse,
+                # but nothing moved either, so stop extrapolating the old motion
+                self.payload_stats["hits"] += 1
+                self.unchanged = True
+                self.received_at = received_at
+                
+                if self.columns is not None:
+                    self.columns = self.columns.at_rest()
+                
+                return True
+            
+            self.payload_stats["misses"] += 1
+            self._objects_fingerprint = fingerprint
+            self.received_at = received_at
+            
+            t = time.perf_counter_ns()
+            self._objects_data = self.http.decoder.decode_objects(raw)
+            self.perf.record("decode", time.perf_counter_ns() - t)
+            
+            t = time.perf_counter_ns()
+            
+            if self.columnar:
+                self.columns = ObjectColumns.from_json(self._objects_data, self._map_size)
+                self.columns.build_index(max(self._map_size)/INDEX_GRID_CELLS)
+                
+                if self.tracker:
+                    self.tracker.update(self.columns, self.received_at)
+                
+                self.objects = self.columns.objects
+            else:
+                self.objects = self.parse_objects(self._objects_data)
+            
+            self.perf.record("parse", time.perf_counter_ns() - t)
+            
+            if not self.objects["player"]:
+                self.last_error = PLAYER_NOT_FOUND
+                self.isReady = False
+                
+                return None
+            
+            if not self.isReady:
+                self.map_spawns_cached = self.generate_mid_spawns()
+                logger.info("Spawns calculated: %s", "".join(
+                                    map(
+                                        lambda obj: f'\n{" "*25} {obj["name"]} ({obj["position"][0]}x{obj["position"][1]})', 
+                                        self.map_spawns_cached
+                                    )
+                                )
+                            )
+                
+                logger.info("Map initialization complete (map size: %dx%d, gen: %d)", self._map_size[0], self._map_size[1], self._map_data["map_generation"])
+            
+            self.isReady = True
+            self.last_error = None
+            
+            return True
+        except Exception as e:
+            self.last_error = e
+            self.isReady = False
+            
+            return None
+    
+    
+    # ---------------------------------- Status ---------------------------------- #
+    
+    @property
+    def unreachable(self):
+        """The last failure was a network error, i.e. the game is most likely not running."""
+        return not self.isReady and isinstance(self.last_error, OSError)
+    
+    @property
+    def player_missing(self):
+        """The map is loaded, but the last map_obj.json had no player."""
+        return not self.isReady and self.last_error == PLAYER_NOT_FOUND
+    
+    def map_available(self):
+        """Cheap battle check: fetches only map_info.json, no objects or image."""
+        try:
+            info = self.http.get_json(THUNDER_MAP_INFO_PATH)
+        except Exception as e:
+            self.last_error = e
+            return False
+        
+        if not info.get("valid", True):
+            self.last_error = "Map is not available (map_info.json is not valid)"
+            return False
+        
+        return True
+    
+    
+    # ---------------------------------- Output ---------------------------------- #
+    
+    def snapshot(self, sequence=0):
+        return MapSnapshot(self, sequence)
+    
+    def close_capture(self):
+        """Flushes and closes the capture file, if any. Thread-safe, may be called more than once."""
+        if self.capture:
+            self.capture.close()
+    
+    def close(self):
+        logger.info("Unchanged map_obj.json responses: %d of %d", self.payload_stats["hits"], self.payload_stats["hits"] + self.payload_stats["misses"])
+        
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+        
+        self.http.close()
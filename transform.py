@@ -0,0 +1,175 @@
+# pylint: disable=line-too-long, invalid-name, import-error, multiple-imports, unspecified-encoding, broad-exception-caught, trailing-whitespace, no-name-in-module, unused-import
+
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+
+# ---------------------------------------------------------------------------- #
+#                                View Transform                                #
+# ---------------------------------------------------------------------------- #
+
+
+class ViewTransform:
+    """
+    Affine map from map coordinates to canvas pixels.
+    
+    For a normalized map position `x` (0..1) and a sprite offset `o` in
+    pixels the screen position is `a*x + b + k*o`, where `a`, `b` and `k`
+    come from the canvas size and center, the player position and the
+    zoom. They are only recomputed when one of those changes. `k` is the
+    zoom when zoom affects sprites and 1 otherwise. The same coefficients
+    work for single values and for NumPy arrays, and the inverse gives
+    `dx`/`dy`.
+    """
+    
+    def __init__(self, size, zoom_affect_sprites=True):
+        self.size = size
+        
+        self.zoom = 1
+        self.zoom_affect_sprites = zoom_affect_sprites
+        
+        self.ppos = (0, 0)
+        
+        self.version = 0
+        self._build()
+    
+    
+    # ---------------------------------- Update ---------------------------------- #
+    
+    def _build(self):
+        self.cx = 0.5*self.size[0]
+        self.cy = 0.5*self.size[1]
+        
+        self.ax = -self.size[0]*self.zoom
+        self.ay = -self.size[1]*self.zoom
+        
+        self.bx = self.cx + self.ppos[0]*self.zoom
+        self.by = self.cy + self.ppos[1]*self.zoom
+        
+        self.k = self.zoom if self.zoom_affect_sprites else 1
+        
+        self.version += 1
+    
+    def update(self, ppos=None, zoom=None, size=None):
+        changed = False
+        
+        for name, value in (("ppos", ppos), ("zoom", zoom), ("size", size)):
+            if value is not None and value != getattr(self, name):
+                setattr(self, name, value)
+                changed = True
+        
+        if changed:
+            self._build()
+        
+        return changed
+    
+    
+    # ---------------------------------- Scalars --------------------------------- #
+    
+    def x(self, x, offset=0):
+        return self.ax*x + self.bx + self.k*offset
+    
+    def y(self, y, offset=0):
+        return self.ay*y + self.by + self.k*offset
+    
+    def inv_x(self, sx, offset=0):
+        return (sx - self.bx - self.k*offset)/self.ax
+    
+    def inv_y(self, sy, offset=0):
+        return (sy - self.by - self.k*offset)/self.ay
+    
+    
+    # ---------------------------------- Batched --------------------------------- #
+    
+    def points(self, xs, ys):
+        """Screen positions for arrays of normalized positions."""
+        return (
+            self.ax*np.asarray(xs, dtype=float) + self.bx,
+            self.ay*np.asarray(ys, dtype=float) + self.by
+        )
+    
+    def shapes(self, xs, ys, offsets):
+        """
+        Screen coordinates of one shape placed at many positions.
+        
+        `offsets` is a flat list of pixel offsets (x0, y0, x1, y1, ...).
+        Returns an (n, len(offsets)) array, one flat coordinate row per
+        position, ready for `create_polygon`.
+        """
+        sx, sy = self.points(np.atleast_1d(xs), np.atleast_1d(ys))
+        
+        offsets = np.asarray(offsets, dtype=float).reshape(-1, 2)*self.k
+        
+        res = np.empty((len(sx), offsets.shape[0], 2))
+        res[:, :, 0] = sx[:, None] + offsets[:, 0]
+        res[:, :, 1] = sy[:, None] + offsets[:, 1]
+        
+        return res.reshape(len(sx), -1)
+    
+    def rotated_shapes(self, xs, ys, offsets, angles):
+        """Like `shapes`, but every position gets the shape rotated by its own angle."""
+        sx, sy = self.points(np.atleast_1d(xs), np.atleast_1d(ys))
+        
+        offsets = np.asarray(offsets, dtype=float).reshape(-1, 2)*self.k
+        
+        cos = np.cos(angles)[:, None]
+        sin = np.sin(angles)[:, None]
+        
+        res = np.empty((len(sx), offsets.shape[0], 2))
+        res[:, :, 0] = sx[:, None] + offsets[:, 0]*cos - offsets[:, 1]*sin
+        res[:, :, 1] = sy[:, None] + offsets[:, 0]*sin + offsets[:, 1]*cos
+        
+        return res.reshape(len(sx), -1)
+    
+    def place(self, x, y, pairs):
+        """Flat screen coordinates of `ShapeTemplates.pairs` (offsets already scaled by `k`) at one position."""
+        sx = self.ax*x + self.bx
+        sy = self.ay*y + self.by
+        
+        coords = []
+        for ox, oy in pairs:
+            coords.append(sx + ox)
+            coords.append(sy + oy)
+        
+        return coords
+    
+    def place_many(self, xs, ys, templates):
+        """
+        `place` for arrays of positions, `templates` is one template for all
+        of them or one row per position (`ShapeTemplates.rotated_many`).
+        """
+        sx, sy = self.points(np.atleast_1d(xs), np.atleast_1d(ys))
+        
+        res = np.empty((len(sx), templates.shape[-1]))
+        res[:] = templates
+        res[:, 0::2] += sx[:, None]
+        res[:, 1::2] += sy[:, None]
+        
+        return res
+    
+    def boxes(self, xs, ys, half_w, half_h):
+        """(x1, y1, x2, y2) rows for rectangles/ovals centered at `xs`, `ys`."""
+        return self.shapes(xs, ys, (-half_w, -half_h, half_w, half_h))
+    
+    def visible_rect(self, margin=0):
+        """Normalized map rectangle (x0, y0, x1, y1) shown on the canvas, grown by `margin` pixels."""
+        x0, x1 = sorted((self.inv_x(-margin), self.inv_x(self.size[0] + margin)))
+        y0, y1 = sorted((self.inv_y(-margin), self.inv_y(self.size[1] + margin)))
+        
+        return x0, y0, x1, y1
+    
+    def visible(self, coords, margin=0):
+        """Rows of `shapes`/`boxes` output with at least one vertex on the canvas."""
+        xs = coords[:, 0::2]
+        ys = coords[:, 1::2]
+        
+        inside = (
+            (xs >= -margin) & (xs <= self.size[0] + margin)
+                &
+            (ys >= -margin) & (ys <= self.size[1] + margin)
+        )
+        
+        return inside.any(axis=1)